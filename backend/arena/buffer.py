@@ -0,0 +1,38 @@
+"""
+Text accumulation of streamed model responses.
+
+Responses are streamed token by token: concatenating each token to the full
+text would copy it every time (quadratic in the response length). Tokens are
+appended to a `TextBuffer` instead and only joined when the text is read, on
+SSE flushes and at the end of the response (see `AssistantMessage.sync_stream`).
+"""
+
+
+class TextBuffer:
+    """
+    Text appended by parts, joined lazily.
+    """
+
+    def __init__(self) -> None:
+        self.parts: list[str] = []
+        self.length = 0
+        # Whether some part has non-whitespace characters
+        self.has_text = False
+
+    def append(self, part: str) -> None:
+        self.parts.append(part)
+        self.length += len(part)
+        if not self.has_text and not part.isspace():
+            self.has_text = True
+
+    def getvalue(self) -> str:
+        """Join the parts appended so far, keeping the result for the next calls."""
+        if len(self.parts) > 1:
+            self.parts = ["".join(self.parts)]
+        return self.parts[0] if self.parts else ""
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __str__(self) -> str:
+        return self.getvalue()
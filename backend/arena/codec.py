@@ -0,0 +1,101 @@
+"""
+Encoding of session values stored in Redis.
+
+Session values are JSON documents (see `Conversations.to_session_data`), the
+system prompt and assistant messages metadata repeat the same keys and text so
+they compress well. Each value starts with a version byte telling how it is encoded:
+- `0x01`: JSON,
+- `0x02`: zlib compressed JSON,
+- `0x03`: zstd compressed JSON.
+
+Values without version byte were stored as plain JSON before versioning (a JSON
+document never starts with these bytes) and are read as is, so that deploys
+don't break live sessions. Values smaller than `SESSION_COMPRESSION_MIN_SIZE`
+aren't compressed, their version byte is their only overhead.
+"""
+
+import zlib
+from typing import Callable
+
+import zstandard
+
+from backend.config import settings
+
+JSON_VERSION = b"\x01"
+ZLIB_VERSION = b"\x02"
+ZSTD_VERSION = b"\x03"
+
+# Session values are compressed on every store: zlib level 3 is about as fast as level 1
+# on them while close to the default level's ratio, level 3 is zstd's default
+ZLIB_LEVEL = 3
+ZSTD_LEVEL = 3
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+# Errors raised by the decoders on corrupted values
+DECODE_ERRORS: tuple[type[Exception], ...] = (zlib.error, zstandard.ZstdError)
+
+DECODERS: dict[bytes, Callable[[bytes], bytes]] = {
+    JSON_VERSION: bytes,
+    ZLIB_VERSION: zlib.decompress,
+    ZSTD_VERSION: _zstd_decompress,
+}
+
+
+def _get_compressor() -> tuple[bytes, Callable[[bytes], bytes]] | None:
+    compression = settings.SESSION_COMPRESSION
+    if compression == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        return ZSTD_VERSION, compressor.compress
+    if compression == "zlib":
+        return ZLIB_VERSION, lambda data: zlib.compress(data, ZLIB_LEVEL)
+    return None
+
+
+COMPRESSOR = _get_compressor()
+
+
+def encode_session_value(value: bytes) -> bytes:
+    """
+    Encode a JSON session value to be stored in Redis.
+
+    Args:
+        value: JSON document
+
+    Returns:
+        bytes: version byte followed by the (possibly compressed) document
+    """
+    if COMPRESSOR is not None and len(value) >= settings.SESSION_COMPRESSION_MIN_SIZE:
+        version, compress = COMPRESSOR
+        compressed = compress(value)
+        # Compression can't shrink some values (already random-like text)
+        if len(compressed) < len(value):
+            return version + compressed
+
+    return JSON_VERSION + value
+
+
+def decode_session_value(value: bytes) -> bytes:
+    """
+    Decode a session value read from Redis.
+
+    Args:
+        value: Value stored by `encode_session_value`, or plain JSON stored before versioning
+
+    Returns:
+        bytes: JSON document
+
+    Raises:
+        ValueError: If the value can't be decoded
+    """
+    decode = DECODERS.get(value[:1])
+    if decode is None:
+        return value
+
+    try:
+        return decode(value[1:])
+    except DECODE_ERRORS as e:
+        raise ValueError(f"Invalid compressed session value: {e}")
@@ -0,0 +1,141 @@
+"""
+Streaming compression of SSE responses.
+
+Arena streams repeat the same JSON structure in every event, so they compress
+very well, but a compressed stream must still reach the client event by event:
+each payload (a coalesced batch of events, see `stream_comparison_messages`)
+is compressed then sync flushed, so that the client can decode it right away.
+
+Compression is opt-in (`SSE_COMPRESSION`) and negotiated with the
+`Accept-Encoding` request header. Brotli needs the optional `brotli` package.
+"""
+
+import logging
+import zlib
+from typing import AsyncGenerator, Protocol
+
+from backend.config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # type: ignore[assignment]
+
+logger = logging.getLogger("languia")
+
+# Payloads are a few hundred bytes each, flushed one by one: gzip's default level and a
+# mid brotli quality compress them in microseconds, higher ones barely shrink them further
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class StreamCompressor(Protocol):
+    def compress(self, data: bytes) -> bytes:
+        """Compress `data` and flush it so that it can be decoded right away."""
+        ...
+
+    def finish(self) -> bytes:
+        """End the compressed stream."""
+        ...
+
+
+class GzipStreamCompressor:
+    def __init__(self) -> None:
+        # wbits=31: gzip header and trailer
+        self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliStreamCompressor:
+    def __init__(self) -> None:
+        self.compressor = brotli.Compressor(
+            mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY
+        )
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+
+STREAM_COMPRESSORS: dict[str, type[StreamCompressor]] = {
+    "gzip": GzipStreamCompressor,
+    "br": BrotliStreamCompressor,
+}
+
+
+def _available_encodings() -> list[str]:
+    encodings = []
+    for encoding in settings.SSE_COMPRESSION:
+        if encoding not in STREAM_COMPRESSORS:
+            logger.warning(f"[SSE] Unknown compression '{encoding}' ignored")
+        elif encoding == "br" and brotli is None:
+            logger.warning("[SSE] brotli package not installed, 'br' ignored")
+        else:
+            encodings.append(encoding)
+    return encodings
+
+
+# Enabled encodings in order of preference
+SSE_ENCODINGS = _available_encodings()
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """
+    Pick the compression of an SSE response.
+
+    Args:
+        accept_encoding: `Accept-Encoding` request header
+
+    Returns:
+        str | None: enabled encoding accepted by the client (preferred one
+            first), None to send the stream uncompressed
+    """
+    if not accept_encoding or not SSE_ENCODINGS:
+        return None
+
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, *params = item.strip().split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in SSE_ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+async def compress_sse_stream(
+    generator: AsyncGenerator[str], encoding: str
+) -> AsyncGenerator[bytes]:
+    """
+    Compress SSE payloads, each flushed to be decoded as soon as it is received.
+
+    Args:
+        generator: AsyncGenerator yielding SSE-formatted strings
+        encoding: Negotiated encoding (see `negotiate_encoding`)
+
+    Yields:
+        bytes: compressed payloads
+    """
+    compressor = STREAM_COMPRESSORS[encoding]()
+    try:
+        async for payload in generator:
+            yield compressor.compress(payload.encode())
+        yield compressor.finish()
+    finally:
+        await generator.aclose()
@@ -7,24 +7,42 @@ handling streaming responses, token counting, and message tracking.
 Uses Pydantic Conversation model update and validation during streaming.
 """
 
+import asyncio
 import logging
-import time
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Iterator, TypeVar
 
 from fastapi import Request
-from litellm.litellm_core_utils.token_counter import token_counter
 
-from backend.arena.litellm import litellm_stream_iter
+from backend.arena.litellm import LLMResponse, litellm_stream_aiter, litellm_stream_iter
+from backend.arena.metrics import StreamMetrics
 from backend.arena.models import (
     AnyMessage,
     AssistantMessage,
     AssistantMessageMetadata,
     Conversation,
 )
-from backend.errors import EmptyResponseError
+from backend.arena.retries import get_retry_delay
+from backend.arena.tokens import count_tokens
+from backend.config import settings
+from backend.errors import EmptyResponseError, StreamStalledError
+from backend.llms.limiter import limit_concurrency
+from backend.llms.stalls import get_stall_threshold, record_chunk_gaps
 
 logger = logging.getLogger("languia")
 
+T = TypeVar("T")
+
+
+async def iterate_sync(iterator: Iterator[T]) -> AsyncGenerator[T]:
+    """
+    Expose a synchronous iterator as an async generator.
+
+    Warning: each step still blocks the event loop, only used for the legacy
+    synchronous LiteLLM client.
+    """
+    for item in iterator:
+        yield item
+
 
 async def bot_response_async(
     position,
@@ -51,17 +69,16 @@ async def bot_response_async(
 
     Raises:
         EmptyResponseError: If model returns empty response
+        StreamStalledError: If the response stopped streaming mid-way
+        Exception: Provider errors, after retries of transient ones (see `backend.arena.retries`)
     """
     # Add new partial AssistantMessage to chat
     metadata = AssistantMessageMetadata(generation_id="", bot=position)
     current_msg = AssistantMessage(metadata=metadata)
     state.messages.append(current_msg)
 
-    # Track generation start time for performance metrics
-    start_tstamp = time.time()
-
-    # Initialize streaming iterator from LiteLLM
-    stream_iter = litellm_stream_iter(
+    # LiteLLM streaming iterator parameters, a new stream is opened on each retry
+    stream_kwargs = dict(
         model_name=state.model_name,
         endpoint=state.llm.endpoint,
         messages=state.messages,
@@ -70,24 +87,84 @@ async def bot_response_async(
         request=request,
     )
 
-    # Process streaming response chunks and update current message
-    for data in stream_iter:
-        if not current_msg.metadata.generation_id:
-            current_msg.metadata.generation_id = data["generation_id"]
-        if data["output_tokens"]:
-            current_msg.metadata.output_tokens = data["output_tokens"]
-
-        if data["content"] or data["reasoning"]:
-            current_msg.content = data["content"].strip()
-            current_msg.reasoning = data["reasoning"].strip()
-
-        # Yield complete chat only if there's content to display in current message
-        if current_msg.content or current_msg.reasoning:
-            yield state.messages
-
-    # Calculate total generation duration
-    stop_tstamp = time.time()
-    current_msg.metadata.duration = stop_tstamp - start_tstamp
+    def open_stream() -> AsyncGenerator[LLMResponse]:
+        if settings.LITELLM_ASYNC_STREAMING:
+            return litellm_stream_aiter(**stream_kwargs)
+        return iterate_sync(litellm_stream_iter(**stream_kwargs))
+
+    # Process streaming response chunks and update current message, holding
+    # request slots of the model and its provider until the end of the stream
+    # Text is only synced to the message when read (see `AssistantMessage.sync_stream`)
+    async with limit_concurrency(state.model_name, state.llm.endpoint):
+        # Track generation timings for performance metrics (of the last attempt)
+        metrics = StreamMetrics()
+        # Stall watchdog, armed while waiting for the provider once text was
+        # streamed (see `backend.llms.stalls`)
+        stall_threshold = get_stall_threshold(state.model_name)
+        while True:
+            stream_iter = open_stream()
+            watchdog = asyncio.timeout(None)
+            try:
+                async with watchdog:
+                    async for data in stream_iter:
+                        # Time spent by the consumer isn't a stall
+                        watchdog.reschedule(None)
+                        current_msg.attach_stream(data["content"], data["reasoning"])
+                        metrics.on_chunk(len(data["content"]), len(data["reasoning"]))
+                        if not current_msg.metadata.generation_id:
+                            current_msg.metadata.generation_id = data["generation_id"]
+                        if data["output_tokens"]:
+                            current_msg.metadata.output_tokens = data["output_tokens"]
+
+                        # Yield complete chat only if there's content to display in current message
+                        if data["content"].has_text or data["reasoning"].has_text:
+                            yield state.messages
+
+                        if stall_threshold and metrics.first_token is not None:
+                            watchdog.reschedule(
+                                asyncio.get_running_loop().time() + stall_threshold
+                            )
+                break
+            except TimeoutError as e:
+                if not watchdog.expired():
+                    raise
+                logger.warning(
+                    f"[STALL] No text from '{state.model_name}' for {stall_threshold:.1f}s, "
+                    f"interrupting generation_id='{current_msg.metadata.generation_id}'",
+                    extra={"request": request},
+                )
+                raise StreamStalledError(state.model_name, stall_threshold) from e
+            except Exception as e:
+                # Transient provider errors are retried until some text is streamed
+                if (
+                    metrics.first_token is not None
+                    or (
+                        delay := get_retry_delay(
+                            e, current_msg.metadata.retries, metrics.first_attempt
+                        )
+                    )
+                    is None
+                ):
+                    raise
+                current_msg.metadata.retries += 1
+                logger.warning(
+                    f"[RETRY] '{state.model_name}' failed before its first token ({e}), "
+                    f"retry {current_msg.metadata.retries} in {delay:.2f}s",
+                    extra={"request": request},
+                )
+                await stream_iter.aclose()
+                current_msg.metadata.generation_id = ""
+                current_msg.metadata.output_tokens = None
+                await asyncio.sleep(delay)
+                metrics.restart()
+            finally:
+                current_msg.detach_stream()
+
+    # Calculate generation duration, retries excluded
+    metrics.stop()
+    record_chunk_gaps(state.model_name, metrics.gaps)
+    current_msg.metadata.duration = metrics.duration
+    current_msg.metadata.retry_time = metrics.retry_time
     logger.debug(
         f"duration for {data["generation_id"]}: {current_msg.metadata.duration}",
         extra={"request": request},
@@ -104,12 +181,20 @@ async def bot_response_async(
             f"No answer from API '{state.llm.endpoint.api_model_id}' for model '{state.model_name}'"
         )
 
-    # Fallback: count tokens locally if API didn't provide them
+    # Fallback: count tokens locally (off the event loop) if API didn't provide them
     if not current_msg.metadata.output_tokens:
-        current_msg.metadata.output_tokens = token_counter(
-            text=[data["reasoning"], data["content"]],
-            model=state.model_name,
+        current_msg.metadata.output_tokens = await count_tokens(
+            state.model_name, data["reasoning"].getvalue(), data["content"].getvalue()
         )
 
+    # Streaming performance metrics
+    current_msg.metadata.ttft = metrics.ttft
+    current_msg.metadata.ttfc = metrics.ttfc
+    current_msg.metadata.chunk_gap_p50 = metrics.chunk_gap(50)
+    current_msg.metadata.chunk_gap_p95 = metrics.chunk_gap(95)
+    current_msg.metadata.tokens_per_second = metrics.tokens_per_second(
+        current_msg.metadata.output_tokens
+    )
+
     # Final update with complete response and timing data
     yield state.messages
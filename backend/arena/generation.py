@@ -0,0 +1,183 @@
+"""
+Generation of both model responses of an arena turn.
+
+Responses are published to the session's resumable SSE stream (see
+`backend.arena.resume`) by:
+- `GENERATION_MODE=local`: a background task of the API worker which received
+  the request,
+- `GENERATION_MODE=queue`: a generation worker (see `backend.arena.worker`)
+  consuming jobs from a Redis list, so that API nodes only relay streams and
+  both can be scaled independently.
+
+Jobs are delivered at most once: if a generation worker dies, its jobs' streams
+are left unfinished and expire.
+"""
+
+import asyncio
+import logging
+import time
+from typing import AsyncGenerator
+
+from fastapi import Request
+from pydantic import BaseModel
+
+from backend.arena.models import AssistantMessage, Conversations
+from backend.arena.persistence import record_conversations
+from backend.arena.ratelimit import charge_rate_limit, get_pricey_output_cost
+from backend.arena.resume import SSEStreamWriter, publish_sse_stream
+from backend.arena.sse import SSEProtocol
+from backend.arena.streaming import (
+    AnySSEEvent,
+    format_sse_event,
+    stream_comparison_messages,
+)
+from backend.config import settings
+from backend.session import get_async_redis_client
+from backend.utils.user import get_ip
+
+logger = logging.getLogger("languia")
+
+GENERATION_JOBS_KEY = "generation:jobs"
+
+# Request headers forwarded to generation workers (client IP, see `get_ip`)
+FORWARDED_HEADERS = (
+    "cloud-protector-client-ip",
+    "x-original-forwarded-for",
+    "x-forwarded-for",
+    "user-agent",
+)
+
+
+class GenerationJob(BaseModel):
+    session_hash: str
+    sse_protocol: SSEProtocol
+    enqueued_at: float
+    # Request data needed for logging and rate limiting
+    path: str
+    client: tuple[str, int] | None
+    headers: list[tuple[str, str]]
+
+    @staticmethod
+    def from_request(
+        session_hash: str, request: Request, sse_protocol: SSEProtocol
+    ) -> "GenerationJob":
+        return GenerationJob(
+            session_hash=session_hash,
+            sse_protocol=sse_protocol,
+            enqueued_at=time.time(),
+            path=request.url.path,
+            client=tuple(request.client) if request.client else None,
+            headers=[
+                (name, value)
+                for name, value in request.headers.items()
+                if name in FORWARDED_HEADERS
+            ],
+        )
+
+    def to_request(self) -> Request:
+        """Rebuild a request similar to the original one for logging and rate limiting."""
+        return Request(
+            {
+                "type": "http",
+                "method": "POST",
+                "path": self.path,
+                "query_string": b"",
+                "path_params": {},
+                "client": self.client,
+                "headers": [
+                    (name.encode(), value.encode()) for name, value in self.headers
+                ],
+            }
+        )
+
+
+async def stream_and_record(
+    conversations: Conversations,
+    request: Request,
+    sse_protocol: SSEProtocol,
+    writer: SSEStreamWriter,
+) -> AsyncGenerator[str]:
+    """
+    Stream both model responses then store Conversations to redis/db/logs.
+
+    If every client stopped reading the stream (see `backend.arena.resume`) or
+    the stream is closed, both providers streams are stopped and the
+    conversations are recorded as interrupted.
+
+    Args:
+        conversations: Conversations to stream responses for
+        request: FastAPI request for logging and rate limiting
+        sse_protocol: SSE protocol version requested by the client
+        writer: Stream the responses are published to
+    """
+    conversations.interrupted = False
+    try:
+        async for chunk in stream_comparison_messages(
+            conversations, request, sse_protocol, writer.is_abandoned
+        ):
+            yield chunk
+    except (asyncio.CancelledError, GeneratorExit):
+        conversations.interrupted = True
+        logger.warning(
+            f"Client disconnected, interrupting {conversations.conversation_pair_id}",
+            extra={"request": request},
+        )
+        raise
+    finally:
+        # Charge pricey llms responses to the IP's rate limit (prompts are reserved on request)
+        if cost := get_pricey_output_cost(conversations):
+            await charge_rate_limit(get_ip(request), cost)
+
+        conversations.is_streaming = False
+        # Include text streamed but not sent yet to the client (interrupted responses)
+        for conv in (conversations.conversation_a, conversations.conversation_b):
+            if conv.messages and isinstance(
+                message := conv.messages[-1], AssistantMessage
+            ):
+                message.sync_stream()
+        # After streaming completes, store Conversations to redis/db/logs
+        await conversations.store_to_session()
+        # Blocking database write, of a copy as the next request may already use the object
+        await asyncio.to_thread(
+            record_conversations, conversations.model_copy(deep=True)
+        )
+
+
+async def start_generation(
+    conversations: Conversations,
+    request: Request,
+    sse_protocol: SSEProtocol,
+    *events: AnySSEEvent,
+) -> None:
+    """
+    Reset the session's stream and start generating both model responses to it.
+
+    Conversations must be stored to session beforehand for generation workers.
+
+    Args:
+        conversations: Conversations to stream responses for
+        request: FastAPI request for logging and rate limiting
+        sse_protocol: SSE protocol version requested by the client
+        events: Events to send before the responses
+    """
+    writer = SSEStreamWriter(
+        conversations.session_hash, local=settings.GENERATION_MODE == "local"
+    )
+    await writer.reset()
+    for event in events:
+        await writer.append(format_sse_event(event))
+
+    if settings.GENERATION_MODE == "queue":
+        job = GenerationJob.from_request(
+            conversations.session_hash, request, sse_protocol
+        )
+        await get_async_redis_client().lpush(GENERATION_JOBS_KEY, job.model_dump_json())
+        logger.info(
+            f"[GENERATION] Enqueued job for {conversations.session_hash}",
+            extra={"request": request},
+        )
+    else:
+        publish_sse_stream(
+            writer,
+            stream_and_record(conversations, request, sse_protocol, writer),
+        )
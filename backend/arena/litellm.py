@@ -5,20 +5,39 @@ This module provides a unified interface to call different LLM APIs (OpenAI, Goo
 OpenRouter, etc.) through LiteLLM, handling streaming responses, token counting, and error handling.
 """
 
+import asyncio
+import inspect
 import json
 import logging
-from typing import TYPE_CHECKING, Generator, TypedDict, Union, cast
-
+from contextvars import ContextVar
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Generator,
+    Literal,
+    TypedDict,
+    Union,
+    cast,
+)
+
+import httpx
 import litellm
+import openai
+from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
 
-from backend.config import GLOBAL_TIMEOUT, settings
+from backend.arena.buffer import TextBuffer
+from backend.config import COUNTRY_PORTALS, GLOBAL_TIMEOUT, settings
 from backend.errors import ContextTooLongError
+from backend.llms.data import get_llms_data
+from backend.llms.limiter import provider_key
+from backend.llms.models import Endpoint
 
 if TYPE_CHECKING:
     from fastapi import Request
 
     from backend.arena.models import AnyMessage
-    from backend.llms.models import Endpoint
 
 logger = logging.getLogger("languia")
 
@@ -32,6 +51,43 @@ else:
     logger.warning("No Google creds detected!")
     vertex_credentials_json = None
 
+# Configure Sentry error tracking if available (LiteLLM callbacks are global)
+if settings.SENTRY_DSN:
+    litellm.input_callback = ["sentry"]  # adds sentry breadcrumbing
+    if "sentry" not in litellm.failure_callback:
+        litellm.failure_callback.append("sentry")
+
+# Connection pool of the shared HTTP client of each endpoint
+HTTP_POOL_LIMITS = httpx.Limits(
+    max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+)
+# Max seconds to read the rest of a finished response before reusing its connection
+HTTP_DRAIN_TIMEOUT = 1.0
+
+# Background tasks draining finished responses, referenced until they finish
+_drain_tasks: set[asyncio.Task] = set()
+
+# HTTP responses received by the shared clients during the current LiteLLM call
+_http_responses: ContextVar[list[httpx.Response] | None] = ContextVar(
+    "http_responses", default=None
+)
+
+
+async def _track_http_response(response: httpx.Response) -> None:
+    if (responses := _http_responses.get()) is not None:
+        responses.append(response)
+
+
+def _create_http_client(timeout: httpx.Timeout | float | None) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=timeout,
+        limits=HTTP_POOL_LIMITS,
+        follow_redirects=True,
+        event_hooks={"response": [_track_http_response]},
+    )
+
 
 def get_api_key(endpoint: "Endpoint") -> str | None:
     """
@@ -48,6 +104,8 @@ def get_api_key(endpoint: "Endpoint") -> str | None:
     Returns:
         str: API key, or None if using standard provider (OpenRouter/Vertex)
     """
+    if settings.MOCK_LLM_API_BASE and endpoint.api_base == settings.MOCK_LLM_API_BASE:
+        return "mock"
     # Albert is French government LLM
     # "api_base": "https://albert.api.etalab.gouv.fr/v1/",
 
@@ -64,102 +122,196 @@ def get_api_key(endpoint: "Endpoint") -> str | None:
     return None
 
 
-class LLMResponse(TypedDict):
-    generation_id: str
-    reasoning: str
-    content: str
-    output_tokens: int | None
+class PooledAsyncHTTPHandler(AsyncHTTPHandler):
+    """LiteLLM HTTP handler with a keep-alive httpx client using `HTTP_POOL_LIMITS`."""
 
+    def create_client(self, timeout, *args: Any, **kwargs: Any) -> httpx.AsyncClient:
+        return _create_http_client(timeout)
 
-def litellm_stream_iter(
-    model_name: str,
-    endpoint: "Endpoint",
-    messages: list["AnyMessage"],
-    temperature: float,
-    max_new_tokens: int,
-    request: Union["Request", None] = None,
-    include_reasoning: bool = False,  # FIXME Legacy ?
-    enable_reasoning: bool = False,  # FIXME Legacy ?
-) -> Generator[LLMResponse]:
+
+EndpointClient = AsyncHTTPHandler | openai.AsyncOpenAI
+
+# LiteLLM `client` shared by the models of each endpoint (keyed by `provider_key`)
+_endpoint_clients: dict[str, EndpointClient | None] = {}
+# LiteLLM parameters of each model which don't depend on the call
+_call_params: dict[str, dict[str, Any]] = {}
+
+
+def _create_endpoint_client(endpoint: "Endpoint") -> EndpointClient | None:
     """
-    Stream responses from an LLM API using LiteLLM.
+    Create the client for async LiteLLM calls to an endpoint.
 
-    This function handles unified API calls to various LLM providers through LiteLLM,
-    manages streaming responses, and processes tokens and metadata.
+    Returns:
+        EndpointClient | None: client for providers supporting it, None to let
+            LiteLLM use its own
+    """
+    if endpoint.api_type == "openai":
+        return openai.AsyncOpenAI(
+            api_key=get_api_key(endpoint) or "",
+            base_url=endpoint.api_base,
+            timeout=GLOBAL_TIMEOUT,
+            # Retried before the first token by `bot_response_async`
+            max_retries=0,
+            http_client=_create_http_client(GLOBAL_TIMEOUT),
+        )
+    if endpoint.api_type in ("openrouter", "huggingface"):
+        return PooledAsyncHTTPHandler(timeout=GLOBAL_TIMEOUT)
+
+    return None
+
+
+def resolve_endpoint(model_name: str, endpoint: "Endpoint") -> "Endpoint":
+    """
+    Endpoint to call for a model, the mock LLM provider if `MOCK_LLM_API_BASE` is set.
+
+    The mock is called as an OpenRouter endpoint, like most models in production,
+    with "mock/{model id}" as model (prefixed like OpenRouter ids so that LiteLLM
+    doesn't apply OpenAI models rules).
+    """
+    if not settings.MOCK_LLM_API_BASE:
+        return endpoint
+
+    return Endpoint(
+        api_type="openrouter",
+        api_base=settings.MOCK_LLM_API_BASE,
+        api_model_id=f"mock/{model_name}",
+    )
+
+
+def get_endpoint_client(endpoint: "Endpoint") -> EndpointClient | None:
+    key = provider_key(endpoint)
+    if key not in _endpoint_clients:
+        _endpoint_clients[key] = _create_endpoint_client(endpoint)
+    return _endpoint_clients[key]
+
+
+def get_call_params(model_name: str, endpoint: "Endpoint") -> dict[str, Any]:
+    """
+    LiteLLM parameters of a model which don't depend on the call, computed once.
 
     Args:
         model_name: Model id
         endpoint: Model Endpoint data
-        messages: List of messages to be serialized for llm call
-        temperature: Sampling temperature for response diversity
-        max_new_tokens: Maximum tokens to generate
-        request: FastAPI request for logging
-        include_reasoning: Whether to include reasoning in response
-        enable_reasoning: Whether to enable reasoning mode
 
-    Yields:
-        Dict containing: content, reasoning, output_tokens, generation_id
+    Returns:
+        dict: keyword arguments for LiteLLM (must not be modified)
     """
+    if (params := _call_params.get(model_name)) is not None:
+        return params
 
     # Build LiteLLM model identifier (e.g., "openai/gpt-4", "google/gemini-pro")
     litellm_model_name = f"{endpoint.api_type}/{endpoint.api_model_id}"
-    # Retrieve API key from environment or config
-    api_key = get_api_key(endpoint)
-
-    logger.info(
-        f"using endpoint {litellm_model_name} for {model_name}: {endpoint.model_dump(mode="json")}",
-        extra={"request": request},
+    logger.debug(
+        f"using endpoint {litellm_model_name} for {model_name}: {endpoint.model_dump(mode="json")}"
     )
 
-    # Debug mode can be enabled but is very verbose for streaming
-    # from backend.config import debug
-    # if debug:
-    #     litellm._turn_on_debug()
-
-    # Configure Sentry error tracking if available
-    if settings.SENTRY_DSN:
-        litellm.input_callback = ["sentry"]  # adds sentry breadcrumbing
-        litellm.failure_callback.append("sentry")
-
-    # Set Vertex AI location for Google Cloud models
-    litellm.vertex_location = endpoint.vertex_ai_location or settings.VERTEXAI_LOCATION
-
     # nice to have: openrouter specific params
     # completion = client.chat.completions.create(
     #   extra_headers={
     #     "HTTP-Referer": "<YOUR_SITE_URL>", # Optional. Site URL for rankings on openrouter.ai.
     #     "X-Title": "<YOUR_SITE_NAME>", # Optional. Site title for rankings on openrouter.ai.
     #   },
-
-    # Build parameters for LiteLLM API call
-    kwargs = {
+    params = {
         "timeout": GLOBAL_TIMEOUT,
         "stream_timeout": 30,
         "api_version": endpoint.api_version,
         "base_url": endpoint.api_base,
-        "api_key": api_key,
+        # Retrieve API key from environment or config
+        "api_key": get_api_key(endpoint),
         # max_retries can be added if needed
         "model": litellm_model_name,
+        "stream": True,  # Enable streaming for real-time responses
+        "vertex_credentials": vertex_credentials_json,
+        # Set Vertex AI location for Google Cloud models
+        "vertex_ai_location": endpoint.vertex_ai_location or settings.VERTEXAI_LOCATION,
+    }
+
+    # Request token usage reporting (except for Aya which doesn't support it)
+    if "c4ai-aya-expanse-32b" not in litellm_model_name:
+        params["stream_options"] = {"include_usage": True}
+
+    # OpenRouter specific params could be added here
+    # transforms = [""], route= ""
+
+    _call_params[model_name] = params
+    return params
+
+
+def init_endpoint_clients() -> None:
+    """
+    Precompute call parameters and create clients of all enabled models.
+    """
+    for country_portal in COUNTRY_PORTALS:
+        for model in get_llms_data(country_portal).enabled.values():
+            endpoint = resolve_endpoint(model.id, model.endpoint)
+            get_call_params(model.id, endpoint)
+            get_endpoint_client(endpoint)
+
+
+async def close_endpoint_clients() -> None:
+    if _drain_tasks:
+        await asyncio.wait(_drain_tasks, timeout=HTTP_DRAIN_TIMEOUT)
+    for client in _endpoint_clients.values():
+        if client is not None:
+            await client.close()
+    _endpoint_clients.clear()
+
+
+class LLMResponse(TypedDict):
+    generation_id: str
+    reasoning: TextBuffer
+    content: TextBuffer
+    output_tokens: int | None
+
+
+def _build_completion_kwargs(
+    model_name: str,
+    endpoint: "Endpoint",
+    messages: list["AnyMessage"],
+    temperature: float,
+    max_new_tokens: int,
+    request: Union["Request", None] = None,
+    include_reasoning: bool = False,
+    enable_reasoning: bool = False,
+) -> dict[str, Any]:
+    """
+    Build LiteLLM `completion`/`acompletion` parameters for a streaming call.
+
+    Shared by the sync and async streaming iterators.
+
+    Args:
+        model_name: Model id
+        endpoint: Model Endpoint data
+        messages: List of messages to be serialized for llm call
+        temperature: Sampling temperature for response diversity
+        max_new_tokens: Maximum tokens to generate
+        request: FastAPI request for logging
+        include_reasoning: Whether to include reasoning in response
+        enable_reasoning: Whether to enable reasoning mode
+
+    Returns:
+        dict: keyword arguments for LiteLLM
+    """
+    kwargs = {
+        **get_call_params(model_name, endpoint),
         # Only pass supported message args 'role' and 'content'
         "messages": [msg.model_dump(include={"role", "content"}) for msg in messages],
         "temperature": temperature,
         "max_tokens": max_new_tokens,
-        "stream": True,  # Enable streaming for real-time responses
-        "vertex_credentials": vertex_credentials_json,
-        "vertex_ai_location": litellm.vertex_location,
     }
 
+    # Debug mode can be enabled but is very verbose for streaming
+    # from backend.config import debug
+    # if debug:
+    #     litellm._turn_on_debug()
+
     # Use mock response for testing if enabled
     if settings.MOCK_RESPONSE:
-        logger.warning(f"MOCK_RESPONSE enabled")
+        logger.warning(f"MOCK_RESPONSE enabled", extra={"request": request})
         kwargs["mock_response"] = (
             "This is a fake response that didn't contact the LLM api."
         )
 
-    # Request token usage reporting (except for Aya which doesn't support it)
-    if "c4ai-aya-expanse-32b" not in litellm_model_name:
-        kwargs["stream_options"] = {"include_usage": True}
-
     # Enable extended reasoning (e.g., o1 models)
     if include_reasoning:
         kwargs["include_reasoning"] = True
@@ -168,6 +320,121 @@ def litellm_stream_iter(
     if enable_reasoning:
         kwargs["enable_reasoning"] = True
 
+    return kwargs
+
+
+# Outcome of a streamed chunk: nothing to yield, partial data to yield or end of generation
+ChunkOutcome = Literal["ignored", "partial", "finished"]
+
+
+def _consume_chunk(
+    chunk: litellm.ModelResponse,
+    data: LLMResponse,
+    endpoint: "Endpoint",
+    litellm_model_name: str,
+    request: Union["Request", None] = None,
+) -> ChunkOutcome:
+    """
+    Accumulate a streamed chunk into the response `data`.
+
+    Args:
+        chunk: Streamed chunk from LiteLLM
+        data: Data dict accumulating response metadata (updated in place)
+        endpoint: Model Endpoint data for logging
+        litellm_model_name: LiteLLM model identifier for logging
+        request: FastAPI request for logging
+
+    Returns:
+        ChunkOutcome: whether `data` should be yielded or the generation is finished
+    """
+    # Extract generation ID for tracking/debugging
+    if not data["generation_id"] and chunk.id:
+        data["generation_id"] = chunk.id
+        logger.debug(
+            f"Response stream started for '{litellm_model_name}' with generation_id='{chunk.id}'",
+            extra={"request": request},
+        )
+    # Extract token count from streaming completion (if available)
+    if hasattr(chunk, "usage") and hasattr(chunk.usage, "completion_tokens"):
+        data["output_tokens"] = chunk.usage.completion_tokens
+        logger.debug(
+            f"reported output tokens for api {endpoint.api_base} and model {litellm_model_name}: {data["output_tokens"]}",
+            extra={"request": request},
+        )
+    # Process content chunks
+    if len(chunk.choices) == 0:
+        return "ignored"
+
+    choice = cast(litellm.types.utils.StreamingChoices, chunk.choices[0])
+
+    # Accumulate text and reasoning across chunks
+    if delta := choice.get("delta"):
+        # Get the text content of this chunk
+        if content := choice.delta.get("content"):
+            data["content"].append(content)
+        # Get reasoning content (for reasoning models)
+        if reasoning := delta.get("reasoning_content") or delta.get("reasoning"):
+            data["reasoning"].append(reasoning)
+
+    # Check for generation completion signal
+    if choice.finish_reason == "stop":
+        return "finished"
+    elif choice.finish_reason == "length":
+        # Output truncated at max_tokens limit — response is still valid
+        logger.warning(
+            "output_truncated_at_max_tokens: " + str(chunk),
+            extra={"request": request},
+        )
+        return "finished"
+
+    return "partial"
+
+
+def litellm_stream_iter(
+    model_name: str,
+    endpoint: "Endpoint",
+    messages: list["AnyMessage"],
+    temperature: float,
+    max_new_tokens: int,
+    request: Union["Request", None] = None,
+    include_reasoning: bool = False,  # FIXME Legacy ?
+    enable_reasoning: bool = False,  # FIXME Legacy ?
+) -> Generator[LLMResponse]:
+    """
+    Stream responses from an LLM API using LiteLLM (synchronous).
+
+    This function handles unified API calls to various LLM providers through LiteLLM,
+    manages streaming responses, and processes tokens and metadata.
+
+    Warning: network reads are blocking, prefer `litellm_stream_aiter` from async code.
+    Kept for compatibility (see `settings.LITELLM_ASYNC_STREAMING`).
+
+    Args:
+        model_name: Model id
+        endpoint: Model Endpoint data
+        messages: List of messages to be serialized for llm call
+        temperature: Sampling temperature for response diversity
+        max_new_tokens: Maximum tokens to generate
+        request: FastAPI request for logging
+        include_reasoning: Whether to include reasoning in response
+        enable_reasoning: Whether to enable reasoning mode
+
+    Yields:
+        Dict containing: content, reasoning, output_tokens, generation_id
+    """
+    endpoint = resolve_endpoint(model_name, endpoint)
+    kwargs = _build_completion_kwargs(
+        model_name,
+        endpoint,
+        messages,
+        temperature,
+        max_new_tokens,
+        request,
+        include_reasoning,
+        enable_reasoning,
+    )
+    litellm_model_name = kwargs["model"]
+
     # Make the API call through LiteLLM
     try:
         response: Generator[litellm.ModelResponse] = litellm.completion(**kwargs)
@@ -178,64 +445,180 @@ def litellm_stream_iter(
         )
         raise ContextTooLongError from e
 
-    # OpenRouter specific params could be added here
-    # transforms = [""], route= ""
-
     # Data dict to accumulate response metadata
     data: LLMResponse = {
         "generation_id": "",
-        "reasoning": "",
-        "content": "",
+        "reasoning": TextBuffer(),
+        "content": TextBuffer(),
         "output_tokens": None,
     }
 
     # Process streaming chunks from the API
     for chunk in response:
-        # Extract generation ID for tracking/debugging
-        if not data["generation_id"] and chunk.id:
-            data["generation_id"] = chunk.id
-            logger.debug(
-                f"Response stream started for '{litellm_model_name}' with generation_id='{chunk.id}'",
-                extra={"request": request},
-            )
-        # Extract token count from streaming completion (if available)
-        if hasattr(chunk, "usage") and hasattr(chunk.usage, "completion_tokens"):
-            data["output_tokens"] = chunk.usage.completion_tokens
-            logger.debug(
-                f"reported output tokens for api {endpoint.api_base} and model {litellm_model_name}: {data["output_tokens"]}",
-                extra={"request": request},
-            )
-        # Process content chunks
-        if len(chunk.choices) > 0:
-            choice = cast(litellm.types.utils.StreamingChoices, chunk.choices[0])
-
-            # Accumulate text and reasoning across chunks
-            if delta := choice.get("delta"):
-                # Get the text content of this chunk
-                if content := choice.delta.get("content"):
-                    data["content"] += content
-                # Get reasoning content (for reasoning models)
-                if reasoning := delta.get("reasoning_content") or delta.get("reasoning"):
-                    data["reasoning"] += reasoning
-
-            # Check for generation completion signal
-            if choice.finish_reason == "stop":
-                break
-            elif choice.finish_reason == "length":
-                # Output truncated at max_tokens limit — response is still valid
-                logger.warning(
-                    "output_truncated_at_max_tokens: " + str(chunk),
-                    extra={"request": request},
-                )
-                break
-
+        outcome = _consume_chunk(chunk, data, endpoint, litellm_model_name, request)
+        if outcome == "finished":
+            break
+        if outcome == "partial":
             # Yield partial results for streaming to frontend
             yield data
 
     logger.debug(
-        f"Response stream ended for '{litellm_model_name}' with generation_id='{chunk.id}'",
+        f"Response stream ended for '{litellm_model_name}' with generation_id='{data["generation_id"]}'",
         extra={"request": request},
     )
 
     # Final yield after loop completes
     yield data
+
+
+async def close_provider_stream(
+    response: Any,
+    http_responses: list[httpx.Response] | None = None,
+    reuse: bool = False,
+) -> None:
+    """
+    Close the underlying provider stream of a LiteLLM streaming response.
+
+    Depending on the provider, LiteLLM wraps an openai `AsyncStream` (`close`),
+    an async generator (`aclose`) or only the lines iterator of the HTTP
+    response, so responses received by the shared clients are closed too.
+
+    Args:
+        response: LiteLLM streaming response
+        http_responses: HTTP responses tracked during the call
+        reuse: Whether the stream ended normally, its connection is then kept
+            alive by reading the rest of the response (closed otherwise)
+    """
+    http_responses = http_responses or []
+    if reuse:
+        for http_response in http_responses:
+            try:
+                async with asyncio.timeout(HTTP_DRAIN_TIMEOUT):
+                    async for _ in http_response.stream:  # type: ignore[union-attr]
+                        pass
+            except Exception as e:
+                logger.debug(f"Could not drain provider response: {e}")
+
+    stream = getattr(response, "completion_stream", None)
+    for method_name in ("aclose", "close"):
+        if close := getattr(stream, method_name, None):
+            try:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.debug(f"Could not close provider stream: {e}")
+            break
+
+    for http_response in http_responses:
+        await http_response.aclose()
+
+
+def release_provider_stream(
+    response: Any, http_responses: list[httpx.Response] | None = None
+) -> None:
+    """
+    Close a finished provider stream in a background task, keeping its
+    connection alive without delaying the caller (see `close_provider_stream`).
+    """
+    task = asyncio.create_task(
+        close_provider_stream(response, http_responses, reuse=True)
+    )
+    _drain_tasks.add(task)
+    task.add_done_callback(_drain_tasks.discard)
+
+
+async def litellm_stream_aiter(
+    model_name: str,
+    endpoint: "Endpoint",
+    messages: list["AnyMessage"],
+    temperature: float,
+    max_new_tokens: int,
+    request: Union["Request", None] = None,
+    include_reasoning: bool = False,  # FIXME Legacy ?
+    enable_reasoning: bool = False,  # FIXME Legacy ?
+) -> AsyncGenerator[LLMResponse]:
+    """
+    Stream responses from an LLM API using LiteLLM async API.
+
+    Same as `litellm_stream_iter` but built on `litellm.acompletion` so that
+    network reads never block the event loop.
+
+    Args:
+        model_name: Model id
+        endpoint: Model Endpoint data
+        messages: List of messages to be serialized for llm call
+        temperature: Sampling temperature for response diversity
+        max_new_tokens: Maximum tokens to generate
+        request: FastAPI request for logging
+        include_reasoning: Whether to include reasoning in response
+        enable_reasoning: Whether to enable reasoning mode
+
+    Yields:
+        Dict containing: content, reasoning, output_tokens, generation_id
+    """
+    endpoint = resolve_endpoint(model_name, endpoint)
+    kwargs = _build_completion_kwargs(
+        model_name,
+        endpoint,
+        messages,
+        temperature,
+        max_new_tokens,
+        request,
+        include_reasoning,
+        enable_reasoning,
+    )
+    litellm_model_name = kwargs["model"]
+    # Reuse the endpoint's pooled connections
+    if client := get_endpoint_client(endpoint):
+        kwargs["client"] = client
+
+    # Make the API call through LiteLLM, tracking HTTP responses of the shared clients
+    http_responses: list[httpx.Response] = []
+    token = _http_responses.set(http_responses)
+    try:
+        response: AsyncIterator[litellm.ModelResponse] = await litellm.acompletion(
+            **kwargs
+        )
+    except litellm.ContextWindowExceededError as e:
+        logger.error(
+            f"context_window_exceeded: {litellm_model_name}: {e}",
+            extra={"request": request},
+        )
+        raise ContextTooLongError from e
+    finally:
+        _http_responses.reset(token)
+
+    # Data dict to accumulate response metadata
+    data: LLMResponse = {
+        "generation_id": "",
+        "reasoning": TextBuffer(),
+        "content": TextBuffer(),
+        "output_tokens": None,
+    }
+
+    # Process streaming chunks from the API
+    try:
+        async for chunk in response:
+            outcome = _consume_chunk(chunk, data, endpoint, litellm_model_name, request)
+            if outcome == "finished":
+                break
+            if outcome == "partial":
+                # Yield partial results for streaming to frontend
+                yield data
+    except BaseException:
+        # Release the provider connection right away if the stream is closed early
+        # (client disconnection, cancelled task, etc.)
+        await close_provider_stream(response, http_responses)
+        raise
+
+    logger.debug(
+        f"Response stream ended for '{litellm_model_name}' with generation_id='{data["generation_id"]}'",
+        extra={"request": request},
+    )
+
+    # Final yield after loop completes, then keep the connection alive in background
+    try:
+        yield data
+    finally:
+        release_provider_stream(response, http_responses)
@@ -0,0 +1,95 @@
+"""
+Streaming performance metrics of assistant messages.
+
+Measured in `bot_response_async` and stored in `AssistantMessageMetadata` to
+compare providers performance.
+"""
+
+import time
+
+import numpy as np
+
+
+class StreamMetrics:
+    """
+    Record arrival times of a response stream's text chunks.
+
+    Timings start when the request is sent to the provider, and start again on
+    each retry (see `restart`) so that they only measure the attempt which
+    streamed the response. Only chunks adding content or reasoning text are
+    taken into account.
+    """
+
+    def __init__(self) -> None:
+        self.first_attempt = self.start = time.monotonic()
+        self.end: float | None = None
+        # Arrival time of the first text (content or reasoning) and first content
+        self.first_token: float | None = None
+        self.first_content: float | None = None
+        self.last_chunk: float | None = None
+        self.gaps: list[float] = []
+        self.content_len = 0
+        self.reasoning_len = 0
+
+    def on_chunk(self, content_len: int, reasoning_len: int) -> None:
+        """
+        Record a streamed chunk given the response text lengths after it.
+
+        Args:
+            content_len: Length of the content streamed so far
+            reasoning_len: Length of the reasoning streamed so far
+        """
+        if content_len == self.content_len and reasoning_len == self.reasoning_len:
+            return
+
+        now = time.monotonic()
+        if self.first_token is None:
+            self.first_token = now
+        if self.first_content is None and content_len > 0:
+            self.first_content = now
+        if self.last_chunk is not None:
+            self.gaps.append(now - self.last_chunk)
+
+        self.last_chunk = now
+        self.content_len = content_len
+        self.reasoning_len = reasoning_len
+
+    def restart(self) -> None:
+        """Start timings of a new attempt (retries only happen before any text)."""
+        self.start = time.monotonic()
+
+    def stop(self) -> None:
+        self.end = time.monotonic()
+
+    @property
+    def retry_time(self) -> float:
+        """Time spent on failed attempts and retry delays in seconds."""
+        return self.start - self.first_attempt
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.monotonic()) - self.start
+
+    @property
+    def ttft(self) -> float | None:
+        """Time to first token (content or reasoning) in seconds."""
+        return None if self.first_token is None else self.first_token - self.start
+
+    @property
+    def ttfc(self) -> float | None:
+        """Time to first content token in seconds (after reasoning if any)."""
+        return None if self.first_content is None else self.first_content - self.start
+
+    def chunk_gap(self, percentile: float) -> float | None:
+        """Percentile of the gaps between two chunks in seconds."""
+        if not self.gaps:
+            return None
+        return float(np.percentile(self.gaps, percentile))
+
+    def tokens_per_second(self, output_tokens: int | None) -> float | None:
+        """Output tokens generated per second after the first one."""
+        if not output_tokens or self.first_token is None or self.last_chunk is None:
+            return None
+        if (generation_time := self.last_chunk - self.first_token) <= 0:
+            return None
+        return output_tokens / generation_time
@@ -7,11 +7,20 @@ Defines all data structures for:
 
 from datetime import datetime
 from functools import cached_property
-from typing import Annotated, Literal, TypedDict, Union, get_args
+from typing import TYPE_CHECKING, Annotated, Literal, TypedDict, Union, get_args
 from uuid import uuid4
 
-from pydantic import BaseModel, ConfigDict, Field, PlainSerializer, computed_field
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    PlainSerializer,
+    PrivateAttr,
+    computed_field,
+)
+from pydantic_core import from_json, to_json
 
+from backend.arena.buffer import TextBuffer
 from backend.config import (
     BLIND_MODE_INPUT_CHAR_LEN_LIMIT,
     DEFAULT_SELECTION_MODE,
@@ -23,6 +32,9 @@ from backend.llms.data import get_llms_data
 from backend.llms.models import LLMData, LLMDataEnabled
 from backend.llms.utils import Consumption
 
+if TYPE_CHECKING:
+    from backend.arena.session import SessionData
+
 MessageRole = Literal["user", "assistant", "system"]
 BotPos = Literal["a", "b"]
 BOT_POS: tuple[BotPos, ...] = get_args(BotPos)
@@ -32,6 +44,7 @@ BotChoice = BotPos | Literal["both_equal"]
 class ErrorDetails(BaseModel):
     message: str
     pos: BotPos | None = None
+    code: str | None = None
 
 
 class BaseMessage(BaseModel):
@@ -67,6 +80,16 @@ class AssistantMessageMetadata(BaseModel):
     output_tokens: int | None = None
     # Computed after response
     duration: float | None = None
+    # Streaming performance (seconds, see `backend.arena.metrics`), computed after response
+    ttft: float | None = None  # time to first token (content or reasoning)
+    ttfc: float | None = None  # time to first content token
+    chunk_gap_p50: float | None = None
+    chunk_gap_p95: float | None = None
+    tokens_per_second: float | None = None
+    # Automatic retries of provider errors before the first token (see `backend.arena.retries`)
+    # and the time they took (failed attempts and delays), excluded from the timings above
+    retries: int = 0
+    retry_time: float | None = None
 
 
 class AssistantMessage(BaseMessage):
@@ -82,6 +105,33 @@ class AssistantMessage(BaseMessage):
     metadata: AssistantMessageMetadata
     reaction: Union["ReactionData", None] = None
 
+    # Content and reasoning buffers of the response being streamed, see `bot_response_async`
+    _stream: tuple[TextBuffer, TextBuffer] | None = PrivateAttr(default=None)
+
+    def attach_stream(self, content: TextBuffer, reasoning: TextBuffer) -> None:
+        """Stream text to buffers only synced to `content`/`reasoning` when read."""
+        self._stream = (content, reasoning)
+
+    def sync_stream(self) -> None:
+        """Update `content` and `reasoning` with the text streamed so far."""
+        if self._stream is None:
+            return
+        content, reasoning = self._stream
+        if content or reasoning:
+            self.content = content.getvalue().strip()
+            self.reasoning = reasoning.getvalue().strip()
+
+    def detach_stream(self) -> None:
+        self.sync_stream()
+        self._stream = None
+
+    @property
+    def text_length(self) -> int:
+        """Length of the content and reasoning, including text not synced yet."""
+        if self._stream is not None:
+            return sum(len(buffer) for buffer in self._stream)
+        return len(self.content) + len(self.reasoning)
+
 
 # Union type for any message
 AnyMessage = SystemMessage | UserMessage | AssistantMessage
@@ -126,6 +176,23 @@ class Conversation(BaseModel):
             if isinstance(msg, AssistantMessage) and msg.metadata.output_tokens
         )
 
+    @property
+    def latency(self) -> float | None:
+        """
+        Sum the generation durations of bot messages counted in `tokens`.
+
+        Returns:
+            float | None: Total generation time, None if a message wasn't timed
+        """
+        durations = [
+            msg.metadata.duration
+            for msg in self.messages
+            if isinstance(msg, AssistantMessage) and msg.metadata.output_tokens
+        ]
+        if not durations or None in durations:
+            return None
+        return sum(durations)  # type: ignore[arg-type]
+
     @property
     def reactions(self) -> list["ReactionData"]:
         return [
@@ -201,6 +268,8 @@ class Conversations(BaseModel):
     error: ErrorDetails | None = None
     # Status
     is_streaming: bool = False
+    # Client disconnected before the end of the last responses
+    interrupted: bool = False
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -229,26 +298,100 @@ class Conversations(BaseModel):
         conv = self.conversation_a
         return conv.messages[1 if conv.has_system_msg else 0].content
 
-    def store_to_session(self) -> None:
+    # Data last stored to or retrieved from Redis, to only store what changed since
+    _stored: "SessionData | None" = PrivateAttr(default=None)
+    # Session version of `_stored`
+    _stored_version: int = PrivateAttr(default=0)
+
+    def to_session_data(self) -> "SessionData":
         """
-        Store conversation pair to Redis.
+        Serialize to the session layout: JSON fields and JSON messages of each conversation.
         """
-        from backend.arena.session import store_session_conversations
+        from backend.arena.session import CONVERSATION_FIELDS
+
+        data = self.model_dump(
+            mode="json",
+            exclude=set(CONVERSATION_FIELDS.values()),
+            exclude_computed_fields=True,
+        )
+        meta = {field: to_json(value) for field, value in data.items()}
+        messages: dict[BotPos, list[bytes]] = {}
+        for pos, field in CONVERSATION_FIELDS.items():
+            conv: Conversation = getattr(self, field)
+            meta[field] = conv.model_dump_json(
+                exclude={"messages"}, exclude_computed_fields=True
+            ).encode()
+            messages[pos] = [
+                msg.model_dump_json(exclude_computed_fields=True).encode()
+                for msg in conv.messages
+            ]
+
+        return {"meta": meta, "messages": messages, "legacy": False}
+
+    @staticmethod
+    def from_session_data(data: "SessionData") -> "Conversations":
+        from backend.arena.session import CONVERSATION_FIELDS
 
-        data = self.model_dump(exclude_computed_fields=True)
+        fields = {field: from_json(value) for field, value in data["meta"].items()}
+        for pos, field in CONVERSATION_FIELDS.items():
+            fields[field]["messages"] = [
+                from_json(message) for message in data["messages"][pos]
+            ]
 
-        store_session_conversations(self.session_hash, data)
+        return Conversations(**fields)
+
+    async def store_to_session(self) -> None:
+        """
+        Store conversation pair to Redis, only writing what changed since last stored.
+
+        Conversations are only kept in the `SessionCache` once not streaming,
+        the generation task mutating them until its final store.
+        """
+        from backend.arena.session import (
+            get_session_cache,
+            store_session_conversations,
+        )
+
+        data = self.to_session_data()
+
+        version = await store_session_conversations(
+            self.session_hash, data, self._stored, self._stored_version
+        )
+        self._stored = data
+        self._stored_version = version
+        if not self.is_streaming:
+            get_session_cache().put(self.session_hash, version, self)
 
     @staticmethod
-    def from_session(session_hash: str) -> "Conversations":
+    async def from_session(session_hash: str) -> "Conversations":
         """
         Build a Conversations from data stored in Redis for an active session.
+
+        Conversations last stored by this process are reused if the session
+        wasn't stored since (see `SessionCache`).
         """
-        from backend.arena.session import retrieve_session_conversations
+        from backend.arena.session import (
+            get_session_cache,
+            get_session_version,
+            retrieve_session_conversations,
+        )
+
+        cache = get_session_cache()
+        if cached := cache.pop(session_hash):
+            version, conversations = cached
+            if version == await get_session_version(session_hash):
+                cache.hits += 1
+                return conversations
+        cache.misses += 1
+
+        data, version = await retrieve_session_conversations(session_hash)
 
-        data = retrieve_session_conversations(session_hash)
+        conversations = Conversations.from_session_data(data)
+        # Legacy sessions are fully rewritten to the new layout on next store
+        conversations._stored = None if data["legacy"] else data
+        conversations._stored_version = version
 
-        return Conversations(**data)
+        return conversations
 
 
 def create_conversations(
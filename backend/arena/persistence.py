@@ -279,7 +279,8 @@ def upsert_conv_to_db(data: dict) -> dict:
                 conv_turns = EXCLUDED.conv_turns,
                 total_conv_a_output_tokens = EXCLUDED.total_conv_a_output_tokens,
                 total_conv_b_output_tokens = EXCLUDED.total_conv_b_output_tokens,
-                cohorts = EXCLUDED.cohorts
+                cohorts = EXCLUDED.cohorts,
+                interrupted = EXCLUDED.interrupted
         """)
 
         cursor.execute(upsert_query, data)
@@ -641,6 +642,13 @@ class ConversationMessageRecord(BaseModel):
         duration: (
             float | None
         )  # FIXME could make it required if failed message is deleted before recording
+        ttft: float | None = None
+        ttfc: float | None = None
+        chunk_gap_p50: float | None = None
+        chunk_gap_p95: float | None = None
+        tokens_per_second: float | None = None
+        retries: int | None = None
+        retry_time: float | None = None
 
     role: MessageRole
     content: str
@@ -705,6 +713,8 @@ class ConversationsRecord(BaseModel):
     conversation_b: Annotated[list[ConversationMessageRecord], JSONModelSerializer]
     total_conv_a_output_tokens: int
     total_conv_b_output_tokens: int
+    # Client disconnected before the end of the last responses
+    interrupted: bool = False
 
     # Additional? (not found in record_conversations but present in conversations.sql)
     # archived: bool = False
@@ -718,7 +728,6 @@ class ConversationsRecord(BaseModel):
     # conversation_a_pii_removed: Any = None  # JSONB
     # conversation_b_pii_removed: Any = None  # JSONB
 
-    # TODO: add 'interrupted' bool field?
     # TODO: add `error: boolean` or `error_message: str`, `conv_a|b_error: str`?
 
 
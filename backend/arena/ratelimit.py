@@ -0,0 +1,195 @@
+"""
+Rate limit of pricey models per IP address.
+
+Each IP has a token bucket of `RATELIMIT_PRICEY_BUDGET` characters refilled
+continuously over `RATELIMIT_PRICEY_WINDOW_SECONDS`. New prompts are refused
+while the bucket is empty. Each prompt sent to a pricey model reserves the
+model's weight times its input characters when accepted, and its response is
+charged `RATELIMIT_PRICEY_OUTPUT_WEIGHT` times its output characters once
+generated. The bucket can go below zero: a large prompt or response is paid
+back by a longer wait.
+
+The refill, check and reservation of a prompt run in a single Lua script call,
+so that concurrent prompts of an IP are refused as soon as one of them empties
+the bucket. Only output charges, unknown until responses end, are made later.
+"""
+
+import logging
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+
+from redis.commands.core import AsyncScript
+
+from backend.arena.models import AssistantMessage, Conversations
+from backend.config import settings
+from backend.session import get_async_redis_client
+
+logger = logging.getLogger("languia")
+
+# KEYS[1]: bucket hash (tokens, updated)
+# ARGV[1]: capacity, ARGV[2]: seconds to refill an empty bucket, ARGV[3]: cost to charge,
+# ARGV[4]: "reserve" to only charge if the bucket isn't empty, "charge" to charge anyway
+# Returns the tokens left (as a string, Lua numbers are truncated to integers) and 1 if
+# the cost was charged, 0 if refused
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * capacity / window)
+
+if ARGV[4] == "reserve" and tokens <= 0 then
+    return {tostring(tokens), 0}
+end
+if cost > 0 then
+    tokens = tokens - cost
+    redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+    redis.call("EXPIRE", KEYS[1], math.ceil(window))
+end
+return {tostring(tokens), 1}
+"""
+
+
+@dataclass
+class RateLimit:
+    """Pricey models budget of an IP address, in characters."""
+
+    limit: int
+    tokens: float
+    # Whether the prompt was refused, the budget being exhausted
+    exceeded: bool = False
+
+    @property
+    def remaining(self) -> int:
+        return max(0, math.floor(self.tokens))
+
+    @property
+    def refill_rate(self) -> float:
+        return self.limit / settings.RATELIMIT_PRICEY_WINDOW_SECONDS
+
+    @property
+    def retry_after(self) -> int:
+        """Seconds until new prompts are accepted again."""
+        return math.ceil(max(0.0, -self.tokens) / self.refill_rate) + 1
+
+    @property
+    def reset(self) -> int:
+        """Seconds until the budget is full again."""
+        return math.ceil(max(0.0, self.limit - self.tokens) / self.refill_rate)
+
+    @property
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset),
+        }
+        if self.exceeded:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+def ratelimit_key(ip: str) -> str:
+    return f"ratelimit:pricey:{ip}"
+
+
+@lru_cache
+def _get_token_bucket_script() -> AsyncScript:
+    """Token bucket script, its SHA1 computed once and loaded on first call."""
+    return get_async_redis_client().register_script(TOKEN_BUCKET_SCRIPT)
+
+
+async def _run_token_bucket(ip: str, cost: float, mode: str) -> RateLimit:
+    tokens, charged = await _get_token_bucket_script()(
+        keys=[ratelimit_key(ip)],
+        args=[
+            settings.RATELIMIT_PRICEY_BUDGET,
+            settings.RATELIMIT_PRICEY_WINDOW_SECONDS,
+            cost,
+            mode,
+        ],
+        # Current client, the script's one is closed on shutdown
+        client=get_async_redis_client(),
+    )
+    return RateLimit(
+        limit=settings.RATELIMIT_PRICEY_BUDGET,
+        tokens=float(tokens),
+        exceeded=not int(charged),
+    )
+
+
+async def reserve_rate_limit(ip: str, cost: float) -> RateLimit:
+    """
+    Check the pricey models budget of an IP address and reserve a prompt's cost.
+
+    Args:
+        ip: User's IP address
+        cost: Characters to reserve (see `get_pricey_input_cost`), 0 to only check
+
+    Returns:
+        RateLimit: budget left, exceeded (nothing reserved) if the prompt must be refused
+    """
+    return await _run_token_bucket(ip, cost, "reserve")
+
+
+async def charge_rate_limit(ip: str, cost: float) -> RateLimit:
+    """
+    Charge the pricey models budget of an IP address, even if exhausted.
+
+    Args:
+        ip: User's IP address
+        cost: Characters to charge (see `get_pricey_output_cost`)
+
+    Returns:
+        RateLimit: budget left after the charge
+    """
+    return await _run_token_bucket(ip, cost, "charge")
+
+
+def _pricey_weight(conversations: Conversations, pos: str) -> float:
+    conv = getattr(conversations, f"conversation_{pos}")
+    if not conv.llm.pricey:
+        return 0.0
+    return settings.RATELIMIT_PRICEY_MODELS_WEIGHTS.get(conv.model_name, 1.0)
+
+
+def get_pricey_input_cost(conversations: Conversations, input_chars: int) -> float:
+    """
+    Budget reserved by a prompt sent to the pricey models of a comparison.
+
+    Args:
+        conversations: Conversations the prompt is sent to
+        input_chars: Number of input characters sent to each model
+
+    Returns:
+        float: Weighted characters to reserve, 0 if no model is pricey
+    """
+    return sum(_pricey_weight(conversations, pos) * input_chars for pos in "ab")
+
+
+def get_pricey_output_cost(conversations: Conversations) -> float:
+    """
+    Budget used by the last responses of the pricey models of a comparison.
+
+    Args:
+        conversations: Conversations whose responses were just generated
+
+    Returns:
+        float: Weighted characters to charge, 0 if no model is pricey
+    """
+    cost = 0.0
+    for pos in "ab":
+        messages = getattr(conversations, f"conversation_{pos}").messages
+        if messages and isinstance(message := messages[-1], AssistantMessage):
+            cost += (
+                _pricey_weight(conversations, pos)
+                * settings.RATELIMIT_PRICEY_OUTPUT_WEIGHT
+                * message.text_length
+            )
+    return cost
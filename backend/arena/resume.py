@@ -0,0 +1,413 @@
+"""
+Resumable Server-Sent Events streams backed by Redis Streams.
+
+Model responses are generated (see `backend.arena.generation`) by a task which
+appends every SSE payload to the session's stream. Clients only read the
+stream: the endpoint starting the generation reads it from the start and
+`GET /arena/stream` resumes it after the `Last-Event-ID` the client received
+before a network error, without generating the responses again.
+
+Streams are read without holding a connection of the shared Redis pool:
+- with `GENERATION_MODE=local`, the process generating a stream keeps its
+  payloads in memory and serves its own readers directly. Payloads are only
+  mirrored to a short-lived Redis Stream (unless `SSE_RESUME` is disabled) so
+  that another API worker can resume them,
+- the other readers of a process (generation workers' streams, resumes of
+  another process' streams) are multiplexed by `SSEStreamHub` over a single
+  dedicated connection, reading all their streams with one `XREAD` loop and
+  refreshing their heartbeats in one batch.
+
+Each payload is followed by an `id:` field holding its stream entry id, which
+Redis generates monotonically increasing.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from contextlib import aclosing
+from typing import Any, AsyncGenerator
+
+import redis.asyncio
+from redis.exceptions import RedisError
+
+from backend.config import settings
+from backend.session import get_async_redis_client
+
+logger = logging.getLogger("languia")
+
+# Field marking the end of a stream (no more payloads will be appended)
+SSE_STREAM_END = "end"
+# Max time the hub blocks waiting for new payloads, also the delay before it reads
+# the streams of new readers
+SSE_READ_BLOCK_MS = 100
+SSE_READ_COUNT = 100
+# Seconds between two heartbeats of the readers of a stream
+SSE_HEARTBEAT_INTERVAL = 1.0
+
+SSE_EVENT_ID_RE = re.compile(r"^\d+-\d+$")
+
+# Background publishing tasks, referenced until they finish
+_publishers: set[asyncio.Task] = set()
+# Streams generated by this process, served to its readers without Redis
+_local_writers: dict[str, "SSEStreamWriter"] = {}
+
+
+def sse_stream_key(session_hash: str) -> str:
+    return f"sse:{session_hash}"
+
+
+def sse_readers_key(session_hash: str) -> str:
+    return f"sse:{session_hash}:readers"
+
+
+def _abandon_grace_ms() -> int:
+    """TTL of the readers key, refreshed by readers' heartbeats."""
+    return int(settings.SSE_ABANDON_GRACE_SECONDS * 1000)
+
+
+def format_sse_id(event_id: str) -> str:
+    """
+    Format the id field sent after a payload, updating the client's last event id.
+    """
+    return f"id: {event_id}\n\n"
+
+
+def _parse_event_id(event_id: str) -> tuple[int, int]:
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class SSEStreamWriter:
+    """
+    Append SSE payloads of a session's current generation to its stream.
+
+    Args:
+        session_hash: Unique session identifier
+        local: Whether readers of this process are served from memory
+            (`GENERATION_MODE=local`), else payloads are only written to Redis
+    """
+
+    def __init__(self, session_hash: str, local: bool = False) -> None:
+        self.session_hash = session_hash
+        self.key = sse_stream_key(session_hash)
+        self.readers_key = sse_readers_key(session_hash)
+        self.client = get_async_redis_client()
+        self.local = local
+        # Local streams are only mirrored to Redis to be resumed by other processes
+        self.mirror = settings.SSE_RESUME or not local
+        # Payloads with their ids, and whether the stream ended (local streams)
+        self.entries: list[tuple[str, str]] = []
+        self.ended = False
+        self.changed = asyncio.Condition()
+        self.readers = 0
+        # Since when no local reader read the stream
+        self.unread_since = time.monotonic()
+        # Last generated id when not mirrored
+        self._last_id = (0, 0)
+
+    async def reset(self) -> None:
+        """Drop the previous generation's payloads and mark the client as reading."""
+        if self.local:
+            _local_writers[self.session_hash] = self
+        if not self.mirror:
+            return
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self.key)
+            pipe.set(self.readers_key, 1, px=_abandon_grace_ms())
+            await pipe.execute()
+
+    async def append(self, payload: str) -> None:
+        await self._add({"data": payload})
+
+    async def close(self) -> None:
+        await self._add({SSE_STREAM_END: "1"})
+        if self.local:
+            # Keep the payloads for readers (re)connecting to this process
+            asyncio.get_running_loop().call_later(
+                settings.SSE_RESUME_TTL_SECONDS, _forget_local_writer, self
+            )
+
+    async def is_abandoned(self) -> bool:
+        """
+        Check if no client read the stream during the grace period.
+
+        Returns:
+            bool: True if every client is gone (see `SSEStreamHub` heartbeat)
+        """
+        if self.readers:
+            return False
+        if time.monotonic() - self.unread_since < settings.SSE_ABANDON_GRACE_SECONDS:
+            return False
+        if not self.mirror:
+            return True
+        return not await self.client.exists(self.readers_key)
+
+    async def _add(self, fields: dict[str, str]) -> None:
+        if self.mirror:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.xadd(
+                    self.key,
+                    fields,  # type: ignore[arg-type]
+                    maxlen=settings.SSE_RESUME_MAXLEN,
+                    approximate=True,
+                )
+                pipe.expire(self.key, settings.SSE_RESUME_TTL_SECONDS)
+                entry_id, _ = await pipe.execute()
+        else:
+            entry_id = self._next_id()
+
+        if not self.local:
+            return
+        if SSE_STREAM_END in fields:
+            self.ended = True
+        else:
+            self.entries.append((entry_id, fields["data"]))
+        async with self.changed:
+            self.changed.notify_all()
+
+    def _next_id(self) -> str:
+        ms = int(time.time() * 1000)
+        last_ms, last_seq = self._last_id
+        self._last_id = (ms, 0) if ms > last_ms else (last_ms, last_seq + 1)
+        return "-".join(map(str, self._last_id))
+
+    async def tail(self, last_event_id: str = "0") -> AsyncGenerator[str]:
+        """
+        Read the payloads of a local stream after `last_event_id` until its end.
+
+        Yields:
+            str: SSE payloads, each followed by its id field
+        """
+        after = _parse_event_id(last_event_id)
+        index = 0
+        self.readers += 1
+        try:
+            while True:
+                while index < len(self.entries):
+                    entry_id, payload = self.entries[index]
+                    index += 1
+                    if _parse_event_id(entry_id) > after:
+                        yield payload + format_sse_id(entry_id)
+                if self.ended:
+                    return
+                async with self.changed:
+                    await self.changed.wait_for(
+                        lambda: index < len(self.entries) or self.ended
+                    )
+        finally:
+            self.readers -= 1
+            if not self.readers:
+                self.unread_since = time.monotonic()
+
+
+def _forget_local_writer(writer: SSEStreamWriter) -> None:
+    if _local_writers.get(writer.session_hash) is writer:
+        del _local_writers[writer.session_hash]
+
+
+async def write_sse_stream(
+    writer: SSEStreamWriter, payloads: AsyncGenerator[str]
+) -> None:
+    """
+    Append `payloads` to the stream, then mark its end.
+    """
+    try:
+        async with aclosing(payloads) as stream:
+            async for payload in stream:
+                await writer.append(payload)
+    except Exception as e:
+        logger.error(
+            f"[SSE] Error publishing stream {writer.session_hash}: {e}",
+            exc_info=True,
+        )
+    finally:
+        await writer.close()
+
+
+def publish_sse_stream(writer: SSEStreamWriter, payloads: AsyncGenerator[str]) -> None:
+    """
+    Append `payloads` to the stream in a background task (see `write_sse_stream`).
+
+    The task outlives the request which started it so that responses keep being
+    generated during a client reconnection.
+    """
+    task = asyncio.create_task(write_sse_stream(writer, payloads))
+    _publishers.add(task)
+    task.add_done_callback(_publishers.discard)
+
+
+async def sse_stream_exists(session_hash: str) -> bool:
+    if session_hash in _local_writers:
+        return True
+    return bool(await get_async_redis_client().exists(sse_stream_key(session_hash)))
+
+
+class _HubReader:
+    def __init__(self, last_event_id: str) -> None:
+        self.last_id = _parse_event_id(last_event_id)
+        # Stream entries, None if the stream expired or couldn't be read
+        self.queue: asyncio.Queue[tuple[str, dict[str, str]] | None] = asyncio.Queue()
+
+
+class SSEStreamHub:
+    """
+    Readers of Redis Streams of a process, multiplexed over one connection.
+
+    A single task reads the streams of every reader with one blocking `XREAD`
+    (from the oldest position of their readers) and dispatches the entries.
+    Every `SSE_HEARTBEAT_INTERVAL`, it refreshes the readers keys of all the
+    streams (see `SSEStreamWriter.is_abandoned`) and ends the readers of
+    streams which expired.
+    """
+
+    def __init__(self) -> None:
+        self.client = redis.asyncio.Redis(
+            host=settings.COMPARIA_REDIS_HOST,
+            port=6379,
+            decode_responses=True,
+            single_connection_client=True,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+        )
+        self.readers: dict[str, set[_HubReader]] = {}
+        # Streams which got entries since the last heartbeat
+        self.active: set[str] = set()
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    async def tail(
+        self, session_hash: str, last_event_id: str = "0", request: Any = None
+    ) -> AsyncGenerator[str]:
+        """
+        Read a session's stream after `last_event_id` until its end.
+
+        Yields:
+            str: SSE payloads, each followed by its id field
+        """
+        key = sse_stream_key(session_hash)
+        reader = _HubReader(last_event_id)
+        self.readers.setdefault(key, set()).add(reader)
+        self.active.add(key)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        self.wakeup.set()
+
+        try:
+            while item := await reader.queue.get():
+                entry_id, fields = item
+                if SSE_STREAM_END in fields:
+                    return
+                yield fields["data"] + format_sse_id(entry_id)
+            logger.warning(
+                f"[SSE] Stream {session_hash} expired before its end",
+                extra={"request": request},
+            )
+        finally:
+            if readers := self.readers.get(key):
+                readers.discard(reader)
+                if not readers:
+                    del self.readers[key]
+
+    async def run(self) -> None:
+        next_heartbeat = 0.0
+        while True:
+            if not self.readers:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            try:
+                if time.monotonic() >= next_heartbeat:
+                    next_heartbeat = time.monotonic() + SSE_HEARTBEAT_INTERVAL
+                    await self._heartbeat()
+                if self.readers:
+                    await self._read()
+            except RedisError as e:
+                logger.error(f"[SSE] Error reading streams: {e}")
+                for readers in self.readers.values():
+                    for reader in readers:
+                        reader.queue.put_nowait(None)
+                self.readers.clear()
+
+    async def _read(self) -> None:
+        streams = {
+            key: "-".join(map(str, min(reader.last_id for reader in readers)))
+            for key, readers in self.readers.items()
+        }
+        response = await self.client.xread(
+            streams,  # type: ignore[arg-type]
+            count=SSE_READ_COUNT,
+            block=SSE_READ_BLOCK_MS,
+        )
+        for key, entries in response or []:
+            self.active.add(key)
+            for reader in self.readers.get(key, ()):
+                for entry_id, fields in entries:
+                    if (parsed_id := _parse_event_id(entry_id)) > reader.last_id:
+                        reader.last_id = parsed_id
+                        reader.queue.put_nowait((entry_id, fields))
+
+    async def _heartbeat(self) -> None:
+        keys = list(self.readers)
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(f"{key}:readers", 1, px=_abandon_grace_ms())
+                pipe.exists(key)
+            results = await pipe.execute()
+
+        for key, exists in zip(keys, results[1::2]):
+            # Streams are only deleted on reset, or expire once idle
+            if not exists and key not in self.active:
+                for reader in self.readers.pop(key, ()):
+                    reader.queue.put_nowait(None)
+        self.active.clear()
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+        await self.client.aclose()
+
+
+_hub: SSEStreamHub | None = None
+
+
+def get_sse_hub() -> SSEStreamHub:
+    global _hub
+    if _hub is None:
+        _hub = SSEStreamHub()
+    return _hub
+
+
+async def close_sse_hub() -> None:
+    global _hub
+    if _hub is not None:
+        await _hub.close()
+        _hub = None
+
+
+async def tail_sse_stream(
+    session_hash: str, last_event_id: str = "0", request: Any = None
+) -> AsyncGenerator[str]:
+    """
+    Read a session's stream after `last_event_id` until its end.
+
+    Streams generated by this process are read from memory, other streams thru
+    the process' `SSEStreamHub`, which keeps their generation going while read.
+
+    Args:
+        session_hash: Unique session identifier
+        last_event_id: Last stream entry id received by the client, "0" to read from the start
+        request: FastAPI Request object for logging
+
+    Yields:
+        str: SSE payloads, each followed by its id field
+    """
+    if writer := _local_writers.get(session_hash):
+        stream = writer.tail(last_event_id)
+    else:
+        stream = get_sse_hub().tail(session_hash, last_event_id, request)
+
+    async with aclosing(stream):
+        async for payload in stream:
+            yield payload
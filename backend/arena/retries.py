@@ -0,0 +1,77 @@
+"""
+Automatic retries of transient provider errors before a response started.
+
+Rate limits (429) and unavailable upstreams (502, 503) often only last a few
+seconds: `bot_response_async` retries such errors as long as no text was
+streamed, up to `LLM_RETRY_MAX_ATTEMPTS` times. Retries wait for the
+provider's `Retry-After` if any, else for an exponential backoff with full
+jitter, and are only made if the retried request can be sent within
+`LLM_RETRY_BUDGET` seconds of the first one.
+"""
+
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from backend.config import settings
+
+# HTTP status codes of transient provider errors
+RETRYABLE_STATUS_CODES = (429, 502, 503)
+
+
+def get_retry_after(error: Exception) -> float | None:
+    """
+    Seconds to wait before retrying according to the error's `Retry-After` header.
+
+    Args:
+        error: Provider error (LiteLLM errors carry the response headers, OpenAI
+            errors the HTTP response)
+
+    Returns:
+        float | None: seconds to wait, None if the header is missing or invalid
+    """
+    headers = getattr(error, "litellm_response_headers", None)
+    if headers is None and isinstance(
+        response := getattr(error, "response", None), httpx.Response
+    ):
+        headers = response.headers
+    if not headers or not (value := httpx.Headers(headers).get("retry-after")):
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_retry_delay(error: Exception, attempt: int, started: float) -> float | None:
+    """
+    Seconds to wait before retrying a request which failed before streaming any text.
+
+    Args:
+        error: Error raised by the provider stream
+        attempt: Number of retries already made
+        started: `time.monotonic()` when the first request was sent
+
+    Returns:
+        float | None: delay before the next attempt, None if it shouldn't be retried
+    """
+    if attempt >= settings.LLM_RETRY_MAX_ATTEMPTS:
+        return None
+    if getattr(error, "status_code", None) not in RETRYABLE_STATUS_CODES:
+        return None
+
+    delay = get_retry_after(error)
+    if delay is None:
+        backoff = settings.LLM_RETRY_BASE_DELAY * 2**attempt
+        delay = random.uniform(0, min(settings.LLM_RETRY_MAX_DELAY, backoff))
+
+    if time.monotonic() + delay - started > settings.LLM_RETRY_BUDGET:
+        return None
+    return delay
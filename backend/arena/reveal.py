@@ -86,20 +86,21 @@ def get_reveal_data(conversations: Conversations, chosen_llm: BotChoice) -> Reve
     import base64
     import json
 
-    # TODO: Add request_latency for more accurate impact calculations
-    # Currently not tracked; would need start/finish timestamps from Conversation
-    # Compute it for each exchange (user prompt/llm response)
-    # request_latency = conv.finish_tstamp - conv.start_tstamp
     # Calculate environmental impact using ecologits library
-    # Uses llm params, active params (for MoE) and token count
+    # Uses llm params, active params (for MoE), token count and measured generation
+    # time (request latency) as an upper bound of the inference time
     conv_a = conversations.conversation_a
     tokens_a = conv_a.tokens
-    conso_a = get_llm_consumption(conv_a.llm, tokens_a)
-    logger.debug(f"[REVEAL] output_tokens (llm 'a'): {tokens_a}")
+    conso_a = get_llm_consumption(conv_a.llm, tokens_a, conv_a.latency)
+    logger.debug(
+        f"[REVEAL] output_tokens (llm 'a'): {tokens_a}, latency: {conv_a.latency}"
+    )
     conv_b = conversations.conversation_b
     tokens_b = conv_b.tokens
-    conso_b = get_llm_consumption(conv_b.llm, tokens_b)
-    logger.debug(f"[REVEAL] output_tokens (llm 'b'): {tokens_b}")
+    conso_b = get_llm_consumption(conv_b.llm, tokens_b, conv_b.latency)
+    logger.debug(
+        f"[REVEAL] output_tokens (llm 'b'): {tokens_b}, latency: {conv_b.latency}"
+    )
 
     # Encode summary as base64 for safe storage/transmission (share feature)
     jsonstring = json.dumps(
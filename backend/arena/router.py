@@ -1,9 +1,10 @@
 import logging
-from typing import Annotated, AsyncGenerator, TypedDict
+from typing import Annotated, NoReturn, TypedDict
 
 from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 from fastapi.responses import StreamingResponse
 
+from backend.arena.generation import start_generation
 from backend.arena.models import (
     AddFirstTextBody,
     AddTextBody,
@@ -23,10 +24,18 @@ from backend.arena.persistence import (
     record_reaction,
     record_vote,
 )
+from backend.arena.ratelimit import (
+    RateLimit,
+    get_pricey_input_cost,
+    reserve_rate_limit,
+)
+from backend.arena.resume import SSE_EVENT_ID_RE, sse_stream_exists, tail_sse_stream
 from backend.arena.reveal import get_chosen_llm, get_reveal_data
-from backend.arena.session import create_session, increment_input_chars, is_ratelimited
-from backend.arena.streaming import create_sse_response, stream_comparison_messages
-from backend.llms.data import get_llms_data
+from backend.arena.session import create_session
+from backend.arena.sse import SSEProtocol, SSEProtocolAnno
+from backend.arena.streaming import AnySSEEvent, create_sse_response
+from backend.llms.data import NoModelAvailableError, get_llms_data
+from backend.llms.limiter import get_saturated_models
 from backend.utils.countries import CountryPortalAnno
 from backend.utils.user import get_ip, get_matomo_tracker_from_cookies
 
@@ -41,11 +50,31 @@ router = APIRouter(
 # Dependencies
 
 
-def assert_not_rate_limited(request: Request) -> None:
-    """Dependency to check rate limiting based on IP address."""
+async def assert_not_rate_limited(
+    request: Request, conversations: Conversations, input_chars: int
+) -> None:
+    """
+    Check rate limiting based on IP address and reserve the prompt's cost.
+
+    Both are done in one atomic call (see `backend.arena.ratelimit`), before
+    the conversations are stored as streaming. The IP's budget is kept in
+    `request.state.rate_limit` for the response headers.
+
+    Args:
+        request: FastAPI request
+        conversations: Conversations the prompt is sent to
+        input_chars: Number of input characters sent to each model
+
+    Raises:
+        HTTPException: If the IP's budget is exhausted
+    """
     ip = get_ip(request)
+    rate_limit = await reserve_rate_limit(
+        ip, get_pricey_input_cost(conversations, input_chars)
+    )
+    request.state.rate_limit = rate_limit
 
-    if is_ratelimited(ip):
+    if rate_limit.exceeded:
         logger.error(
             f"Too much text submitted to pricey models for ip {ip}",
             extra={"request": request},
@@ -53,9 +82,26 @@ def assert_not_rate_limited(request: Request) -> None:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Vous avez trop sollicité les modèles parmi les plus onéreux, veuillez réessayer dans quelques heures. Vous pouvez toujours solliciter des modèles plus petits.",
+            headers=rate_limit.headers,
         )
 
 
+def raise_no_model_available(
+    error: NoModelAvailableError, request: Request
+) -> NoReturn:
+    """
+    Refuse a prompt whose models selection pool has no model left, with a message
+    shown to the user.
+
+    Raises:
+        HTTPException: 503 error with the message as detail
+    """
+    logger.error(f"No model left to pick: {error}", extra={"request": request})
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(error)
+    ) from error
+
+
 def get_session_hash(session_hash: str = Header(..., alias="X-Session-Hash")) -> str:
     """
     Dependency to extract and validate session hash from headers.
@@ -76,9 +122,11 @@ def get_session_hash(session_hash: str = Header(..., alias="X-Session-Hash")) ->
     return session_hash
 
 
-def get_conversations(session_hash: str = Depends(get_session_hash)) -> Conversations:
+async def get_conversations(
+    session_hash: str = Depends(get_session_hash),
+) -> Conversations:
     try:
-        conversations = Conversations.from_session(session_hash)
+        conversations = await Conversations.from_session(session_hash)
     except Exception as e:
         # FIXME raise different errors depending on problem
         raise HTTPException(
@@ -98,12 +146,45 @@ def get_conversations(session_hash: str = Depends(get_session_hash)) -> Conversa
 
 ConversationsAnno = Annotated[Conversations, Depends(get_conversations)]
 
+
+async def _start_stream(
+    conversations: Conversations,
+    request: Request,
+    sse_protocol: SSEProtocol,
+    *events: AnySSEEvent,
+) -> StreamingResponse:
+    """
+    Start generating both model responses and stream them.
+
+    Args:
+        conversations: Conversations to stream responses for
+        request: FastAPI request for logging and rate limiting
+        sse_protocol: SSE protocol version requested by the client
+        events: Events to send before the responses
+
+    Returns:
+        StreamingResponse: SSE stream of the session's resumable stream, with
+            the pricey models budget left after this turn's prompt in X-RateLimit-* headers
+    """
+    await start_generation(conversations, request, sse_protocol, *events)
+
+    rate_limit: RateLimit | None = getattr(request.state, "rate_limit", None)
+    return create_sse_response(
+        tail_sse_stream(conversations.session_hash, "0", request),
+        request.headers.get("accept-encoding"),
+        rate_limit.headers if rate_limit else None,
+    )
+
+
 # FIXME log conversation session data (ip, portal, cohorts, conv id) in routes?
 
 
-@router.post("/add_first_text", dependencies=[Depends(assert_not_rate_limited)])
+@router.post("/add_first_text")
 async def add_first_text(
-    args: AddFirstTextBody, country_portal: CountryPortalAnno, request: Request
+    args: AddFirstTextBody,
+    country_portal: CountryPortalAnno,
+    sse_protocol: SSEProtocolAnno,
+    request: Request,
 ) -> StreamingResponse:
     """
     Process user's first message and initiate model comparison.
@@ -116,6 +197,7 @@ async def add_first_text(
 
     Args:
         args: Request body with prompt, mode, and optional custom model selection
+        sse_protocol: SSE protocol version requested by the client
         request: FastAPI request for logging and rate limiting
 
     Returns:
@@ -130,9 +212,16 @@ async def add_first_text(
     )
     logger.info(f"country_portal: {country_portal}")
 
-    # Select models
+    # Select models, preferring ones with spare request capacity
     models = get_llms_data(country_portal)
-    model_a_id, model_b_id = models.pick_two(args.mode, args.custom_models_selection)
+    try:
+        model_a_id, model_b_id = models.pick_two(
+            args.mode,
+            args.custom_models_selection,
+            saturated_models=get_saturated_models(models.enabled.values()),
+        )
+    except NoModelAvailableError as e:
+        raise_no_model_available(e, request)
 
     logger.info(
         f"Selected models: {model_a_id} vs {model_b_id}", extra={"request": request}
@@ -157,40 +246,28 @@ async def add_first_text(
         extra={"request": request},
     )
 
+    await assert_not_rate_limited(request, conversations, len(args.prompt_value))
+
     conversations.is_streaming = True
     # Store Conversations to redis/db/logs
-    conversations.store_to_session()
+    await conversations.store_to_session()
     # Record for questions only dataset and stats on ppl abandoning before generation completion
     record_conversations(conversations)
 
-    # Stream responses
-    async def event_stream() -> AsyncGenerator[str]:
-        # Send session hash first
-        import json
-
-        yield f"data: {json.dumps({'type': 'init', 'session_hash': session_hash})}\n\n"
-
-        # Stream both model responses
-        async for chunk in stream_comparison_messages(conversations, request):
-            yield chunk
-
-        # Increment input chars for pricey llms
-        for conv in [conversations.conversation_a, conversations.conversation_b]:
-            if conv.llm.pricey:
-                increment_input_chars(get_ip(request), len(args.prompt_value))
-
-        conversations.is_streaming = False
-        # After streaming completes, store Conversations to redis/db/logs
-        conversations.store_to_session()
-        record_conversations(conversations)
-
-    return create_sse_response(event_stream())
+    # Stream responses, send session hash first
+    return await _start_stream(
+        conversations,
+        request,
+        sse_protocol,
+        {"type": "init", "session_hash": session_hash},
+    )
 
 
-@router.post("/add_text", dependencies=[Depends(assert_not_rate_limited)])
+@router.post("/add_text")
 async def add_text(
     args: AddTextBody,
     conversations: ConversationsAnno,
+    sse_protocol: SSEProtocolAnno,
     request: Request,
 ) -> StreamingResponse:
     """
@@ -199,6 +276,7 @@ async def add_text(
     Args:
         args: Request body with message content
         conversations: Conversations from session_hash
+        sse_protocol: SSE protocol version requested by the client
         request: FastAPI request for logging
 
     Returns:
@@ -217,33 +295,22 @@ async def add_text(
     conversations.conversation_a.messages.append(user_message)
     conversations.conversation_b.messages.append(user_message)
 
+    await assert_not_rate_limited(request, conversations, len(args.message))
+
     conversations.is_streaming = True
     # Store Conversations to redis/db/logs
-    conversations.store_to_session()
+    await conversations.store_to_session()
     # Record for questions only dataset and stats on ppl abandoning before generation completion
     record_conversations(conversations)
 
     # Stream responses
-    async def event_stream() -> AsyncGenerator[str]:
-        async for chunk in stream_comparison_messages(conversations, request):
-            yield chunk
-
-        # Increment input chars for pricey llms
-        for conv in [conversations.conversation_a, conversations.conversation_b]:
-            if conv.llm.pricey:
-                increment_input_chars(get_ip(request), len(args.message))
-
-        conversations.is_streaming = False
-        # After streaming completes, store Conversations to redis/db/logs
-        conversations.store_to_session()
-        record_conversations(conversations)
-
-    return create_sse_response(event_stream())
+    return await _start_stream(conversations, request, sse_protocol)
 
 
-@router.post("/retry", dependencies=[Depends(assert_not_rate_limited)])
+@router.post("/retry")
 async def retry(
     conversations: ConversationsAnno,
+    sse_protocol: SSEProtocolAnno,
     request: Request,
 ) -> StreamingResponse:
     """
@@ -253,6 +320,7 @@ async def retry(
 
     Args:
         conversations: Conversations from session_hash
+        sse_protocol: SSE protocol version requested by the client
         request: FastAPI request for logging
 
     Returns:
@@ -304,10 +372,14 @@ async def retry(
                 conversations.custom_models_selection = None
 
             # Repick a model ids excluding current ones
-            new_model_id, _ = models.pick_two(
-                conversations.mode,
-                unavailable_models=[conv_a.model_name, conv_b.model_name],
-            )
+            try:
+                new_model_id, _ = models.pick_two(
+                    conversations.mode,
+                    unavailable_models=[conv_a.model_name, conv_b.model_name],
+                    saturated_models=get_saturated_models(models.enabled.values()),
+                )
+            except NoModelAvailableError as e:
+                raise_no_model_available(e, request)
             logger.info(
                 f"reinitializing conv {pos} w/ new model: {new_model_id}",
                 extra={"request": request},
@@ -327,9 +399,11 @@ async def retry(
 
     conversations.error = None
 
+    await assert_not_rate_limited(request, conversations, len(last_user_msg.content))
+
     conversations.is_streaming = True
     # Store Conversations to redis/db/logs
-    conversations.store_to_session()
+    await conversations.store_to_session()
     # Record for questions only dataset and stats on ppl abandoning before generation completion
     record_conversations(conversations)
 
@@ -338,21 +412,53 @@ async def retry(
     )
 
     # Re-stream responses
-    async def event_stream() -> AsyncGenerator[str]:
-        async for chunk in stream_comparison_messages(conversations, request):
-            yield chunk
+    return await _start_stream(conversations, request, sse_protocol)
 
-        # Increment input chars for pricey llms
-        for conv in [conversations.conversation_a, conversations.conversation_b]:
-            if conv.llm.pricey:
-                increment_input_chars(get_ip(request), len(last_user_msg.content))
 
-        conversations.is_streaming = False
-        # After streaming completes, store Conversations to redis/db/logs
-        conversations.store_to_session()
-        record_conversations(conversations)
+@router.get("/stream")
+async def resume_stream(
+    request: Request,
+    session_hash: str = Depends(get_session_hash),
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
+) -> StreamingResponse:
+    """
+    Resume the SSE stream of the session's last generation after a network error.
+
+    Events sent after `Last-Event-ID` are replayed, then the stream goes on with
+    the responses still being generated.
 
-    return create_sse_response(event_stream())
+    Args:
+        request: FastAPI request for logging
+        session_hash: Session identifier from X-Session-Hash header
+        last_event_id: Id of the last event received, replays all events if missing
+            (which also resyncs a client's messages, see `backend.arena.sse`)
+
+    Returns:
+        StreamingResponse: SSE stream starting after `Last-Event-ID`
+
+    Raises:
+        HTTPException: If the event id is invalid or the stream expired
+    """
+    logger.info(
+        f"'/stream' session={session_hash} resuming after {last_event_id}",
+        extra={"request": request},
+    )
+
+    if last_event_id is not None and not SSE_EVENT_ID_RE.match(last_event_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid Last-Event-ID: '{last_event_id}'",
+        )
+    if not await sse_stream_exists(session_hash):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="La réponse des modèles n'est plus disponible, veuillez recharger la page.",
+        )
+
+    return create_sse_response(
+        tail_sse_stream(session_hash, last_event_id or "0", request),
+        request.headers.get("accept-encoding"),
+    )
 
 
 ReactReturnType = TypedDict("ReactReturnType", {"reaction": ReactionData | None})
@@ -410,7 +516,7 @@ async def react(
         # A reaction has been undone, remove it from its message and db
         message.reaction = None
         # Store conversations with removed reaction
-        conversations.store_to_session()
+        await conversations.store_to_session()
         # Delete db reaction
         delete_reaction(conv, msg_index)
 
@@ -422,7 +528,7 @@ async def react(
 
     message.reaction = reaction
     # Store conversations with updated reaction to redis
-    conversations.store_to_session()
+    await conversations.store_to_session()
     # Store reaction to db/logs
     reaction_record = record_reaction(
         conversations=conversations,
@@ -474,7 +580,7 @@ async def vote(
 
     conversations.vote = vote_body
     # Store conversations with updated vote to redis
-    conversations.store_to_session()
+    await conversations.store_to_session()
 
     # Save vote to database with prefs and comments
     record_vote(
@@ -4,13 +4,19 @@ Arena session management for conversation state in Redis.
 Handles storing and retrieving conversation pairs during active arena sessions.
 """
 
-import json
 import logging
-from typing import Awaitable
+from collections import OrderedDict
+from typing import TypedDict
 from uuid import uuid4
 
-from backend.config import RATELIMIT_PRICEY_MODELS_INPUT
-from backend.session import get_redis_client
+from pydantic_core import from_json, to_json
+from redis.asyncio.client import Pipeline
+from redis.exceptions import WatchError
+
+from backend.arena.codec import decode_session_value, encode_session_value
+from backend.arena.models import BOT_POS, BotPos, Conversations
+from backend.config import settings
+from backend.session import get_async_redis_bytes_client, get_async_redis_client
 
 logger = logging.getLogger("languia")
 
@@ -25,121 +31,322 @@ def create_session() -> str:
     return str(uuid4())
 
 
-def store_session_conversations(session_hash: str, data: dict) -> None:
+# Sessions expire 24 hours after their last update
+SESSION_TTL_SECONDS = 86400
+# Fields of the session metadata hash holding a conversation (without its messages)
+CONVERSATION_FIELDS: dict[BotPos, str] = {
+    "a": "conversation_a",
+    "b": "conversation_b",
+}
+
+
+class SessionData(TypedDict):
+    """
+    Serialized Conversations as stored in Redis (values encoded with `backend.arena.codec`).
+
+    Attributes:
+        meta: JSON value of each Conversations field, conversations without
+            their messages (hash `session:{hash}:meta`)
+        messages: JSON messages of each conversation (lists `session:{hash}:messages:{pos}`)
+        legacy: Whether it was read from a legacy session (single JSON blob)
+    """
+
+    meta: dict[str, bytes]
+    messages: dict[BotPos, list[bytes]]
+    legacy: bool
+
+
+def session_meta_key(session_hash: str) -> str:
+    return f"session:{session_hash}:meta"
+
+
+def session_messages_key(session_hash: str, pos: BotPos) -> str:
+    return f"session:{session_hash}:messages:{pos}"
+
+
+def session_version_key(session_hash: str) -> str:
+    return f"session:{session_hash}:version"
+
+
+def legacy_session_key(session_hash: str) -> str:
+    return f"session:{session_hash}"
+
+
+def _session_keys(session_hash: str) -> list[str]:
+    return [
+        session_meta_key(session_hash),
+        *(session_messages_key(session_hash, pos) for pos in BOT_POS),
+    ]
+
+
+# Attempts to store a session written concurrently by another request
+SESSION_STORE_ATTEMPTS = 3
+
+
+def _queue_session_writes(
+    pipe: Pipeline, session_hash: str, data: SessionData, stored: SessionData | None
+) -> None:
+    """Queue the commands writing what changed since `stored` (everything if None)."""
+    if stored is None:
+        pipe.delete(legacy_session_key(session_hash), *_session_keys(session_hash))
+        stored = {"meta": {}, "messages": {"a": [], "b": []}, "legacy": False}
+
+    if meta := {
+        field: value
+        for field, value in data["meta"].items()
+        if stored["meta"].get(field) != value
+    }:
+        pipe.hset(
+            session_meta_key(session_hash),
+            mapping={
+                field: encode_session_value(value) for field, value in meta.items()
+            },
+        )
+
+    for pos in BOT_POS:
+        key = session_messages_key(session_hash, pos)
+        messages, stored_messages = data["messages"][pos], stored["messages"][pos]
+        for index, (message, stored_message) in enumerate(
+            zip(messages, stored_messages)
+        ):
+            if message != stored_message:
+                pipe.lset(key, index, encode_session_value(message))
+        if not messages:
+            pipe.delete(key)
+        elif len(messages) < len(stored_messages):
+            pipe.ltrim(key, 0, len(messages) - 1)
+        elif len(messages) > len(stored_messages):
+            pipe.rpush(
+                key,
+                *(
+                    encode_session_value(message)
+                    for message in messages[len(stored_messages) :]
+                ),
+            )
+
+
+async def store_session_conversations(
+    session_hash: str,
+    data: SessionData,
+    stored: SessionData | None = None,
+    stored_version: int = 0,
+) -> int:
     """
     Store conversation pair with metadata in Redis for an active session.
 
+    Only what changed since `stored` is written: updated metadata fields,
+    appended, updated or removed messages. Everything is written if `stored`
+    is None, replacing the legacy session if any.
+
+    The diff only applies to the session as it was stored: if the session
+    version isn't `stored_version` anymore (another request stored it since),
+    or changes before the transaction runs (WATCH), the whole session is
+    rewritten instead, so that the last writer wins.
+
     Args:
         session_hash: Unique session identifier
         data: serialized conversations data (see Conversations.store_to_session)
+        stored: data last stored or retrieved for this session
+        stored_version: session version when `stored` was stored or retrieved
+
+    Returns:
+        int: Session version, incremented on each store
 
     Note:
         Session expires after 24 hours
     """
-    expire_time = 86400  # 24 hours
+    version_key = session_version_key(session_hash)
+    keys = [*_session_keys(session_hash), version_key]
 
     try:
-        client = get_redis_client()
-        client.setex(f"session:{session_hash}", expire_time, json.dumps(data))
+        client = get_async_redis_bytes_client()
+        async with client.pipeline(transaction=True) as pipe:
+            for attempt in range(SESSION_STORE_ATTEMPTS):
+                try:
+                    await pipe.watch(version_key)
+                    current_version = int(await pipe.get(version_key) or 0)
+                    if stored is not None and current_version != stored_version:
+                        logger.warning(
+                            f"[SESSION] {session_hash} was stored concurrently, rewriting it"
+                        )
+                        stored = None
+
+                    pipe.multi()
+                    _queue_session_writes(pipe, session_hash, data, stored)
+                    # Never reset, so that a cached version can't match a rewritten session
+                    pipe.incr(version_key)
+                    for key in keys:
+                        pipe.expire(key, SESSION_TTL_SECONDS)
+                    results = await pipe.execute()
+                    break
+                except WatchError:
+                    if attempt == SESSION_STORE_ATTEMPTS - 1:
+                        raise
+                    stored = None
+                    await pipe.reset()
+            version = results[-len(keys) - 1]
+
         logger.info(f"[SESSION] Stored conversations for {session_hash}")
+        return version
     except Exception as e:
         logger.error(f"[SESSION] Error storing session: {e}")
         raise
 
 
-def retrieve_session_conversations(
+def _from_legacy_session(data: dict) -> SessionData:
+    """Split a legacy session blob into the metadata and messages layout."""
+    conversations = {pos: data.pop(field) for pos, field in CONVERSATION_FIELDS.items()}
+    meta = {field: to_json(value) for field, value in data.items()}
+    messages: dict[BotPos, list[bytes]] = {}
+    for pos, field in CONVERSATION_FIELDS.items():
+        messages[pos] = [
+            to_json(message) for message in conversations[pos].pop("messages")
+        ]
+        meta[field] = to_json(conversations[pos])
+
+    return {
+        "meta": meta,
+        "messages": messages,
+        "legacy": True,
+    }
+
+
+async def retrieve_session_conversations(
     session_hash: str,
-) -> dict:
+) -> tuple[SessionData, int]:
     """
     Retrieve conversation pair and metadata from Redis.
 
+    Sessions stored before the metadata and messages layout are read from
+    their single JSON blob, values stored before versioning as plain JSON.
+
     Args:
         session_hash: Unique session identifier
 
     Returns:
-        Conversations serialized data
+        Conversations serialized data and session version (0 if legacy)
 
     Raises:
         ValueError: If session not found or expired
     """
     try:
-        client = get_redis_client()
-        data = client.get(f"session:{session_hash}")
-        assert not isinstance(data, Awaitable)
-        if not data:
+        client = get_async_redis_bytes_client()
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hgetall(session_meta_key(session_hash))
+            for pos in BOT_POS:
+                pipe.lrange(session_messages_key(session_hash, pos), 0, -1)
+            pipe.get(session_version_key(session_hash))
+            meta, messages_a, messages_b, version = await pipe.execute()
+
+        if meta:
+            logger.info(f"[SESSION] Retrieved conversations for {session_hash}")
+            data: SessionData = {
+                "meta": {
+                    field.decode(): decode_session_value(value)
+                    for field, value in meta.items()
+                },
+                "messages": {
+                    pos: [decode_session_value(message) for message in messages]
+                    for pos, messages in zip(BOT_POS, (messages_a, messages_b))
+                },
+                "legacy": False,
+            }
+            return data, int(version or 0)
+
+        if not (blob := await client.get(legacy_session_key(session_hash))):
             logger.warning(f"[SESSION] Session not found: {session_hash}")
             raise ValueError(f"Session not found: {session_hash}")
 
-        # parsed = json.loads(data)
-        logger.info(f"[SESSION] Retrieved conversations for {session_hash}")
+        logger.info(f"[SESSION] Retrieved legacy conversations for {session_hash}")
 
-        return json.loads(data)
+        return _from_legacy_session(from_json(decode_session_value(blob))), 0
 
-    except json.JSONDecodeError as e:
-        logger.error(f"[SESSION] Error decoding session data: {e}")
-        raise ValueError(f"Invalid session data for {session_hash}")
     except Exception as e:
         logger.error(f"[SESSION] Error retrieving session: {e}")
         raise
 
 
-# FIXME unused?
-def delete_session(session_hash: str) -> bool:
+async def get_session_version(session_hash: str) -> int:
     """
-    Delete a session from Redis.
+    Current version of a session (0 if not found or legacy).
 
     Args:
         session_hash: Unique session identifier
-
-    Returns:
-        bool: True if session was deleted, False if it didn't exist
     """
-    try:
-        client = get_redis_client()
-        deleted = client.delete(f"session:{session_hash}")
-        logger.info(f"[SESSION] Deleted session {session_hash}: {bool(deleted)}")
-        return bool(deleted)
-    except Exception as e:
-        logger.error(f"[SESSION] Error deleting session: {e}")
-        return False
+    client = get_async_redis_client()
+    return int(await client.get(session_version_key(session_hash)) or 0)
 
 
-def increment_input_chars(ip: str, input_chars: int) -> None:
+class SessionCache:
     """
-    Track input character count per IP address for rate limiting.
+    Conversations last stored by this process, with their session version.
 
-    Increments a counter in Redis for the given IP and sets expiry to 2 hours.
-    This prevents users from overloading expensive model APIs.
+    The same worker usually serves the next call of a session it just stored,
+    which then only checks the session version instead of reading, decoding
+    and validating it again. Entries are taken out of the cache when read, so
+    that the request owns the object (no copy): it is cached again by the
+    final store of its generation, and dropped if the request fails before.
+    """
 
-    Args:
-        ip: User's IP address
-        input_chars: Number of input characters to add to counter
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.entries: OrderedDict[str, tuple[int, Conversations]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
 
-    Returns:
-        bool: False if Redis not configured, True otherwise
-    """
-    client = get_redis_client()
-    # Increment counter under key "ip:{ip}"
-    client.incrby(f"ip:{ip}", input_chars)
-    # Set counter to expire in 2 hours (3600 * 2 seconds)
-    client.expire(f"ip:{ip}", 3600 * 2)
+    def put(
+        self, session_hash: str, version: int, conversations: Conversations
+    ) -> None:
+        if self.maxsize <= 0:
+            return
+        self.entries[session_hash] = (version, conversations)
+        self.entries.move_to_end(session_hash)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
 
+    def pop(self, session_hash: str) -> tuple[int, Conversations] | None:
+        return self.entries.pop(session_hash, None)
 
-def is_ratelimited(ip: str) -> bool:
+    def discard(self, session_hash: str) -> None:
+        self.entries.pop(session_hash, None)
+
+
+_session_cache: SessionCache | None = None
+
+
+def get_session_cache() -> SessionCache:
+    global _session_cache
+    if _session_cache is None:
+        _session_cache = SessionCache(settings.SESSION_CACHE_SIZE)
+    return _session_cache
+
+
+# FIXME unused?
+async def delete_session(session_hash: str) -> bool:
     """
-    Check if an IP address has exceeded rate limit for expensive models.
+    Delete a session from Redis.
+
+    The session version isn't deleted but incremented (it still expires with
+    the session's TTL): versions are never reset, so that the conversations
+    other processes cached for this session (see `SessionCache`) can't match
+    the session anymore, even if it is stored again.
 
     Args:
-        ip: User's IP address
+        session_hash: Unique session identifier
 
     Returns:
-        bool: True if IP has exceeded limit (2x RATELIMIT_PRICEY_MODELS_INPUT), False otherwise
+        bool: True if session was deleted, False if it didn't exist
     """
-    client = get_redis_client()
-    counter = client.get(f"ip:{ip}")
-    assert not isinstance(counter, Awaitable)
-    # Rate limit is 2x the configured limit for pricey models
-    if counter and int(counter) > RATELIMIT_PRICEY_MODELS_INPUT * 2:
-        return True
-    else:
+    try:
+        client = get_async_redis_client()
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.delete(legacy_session_key(session_hash), *_session_keys(session_hash))
+            pipe.incr(session_version_key(session_hash))
+            pipe.expire(session_version_key(session_hash), SESSION_TTL_SECONDS)
+            deleted, _, _ = await pipe.execute()
+        get_session_cache().discard(session_hash)
+        logger.info(f"[SESSION] Deleted session {session_hash}: {bool(deleted)}")
+        return bool(deleted)
+    except Exception as e:
+        logger.error(f"[SESSION] Error deleting session: {e}")
         return False
@@ -0,0 +1,221 @@
+"""
+Server-Sent Events protocol versions for arena streams.
+
+Protocol versions (negotiated with the `X-SSE-Protocol` request header):
+- 1 (legacy): every `chunk` event carries the full message list of a position.
+- 2: `chunk` events are full snapshots, only sent on the first update of an
+  assistant message, on completion or when an update can't be expressed as an
+  append. Other updates are `delta` events carrying only the appended
+  content/reasoning suffixes with their offsets in the message.
+
+The first event of each position in a stream is a full snapshot, so a client
+whose messages diverged (a delta starting after the text it received) resyncs
+them by replaying the stream from its start (`GET /arena/stream` without
+`Last-Event-ID`).
+"""
+
+import time
+from typing import TYPE_CHECKING, Annotated, Literal, TypedDict, get_args
+
+from fastapi import Depends, Header
+
+from backend.arena.models import AnyMessage, AssistantMessage, BotPos
+
+if TYPE_CHECKING:
+    from backend.arena.streaming import AnySSEEvent, SSEEventChunk
+
+SSEProtocol = Literal[1, 2]
+SSE_PROTOCOLS: tuple[SSEProtocol, ...] = get_args(SSEProtocol)
+DEFAULT_SSE_PROTOCOL: SSEProtocol = 1
+
+
+def sse_protocol_from_headers(
+    protocol: str | None = Header(None, alias="X-SSE-Protocol"),
+) -> SSEProtocol:
+    """
+    Dependency to extract the SSE protocol version requested by the client.
+
+    Args:
+        protocol: Protocol version from X-SSE-Protocol header
+
+    Returns:
+        SSEProtocol: requested version, legacy version if missing or unknown
+    """
+    if protocol and protocol.isdigit() and int(protocol) in SSE_PROTOCOLS:
+        return int(protocol)  # type: ignore[return-value]
+
+    return DEFAULT_SSE_PROTOCOL
+
+
+SSEProtocolAnno = Annotated[SSEProtocol, Depends(sse_protocol_from_headers)]
+
+
+class SSEEventDelta(TypedDict):
+    type: Literal["delta"]
+    pos: BotPos
+    # Index of the assistant message in the position's messages
+    index: int
+    # Appended suffixes and the offsets they start at
+    content: str
+    content_offset: int
+    reasoning: str
+    reasoning_offset: int
+
+
+class SentMessage:
+    """Lengths of the assistant message already sent to the client for a position."""
+
+    def __init__(self, messages: list[AnyMessage], index: int) -> None:
+        self.messages = messages
+        self.index = index
+        self.content_len = 0
+        self.reasoning_len = 0
+
+
+class SSEDeltaEncoder:
+    """
+    Translate streaming events to the negotiated protocol version.
+
+    Keeps track of what was already sent for each position so that protocol v2
+    only sends appended suffixes.
+    """
+
+    def __init__(self, protocol: SSEProtocol = DEFAULT_SSE_PROTOCOL) -> None:
+        self.protocol = protocol
+        self.sent: dict[BotPos, SentMessage] = {}
+
+    def snapshot(self, pos: BotPos) -> list["AnySSEEvent"]:
+        """
+        Full snapshot of the messages last seen for a position.
+
+        Returns:
+            list: a single `chunk` event or nothing if no messages were seen yet
+        """
+        if not (sent := self.sent.get(pos)):
+            return []
+
+        message = sent.messages[sent.index]
+        if isinstance(message, AssistantMessage):
+            sent.content_len = len(message.content)
+            sent.reasoning_len = len(message.reasoning)
+
+        return [{"type": "chunk", "pos": pos, "messages": sent.messages}]
+
+    def encode(self, event: "AnySSEEvent") -> list["AnySSEEvent"]:
+        """
+        Encode a streaming event into the events to send to the client.
+
+        Args:
+            event: event yielded by `stream_conversation_messages`
+
+        Returns:
+            list: events to send, possibly empty if there is nothing new
+        """
+        if self.protocol == 1:
+            return [event]
+
+        if event["type"] == "complete" and "pos" in event:
+            # Always finish a position with a full snapshot (final metadata)
+            return [*self.snapshot(event["pos"]), event]
+
+        if event["type"] != "chunk":
+            return [event]
+
+        pos, messages = event["pos"], event["messages"]
+        index = len(messages) - 1
+        message = messages[index]
+        sent = self.sent.get(pos)
+
+        if (
+            sent is None
+            or sent.messages is not messages
+            or sent.index != index
+            or not isinstance(message, AssistantMessage)
+            or len(message.content) < sent.content_len
+            or len(message.reasoning) < sent.reasoning_len
+        ):
+            # New message or not an append, send a full snapshot
+            self.sent[pos] = SentMessage(messages, index)
+            return self.snapshot(pos)
+
+        content = message.content[sent.content_len :]
+        reasoning = message.reasoning[sent.reasoning_len :]
+        if not content and not reasoning:
+            return []
+
+        delta: SSEEventDelta = {
+            "type": "delta",
+            "pos": pos,
+            "index": index,
+            "content": content,
+            "content_offset": sent.content_len,
+            "reasoning": reasoning,
+            "reasoning_offset": sent.reasoning_len,
+        }
+        sent.content_len += len(content)
+        sent.reasoning_len += len(reasoning)
+
+        return [delta]
+
+
+class SSEChunkCoalescer:
+    """
+    Merge consecutive `chunk` events of a position between two flushes.
+
+    Chunk events reference the live messages list of a position so merging them
+    only keeps the latest one. A flush is due when `interval` seconds elapsed
+    since the previous flush or when `max_bytes` of text were appended since.
+    The first chunk after an idle period is flushed right away.
+    """
+
+    def __init__(self, interval: float, max_bytes: int) -> None:
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.pending: dict[BotPos, "SSEEventChunk"] = {}
+        self.flushed_lengths: dict[BotPos, int] = {}
+        self.last_flush = 0.0
+
+    @staticmethod
+    def text_length(event: "SSEEventChunk") -> int:
+        message = event["messages"][-1]
+        if isinstance(message, AssistantMessage):
+            return message.text_length
+        return 0
+
+    def add(self, event: "SSEEventChunk") -> None:
+        self.pending[event["pos"]] = event
+
+    @property
+    def pending_bytes(self) -> int:
+        return sum(
+            max(0, self.text_length(event) - self.flushed_lengths.get(pos, 0))
+            for pos, event in self.pending.items()
+        )
+
+    def timeout(self) -> float | None:
+        """Seconds until the next time-based flush, None if nothing is pending."""
+        if not self.pending:
+            return None
+        return max(0.0, self.last_flush + self.interval - time.monotonic())
+
+    def is_due(self) -> bool:
+        return bool(self.pending) and (
+            self.timeout() == 0 or self.pending_bytes >= self.max_bytes
+        )
+
+    def drain(self) -> list["AnySSEEvent"]:
+        """
+        Return pending chunk events (one per position) and reset the flush timer.
+
+        Messages being streamed are synced so that events carry their latest text.
+        """
+        events: list["AnySSEEvent"] = []
+        for pos, event in self.pending.items():
+            if isinstance(message := event["messages"][-1], AssistantMessage):
+                message.sync_stream()
+            self.flushed_lengths[pos] = self.text_length(event)
+            events.append(event)
+        self.pending.clear()
+        self.last_flush = time.monotonic()
+
+        return events
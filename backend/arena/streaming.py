@@ -4,10 +4,21 @@ Server-Sent Events (SSE) streaming support for arena conversations.
 Handles real-time streaming of model responses to the frontend using SSE protocol.
 """
 
+import asyncio
 import json
 import logging
+import time
 import traceback
-from typing import Any, AsyncGenerator, Literal, TypedDict
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Literal,
+    NotRequired,
+    TypedDict,
+)
 
 import litellm
 import sentry_sdk
@@ -15,6 +26,7 @@ from fastapi import Request
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import StreamingResponse
 
+from backend.arena.compression import compress_sse_stream, negotiate_encoding
 from backend.arena.models import (
     BOT_POS,
     AnyMessage,
@@ -25,9 +37,25 @@ from backend.arena.models import (
     UserMessage,
     create_conversation,
 )
+from backend.arena.sse import (
+    DEFAULT_SSE_PROTOCOL,
+    SSEChunkCoalescer,
+    SSEDeltaEncoder,
+    SSEEventDelta,
+    SSEProtocol,
+)
 from backend.config import CustomModelsSelection, SelectionMode, settings
-from backend.errors import ChatError
+from backend.errors import (
+    ChatError,
+    ChatStalledError,
+    ContextTooLongError,
+    ProviderBusyError,
+    StreamStalledError,
+)
+from backend.llms.breaker import record_model_outcome
 from backend.llms.data import get_llms_data
+from backend.llms.limiter import get_saturated_models
+from backend.llms.reporter import report_model_error
 
 logger = logging.getLogger("languia")
 
@@ -60,9 +88,13 @@ class SSEEventError(TypedDict):
     type: Literal["error"]
     pos: BotPos
     error: str
+    # Error kind (ex: "stalled") for errors the frontend handles specifically
+    code: NotRequired[str]
 
 
-AnySSEEvent = SSEEventInit | SSEEventChunk | SSEEventComplete | SSEEventError
+AnySSEEvent = (
+    SSEEventInit | SSEEventChunk | SSEEventDelta | SSEEventComplete | SSEEventError
+)
 
 
 async def stream_conversation_messages(
@@ -93,6 +125,8 @@ async def stream_conversation_messages(
         async for messages in bot_response_async(pos, conv, request):
             yield {"type": "chunk", "pos": pos, "messages": messages}
 
+        # Recorded before completing: the consumer may stop iterating after it
+        await record_model_outcome(conv.model_name, ok=True)
         yield {"type": "complete", "pos": pos}
 
         logger.info(
@@ -103,6 +137,10 @@ async def stream_conversation_messages(
     except Exception as e:
         error_message = str(e)
 
+        # Errors not caused by the model itself don't affect its circuit breaker
+        if not isinstance(e, (ContextTooLongError, ProviderBusyError)):
+            await record_model_outcome(conv.model_name, ok=False)
+
         if settings.SENTRY_DSN:
             # Error is silenced to be sent thru sse message, send it to sentry manually
             # TODO: only capture model name to sort more easily in sentry
@@ -111,16 +149,7 @@ async def stream_conversation_messages(
         error_reason = f"error_during_convo: {conv.model_name}, {conv.llm.endpoint.api_type}, {error_message}"
 
         # TODO ContextLengthError: do not log to controller?
-        try:
-            import requests
-
-            requests.post(
-                f"{settings.LANGUIA_CONTROLLER_URL}/models/{conv.model_name}/error",
-                json={"error": error_reason},
-                timeout=1,
-            )
-        except:
-            pass
+        report_model_error(conv.model_name, error_reason)
 
         logger.exception(
             error_reason,
@@ -132,11 +161,62 @@ async def stream_conversation_messages(
             exc_info=True,
         )
 
-        raise ChatError(message=error_message, pos=pos, is_timeout=isinstance(e, litellm.Timeout))
+        # Stalled responses are not swapped but can be retried right away
+        error_cls = ChatStalledError if isinstance(e, StreamStalledError) else ChatError
+        raise error_cls(
+            message=error_message,
+            pos=pos,
+            is_timeout=isinstance(e, (litellm.Timeout, ProviderBusyError)),
+        )
+
+
+# Max number of events buffered between the model producers and the SSE consumer
+STREAM_QUEUE_MAXSIZE = 64
+# Seconds between two checks of the client(s) connection while streaming
+DISCONNECT_POLL_INTERVAL = 1.0
+
+StreamQueueItem = tuple["StreamProducer", AnySSEEvent | BaseException]
+
+
+class StreamProducer:
+    """
+    Long-lived task streaming a conversation's response to a shared queue.
+
+    Each event is pushed as a `(producer, event)` item. If streaming fails, the
+    exception is pushed as the last item instead.
+    """
+
+    def __init__(
+        self,
+        pos: BotPos,
+        conv: Conversation,
+        request: Any,
+        queue: "asyncio.Queue[StreamQueueItem]",
+    ) -> None:
+        self.pos = pos
+        self.conv = conv
+        self.started = time.monotonic()
+        self.generator = stream_conversation_messages(pos, conv, request)
+        self.task = asyncio.create_task(self.run(queue))
+
+    async def run(self, queue: "asyncio.Queue[StreamQueueItem]") -> None:
+        try:
+            async for event in self.generator:
+                await queue.put((self, event))
+        except Exception as e:
+            await queue.put((self, e))
+        finally:
+            await self.generator.aclose()
+
+    def cancel(self) -> None:
+        self.task.cancel()
 
 
 async def stream_comparison_messages(
-    conversations: Conversations, request: Any
+    conversations: Conversations,
+    request: Any,
+    protocol: SSEProtocol = DEFAULT_SSE_PROTOCOL,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
 ) -> AsyncGenerator[str]:
     """
     Stream both model responses in parallel using Server-Sent Events.
@@ -148,6 +228,8 @@ async def stream_comparison_messages(
         conv_a: First conversation state dict
         conv_b: Second conversation state dict
         request: FastAPI Request object for logging
+        protocol: SSE protocol version negotiated with the client (see `backend.arena.sse`)
+        is_disconnected: Polled while streaming, both responses are interrupted if it returns True
 
     Yields:
         str: SSE-formatted messages with updates from both models
@@ -159,103 +241,184 @@ async def stream_comparison_messages(
 
         data: {"type": "error", "error": "..."}
     """
-    import asyncio
+    # Translate chunks to deltas if the client supports it
+    encoder = SSEDeltaEncoder(protocol)
+    # Merge small chunks to limit the number of writes and encodings
+    coalescer = SSEChunkCoalescer(
+        interval=settings.SSE_FLUSH_INTERVAL_MS / 1000,
+        max_bytes=settings.SSE_FLUSH_MAX_BYTES,
+    )
+
+    def flush(*events: AnySSEEvent) -> str:
+        """Format pending chunks followed by `events` as a single SSE payload."""
+        return "".join(
+            format_sse_event(encoded_event)
+            for event in [*coalescer.drain(), *events]
+            for encoded_event in encoder.encode(event)
+        )
+
+    # Shared bounded queue both producers push their events to
+    queue: asyncio.Queue[StreamQueueItem] = asyncio.Queue(maxsize=STREAM_QUEUE_MAXSIZE)
+    # Current producer of each position
+    producers: dict[BotPos, StreamProducer] = {}
+    # Speculative producer of each position whose model was slow to answer
+    hedges: dict[BotPos, StreamProducer] = {}
 
     try:
-        # Create async generators for both models
-        generators: dict[BotPos, AsyncGenerator[AnySSEEvent]] = {
-            "a": stream_conversation_messages(
-                "a", conversations.conversation_a, request
-            ),
-            "b": stream_conversation_messages(
-                "b", conversations.conversation_b, request
-            ),
-        }
-        # Track state from both generators
+        is_first_turn = conversations.conv_turns == 0
+        # Track state from both producers
         complete: dict[BotPos, bool] = {"a": False, "b": False}
-        # Track timeout swap attempts (max one per position)
+        # Track timeout/hedge swap attempts (max one per position)
         retried: dict[BotPos, bool] = {"a": False, "b": False}
-        is_first_turn = conversations.conv_turns == 0
-
-        # Consume both generators in parallel
+        # Time to start a hedge request for positions still waiting for their first token
+        hedge_deadlines: dict[BotPos, float] = {}
+
+        for pos in BOT_POS:
+            conv = getattr(conversations, f"conversation_{pos}")
+            producers[pos] = StreamProducer(pos, conv, request, queue)
+            if (
+                is_first_turn
+                and (budget := _get_hedge_ttft_budget(conv.model_name)) > 0
+                and not _is_model_user_selected(
+                    conv.model_name,
+                    conversations.mode,
+                    conversations.custom_models_selection,
+                )
+            ):
+                hedge_deadlines[pos] = producers[pos].started + budget
+
+        # Next time to check if the client is still connected
+        disconnect_check = time.monotonic() + DISCONNECT_POLL_INTERVAL
+
+        # Consume both producers in parallel
         while not (complete["a"] and complete["b"]):
-            # Collect pending tasks
-            tasks = [
-                asyncio.create_task(anext(generators[pos]))
-                for pos in BOT_POS
-                if not complete[pos]
-            ]
-
-            if not tasks:
-                break
-
-            # Wait for next chunk from either model
-            completed, pending = await asyncio.wait(
-                tasks, return_when=asyncio.FIRST_COMPLETED
-            )
-
-            # Process completed chunks
-            for task in completed:
-                try:
-                    event = task.result()
-                except ChatError as e:
-                    # On first-turn timeout, swap the model if it wasn't user-selected
-                    if (
-                        e.is_timeout
-                        and is_first_turn
-                        and not retried[e.pos]
-                        and not _is_model_user_selected(
-                            getattr(
-                                conversations, f"conversation_{e.pos}"
-                            ).model_name,
-                            conversations.mode,
-                            conversations.custom_models_selection,
+            # Wait for next chunk from either model, for the next flush, for
+            # the next disconnection check or for the next hedge deadline
+            timeout = coalescer.timeout()
+            deadlines = list(hedge_deadlines.values())
+            if is_disconnected is not None:
+                deadlines.append(disconnect_check)
+            if deadlines:
+                until_deadline = max(0.0, min(deadlines) - time.monotonic())
+                timeout = (
+                    until_deadline if timeout is None else min(timeout, until_deadline)
+                )
+            try:
+                producer, item = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except TimeoutError:
+                producer, item = None, None
+
+            if is_disconnected is not None and time.monotonic() >= disconnect_check:
+                disconnect_check = time.monotonic() + DISCONNECT_POLL_INTERVAL
+                if await is_disconnected():
+                    # Stop both providers streams (see `finally`)
+                    logger.warning(
+                        f"[STREAMING] Client disconnected, interrupting {conversations.conversation_pair_id}",
+                        extra={"request": request},
+                    )
+                    conversations.interrupted = True
+                    return
+
+            for pos, deadline in list(hedge_deadlines.items()):
+                if time.monotonic() >= deadline:
+                    del hedge_deadlines[pos]
+                    if hedge_conv := _create_replacement_conversation(
+                        conversations, pos, _get_in_flight_models(producers, hedges)
+                    ):
+                        logger.warning(
+                            f"[HEDGE] No token from '{producers[pos].conv.model_name}' yet, "
+                            f"also requesting '{hedge_conv.model_name}'",
+                            extra={"request": request},
                         )
+                        hedges[pos] = StreamProducer(pos, hedge_conv, request, queue)
+
+            if producer is None:
+                if coalescer.is_due():
+                    yield flush()
+                continue
+
+            pos = producer.pos
+            if hedges.get(pos) is producer:
+                del hedges[pos]
+                if isinstance(item, BaseException):
+                    # Keep waiting for the original model
+                    logger.warning(
+                        f"[HEDGE] Hedge model '{producer.conv.model_name}' failed: {item}",
+                        extra={"request": request},
+                    )
+                    continue
+                # First token from the hedge model before the original one
+                if not _promote_hedge(conversations, producers, producer, request):
+                    continue
+                retried[pos] = True
+            elif producers[pos] is not producer:
+                # Ignore leftovers of a replaced producer
+                continue
+            elif (
+                pos in hedges
+                and isinstance(item, BaseException)
+                and _promote_hedge(conversations, producers, hedges.pop(pos), request)
+            ):
+                # Original model failed while the hedge model is still running
+                retried[pos] = True
+                continue
+            elif pos in hedges or pos in hedge_deadlines:
+                # First token from the original model, no need to hedge anymore
+                if hedge := hedges.pop(pos, None):
+                    logger.info(
+                        f"[HEDGE] '{producer.conv.model_name}' answered first, "
+                        f"cancelling '{hedge.conv.model_name}'",
+                        extra={"request": request},
+                    )
+                    hedge.cancel()
+                hedge_deadlines.pop(pos, None)
+
+            if isinstance(item, BaseException):
+                # On first-turn timeout, swap the model if it wasn't user-selected
+                if (
+                    isinstance(item, ChatError)
+                    and item.is_timeout
+                    and is_first_turn
+                    and not retried[pos]
+                    and not _is_model_user_selected(
+                        producer.conv.model_name,
+                        conversations.mode,
+                        conversations.custom_models_selection,
+                    )
+                ):
+                    if new_conv := _replace_conversation(
+                        conversations, pos, _get_in_flight_models(producers, hedges)
                     ):
-                        new_model = _pick_replacement_model(conversations, e.pos)
-                        if new_model:
-                            old_name = getattr(
-                                conversations, f"conversation_{e.pos}"
-                            ).model_name
-                            logger.warning(
-                                f"Model '{old_name}' timed out, swapping to '{new_model}'"
-                            )
-                            user_msg = UserMessage(
-                                content=conversations.opening_msg
-                            )
-                            new_conv = create_conversation(
-                                new_model,
-                                conversations.country_portal,
-                                user_msg,
-                            )
-                            setattr(
-                                conversations,
-                                f"conversation_{e.pos}",
-                                new_conv,
-                            )
-                            generators[e.pos] = (
-                                stream_conversation_messages(
-                                    e.pos, new_conv, request
-                                )
-                            )
-                            retried[e.pos] = True
-                            continue
-                        # No replacement available, fall through to raise
-                    raise
-
-                for pos in BOT_POS:
-                    if event["type"] == "complete":
-                        complete[event["pos"]] = True
-
-                yield format_sse_event(event)
+                        producers[pos] = StreamProducer(pos, new_conv, request, queue)
+                        hedge_deadlines.pop(pos, None)
+                        retried[pos] = True
+                        continue
+                    # No replacement available, fall through to raise
+                raise item
+
+            event = item
+            if event["type"] == "chunk":
+                coalescer.add(event)
+                if coalescer.is_due():
+                    yield flush()
+                continue
+
+            if event["type"] == "complete":
+                complete[pos] = True
+
+            # Always flush pending chunks before other events
+            yield flush(event)
 
         # Signal completion
-        yield format_sse_event({"type": "complete"})
+        yield flush({"type": "complete"})
     except ChatError as e:
         # Specific chat error
         # Error logging is done in `stream_conversation_messages()`
-        conversations.error = ErrorDetails(message=e.message, pos=e.pos)
-        yield format_sse_event({"type": "error", "error": e.message, "pos": e.pos})
+        conversations.error = ErrorDetails(message=e.message, pos=e.pos, code=e.code)
+        error_event: SSEEventError = {"type": "error", "error": e.message, "pos": e.pos}
+        if e.code:
+            error_event["code"] = e.code
+        yield flush(error_event)
     except Exception as e:
         # General error
         if settings.SENTRY_DSN:
@@ -266,7 +429,16 @@ async def stream_comparison_messages(
         logger.error(
             f"[STREAMING] Error in stream_comparison_messages: {e}", exc_info=True
         )
-        yield format_sse_event({"type": "error", "error": str(e)})
+        yield flush({"type": "error", "error": str(e)})
+    finally:
+        # Stop the providers streams, and wait for the producers to sync the text
+        # streamed so far to their messages (see `AssistantMessage.detach_stream`)
+        running = [*producers.values(), *hedges.values()]
+        for producer in running:
+            producer.cancel()
+        await asyncio.gather(
+            *(producer.task for producer in running), return_exceptions=True
+        )
 
 
 def _is_model_user_selected(
@@ -278,44 +450,164 @@ def _is_model_user_selected(
     return model_name in custom_selection
 
 
-def _pick_replacement_model(conversations: Conversations, pos: BotPos) -> str | None:
-    """Pick a replacement model from the appropriate pool, excluding both current models."""
+def _get_hedge_ttft_budget(model_name: str) -> float:
+    """Seconds to wait for a model's first token before hedging it (0 to disable)."""
+    return settings.HEDGE_TTFT_BUDGETS.get(model_name, settings.HEDGE_TTFT_BUDGET)
+
+
+def _get_in_flight_models(
+    producers: dict[BotPos, StreamProducer], hedges: dict[BotPos, StreamProducer]
+) -> list[str]:
+    """Models of the running producers and hedges, a replacement must differ from them."""
+    return [
+        producer.conv.model_name for producer in [*producers.values(), *hedges.values()]
+    ]
+
+
+def _promote_hedge(
+    conversations: Conversations,
+    producers: dict[BotPos, StreamProducer],
+    hedge: StreamProducer,
+    request: Any,
+) -> bool:
+    """
+    Replace a position's producer and conversation with its hedge ones.
+
+    Returns:
+        bool: False if the hedge was cancelled instead, its model being the
+            other position's current model
+    """
+    pos = hedge.pos
+    other_pos: BotPos = "b" if pos == "a" else "a"
+    other = getattr(conversations, f"conversation_{other_pos}").model_name
+    if hedge.conv.model_name == other:
+        logger.warning(
+            f"[HEDGE] '{hedge.conv.model_name}' already answers in position "
+            f"{other_pos}, cancelling it",
+            extra={"request": request},
+        )
+        hedge.cancel()
+        return False
+
+    logger.warning(
+        f"[HEDGE] '{hedge.conv.model_name}' answered first, "
+        f"swapping from '{producers[pos].conv.model_name}'",
+        extra={"request": request},
+    )
+    producers[pos].cancel()
+    producers[pos] = hedge
+    setattr(conversations, f"conversation_{pos}", hedge.conv)
+    return True
+
+
+def _pick_replacement_model(
+    conversations: Conversations, pos: BotPos, in_flight: Iterable[str] = ()
+) -> str | None:
+    """
+    Pick a replacement model from the appropriate pool, excluding both current
+    models and the models still streaming (hedges, swapped producers).
+    """
     models = get_llms_data(conversations.country_portal)
     other_pos: BotPos = "b" if pos == "a" else "a"
     failing = getattr(conversations, f"conversation_{pos}").model_name
     other = getattr(conversations, f"conversation_{other_pos}").model_name
-    excluded = [failing, other]
+    excluded = [failing, other, *in_flight]
 
     # Pick from the right pool based on mode
     if conversations.mode == "small-models":
         pool = models.small_models
     elif conversations.mode == "big-vs-small":
-        pool = models.big_models if failing in models.big_models else models.small_models
+        pool = (
+            models.big_models if failing in models.big_models else models.small_models
+        )
     else:
         pool = models.random_models
 
     try:
-        return models.pick_one(pool, excluded=excluded)
+        return models.pick_one(
+            pool,
+            excluded=excluded,
+            saturated=get_saturated_models(models.enabled.values()),
+        )
     except Exception:
         return None
 
 
-def create_sse_response(generator: AsyncGenerator[str]) -> StreamingResponse:
+def _replace_conversation(
+    conversations: Conversations, pos: BotPos, in_flight: Iterable[str] = ()
+) -> Conversation | None:
+    """
+    Replace the conversation at `pos` with a new one using a replacement model.
+
+    Args:
+        conversations: Conversations of the comparison
+        pos: Position of the model to replace
+        in_flight: Models still streaming, not to be picked
+
+    Returns:
+        Conversation | None: the new conversation or None if no model is available
+    """
+    if not (
+        new_conv := _create_replacement_conversation(conversations, pos, in_flight)
+    ):
+        return None
+
+    old_name = getattr(conversations, f"conversation_{pos}").model_name
+    logger.warning(f"Model '{old_name}' timed out, swapping to '{new_conv.model_name}'")
+    setattr(conversations, f"conversation_{pos}", new_conv)
+
+    return new_conv
+
+
+def _create_replacement_conversation(
+    conversations: Conversations, pos: BotPos, in_flight: Iterable[str] = ()
+) -> Conversation | None:
+    """
+    Create a first-turn conversation for a replacement of the model at `pos`.
+
+    Args:
+        conversations: Conversations of the comparison
+        pos: Position of the model to replace
+        in_flight: Models still streaming, not to be picked
+
+    Returns:
+        Conversation | None: the new conversation or None if no model is available
+    """
+    if not (new_model := _pick_replacement_model(conversations, pos, in_flight)):
+        return None
+
+    user_msg = UserMessage(content=conversations.opening_msg)
+    return create_conversation(new_model, conversations.country_portal, user_msg)
+
+
+def create_sse_response(
+    generator: AsyncGenerator[str],
+    accept_encoding: str | None = None,
+    extra_headers: dict[str, str] | None = None,
+) -> StreamingResponse:
     """
     Create a FastAPI StreamingResponse configured for Server-Sent Events.
 
     Args:
         generator: AsyncGenerator yielding SSE-formatted strings
+        accept_encoding: `Accept-Encoding` request header, the stream is
+            compressed if it accepts an encoding of `SSE_COMPRESSION`
+        extra_headers: Additional response headers
 
     Returns:
         StreamingResponse configured with proper SSE headers
     """
-    return StreamingResponse(
-        generator,
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",  # Disable buffering for Nginx
-        },
-    )
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no",  # Disable buffering for Nginx
+        **(extra_headers or {}),
+    }
+    content: AsyncGenerator[str] | AsyncGenerator[bytes] = generator
+    if encoding := negotiate_encoding(accept_encoding):
+        # Each payload is flushed by the compressor, proxies must not buffer it either
+        content = compress_sse_stream(generator, encoding)
+        headers["Content-Encoding"] = encoding
+        headers["Vary"] = "Accept-Encoding"
+
+    return StreamingResponse(content, media_type="text/event-stream", headers=headers)
@@ -0,0 +1,83 @@
+"""
+Fallback counting of output tokens, for providers which don't report usage.
+
+Tokenization is CPU bound and tokenizers may have to be loaded (or even
+downloaded from HuggingFace, unless `litellm.disable_hf_tokenizer_download` is
+set) on first use, so counting runs in a thread pool and never on the event
+loop (tiktoken and HuggingFace tokenizers release the GIL while encoding).
+Tokenizers are selected and cached per model by LiteLLM, they can be loaded on
+startup by `warm_tokenizers` (see `TOKEN_WARMUP_SECONDS`).
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from litellm.litellm_core_utils.token_counter import token_counter
+
+from backend.config import COUNTRY_PORTALS, settings
+from backend.llms.data import get_llms_data
+
+logger = logging.getLogger("languia")
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.TOKEN_COUNT_WORKERS, thread_name_prefix="tokens"
+)
+# Tokenizers are loaded in their own thread so that counts never wait for downloads
+_warmup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tokens-warmup")
+
+
+def _count_tokens(model_name: str, texts: list[str]) -> int:
+    return token_counter(model=model_name, text=texts)
+
+
+async def count_tokens(model_name: str, *texts: str) -> int:
+    """
+    Count tokens of texts generated by a model, in the thread pool.
+
+    Args:
+        model_name: Model id, used by LiteLLM to select the tokenizer
+        texts: Texts to count the tokens of
+
+    Returns:
+        int: Total number of tokens
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor, _count_tokens, model_name, list(texts)
+    )
+
+
+def _warm_tokenizers(model_names: set[str], deadline: float) -> None:
+    for model_name in model_names:
+        if time.monotonic() > deadline:
+            logger.warning("[TOKENS] Tokenizers warmup stopped, out of time")
+            return
+        try:
+            _count_tokens(model_name, ["warmup"])
+        except Exception as e:
+            logger.warning(f"[TOKENS] Couldn't load tokenizer of '{model_name}': {e}")
+    logger.debug("[TOKENS] Tokenizers loaded")
+
+
+def warm_tokenizers() -> asyncio.Future[None] | None:
+    """
+    Load tokenizers of enabled models in the background, without blocking startup.
+
+    Only done if `TOKEN_WARMUP_SECONDS` is set, no tokenizer starts loading
+    after this delay.
+    """
+    if settings.TOKEN_WARMUP_SECONDS <= 0:
+        return None
+
+    model_names = {
+        model_id
+        for country_portal in COUNTRY_PORTALS
+        for model_id in get_llms_data(country_portal).enabled
+    }
+    return asyncio.get_running_loop().run_in_executor(
+        _warmup_executor,
+        _warm_tokenizers,
+        model_names,
+        time.monotonic() + settings.TOKEN_WARMUP_SECONDS,
+    )
@@ -0,0 +1,132 @@
+"""
+Generation worker consuming generation jobs enqueued by API nodes.
+
+Used with `GENERATION_MODE=queue` (see `backend.arena.generation`), run with:
+
+    python -m backend.arena.worker [--concurrency N]
+
+Each worker process runs up to N generations concurrently. On SIGINT/SIGTERM it
+stops taking new jobs and waits for running generations to finish.
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+import time
+
+from backend.arena.generation import (
+    GENERATION_JOBS_KEY,
+    GenerationJob,
+    stream_and_record,
+)
+from backend.arena.litellm import close_endpoint_clients, init_endpoint_clients
+from backend.arena.models import Conversations
+from backend.arena.resume import SSEStreamWriter, write_sse_stream
+from backend.arena.tokens import warm_tokenizers
+from backend.config import settings
+from backend.llms.reporter import close_error_reporter
+from backend.logger import configure_logger
+from backend.sentry import init_sentry
+from backend.session import close_async_redis_client, get_async_redis_client
+
+logger = logging.getLogger("languia")
+
+# Seconds a consumer blocks waiting for a job, also its shutdown check interval
+JOB_POP_TIMEOUT = 1
+
+
+async def run_job(job: GenerationJob) -> None:
+    """
+    Generate both model responses of a job to the session's stream.
+
+    Args:
+        job: Generation job enqueued by `start_generation`
+    """
+    request = job.to_request()
+    writer = SSEStreamWriter(job.session_hash)
+    logger.info(
+        f"[WORKER] Starting job for {job.session_hash} (waited {time.time() - job.enqueued_at:.2f}s)",
+        extra={"request": request},
+    )
+
+    try:
+        conversations = await Conversations.from_session(job.session_hash)
+    except Exception as e:
+        logger.error(
+            f"[WORKER] Conversations '{job.session_hash}' couldn't be found or parsed: {e}",
+            extra={"request": request},
+        )
+        await writer.close()
+        return
+
+    await write_sse_stream(
+        writer,
+        stream_and_record(conversations, request, job.sse_protocol, writer),
+    )
+
+
+async def consume(stopping: asyncio.Event) -> None:
+    """Run jobs one at a time until `stopping` is set."""
+    client = get_async_redis_client()
+
+    while not stopping.is_set():
+        if not (item := await client.brpop([GENERATION_JOBS_KEY], JOB_POP_TIMEOUT)):
+            continue
+
+        try:
+            job = GenerationJob.model_validate_json(item[1])
+        except Exception as e:
+            logger.error(f"[WORKER] Invalid job {item[1]}: {e}")
+            continue
+
+        try:
+            await run_job(job)
+        except Exception as e:
+            logger.error(
+                f"[WORKER] Error running job for {job.session_hash}: {e}",
+                exc_info=True,
+            )
+
+
+async def run_worker(concurrency: int) -> None:
+    """
+    Run `concurrency` job consumers until the process is asked to stop.
+
+    Args:
+        concurrency: Max number of generations running at the same time
+    """
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    init_endpoint_clients()
+    warm_tokenizers()
+    logger.info(f"[WORKER] Consuming generation jobs with concurrency {concurrency}")
+    try:
+        await asyncio.gather(*(consume(stopping) for _ in range(concurrency)))
+    finally:
+        await close_endpoint_clients()
+        await close_error_reporter()
+        await close_async_redis_client()
+    logger.info("[WORKER] Stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="compar:IA generation worker")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.GENERATION_WORKER_CONCURRENCY,
+        help="Max number of generations running at the same time",
+    )
+    args = parser.parse_args()
+
+    configure_logger()
+    init_sentry()
+    asyncio.run(run_worker(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,104 @@ class Settings(BaseSettings):
     LANGUIA_DEBUG: bool = False
     LANGUIA_CONTROLLER_URL: str | None = "http://localhost:21001"
     COMPARIA_REDIS_HOST: str = "localhost"
+    # Async Redis client: pool of N connections for short commands, held for a few milliseconds
+    # each (SSE readers don't use it: they read from memory or thru one dedicated connection per
+    # process, see `backend.arena.resume`), sized for the peak of concurrent commands: about
+    # 2 per streaming generation (stream appends and session stores), 1 per other request.
+    # Commands wait up to POOL_TIMEOUT seconds for a free connection and fail after
+    # SOCKET_TIMEOUT seconds, idle connections are checked every HEALTH_CHECK_INTERVAL seconds
+    REDIS_MAX_CONNECTIONS: int = 500
+    REDIS_POOL_TIMEOUT: float = 2.0
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    REDIS_CONNECT_TIMEOUT: float = 2.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    # Session values (fields and messages) of at least N bytes are compressed in Redis with
+    # SESSION_COMPRESSION ("zlib", "zstd" or "none")
+    SESSION_COMPRESSION: Literal["none", "zlib", "zstd"] = "zlib"
+    SESSION_COMPRESSION_MIN_SIZE: int = 256
+    # Conversations last stored by each process, kept in memory for their next call (0 to disable)
+    SESSION_CACHE_SIZE: int = 500
     MOCK_RESPONSE: bool = False
+    # Serve every model with the mock LLM provider at this url (see `utils/mock_llm`)
+    MOCK_LLM_API_BASE: str | None = None
+    # Stream LLM responses with `litellm.acompletion` (set to false to use the legacy blocking client)
+    LITELLM_ASYNC_STREAMING: bool = True
+    # SSE chunks coalescing: flush every N milliseconds or M bytes of text, whichever comes first
+    SSE_FLUSH_INTERVAL_MS: int = 50
+    SSE_FLUSH_MAX_BYTES: int = 2048
+    # SSE responses compression, in order of preference (JSON, ex: ["br", "gzip"], empty to disable),
+    # negotiated with the Accept-Encoding header. "br" needs the `brotli` package
+    SSE_COMPRESSION: list[str] = []
+    # Resumable SSE streams: events are kept in Redis for N seconds after the last one
+    SSE_RESUME_TTL_SECONDS: int = 600
+    SSE_RESUME_MAXLEN: int = 10_000
+    # Generation is stopped (and providers no longer paid) if no client read the stream for N
+    # seconds: short, but long enough for the frontend's first resume attempts after a drop
+    SSE_ABANDON_GRACE_SECONDS: float = 5.0
+    # With GENERATION_MODE=local, mirror streams to Redis so that other API workers can resume
+    # them (readers of the generating worker are always served from memory)
+    SSE_RESUME: bool = True
+    # Where responses are generated: "local" in the API worker which received the request,
+    # "queue" in generation workers (`python -m backend.arena.worker`) relaying them thru Redis
+    GENERATION_MODE: Literal["local", "queue"] = "local"
+    # Generations run concurrently by each generation worker
+    GENERATION_WORKER_CONCURRENCY: int = 32
+    # Max in-flight requests per provider (api_base or api_type) and per model in each process
+    # (0 for no limit), overridable per provider/model id with LLM_MAX_IN_FLIGHT (JSON, ex:
+    # {"openrouter": 200}). Providers serve many models, only cap them with their documented
+    # concurrency quota divided by the number of processes
+    LLM_PROVIDER_MAX_IN_FLIGHT: int = 0
+    LLM_MODEL_MAX_IN_FLIGHT: int = 20
+    LLM_MAX_IN_FLIGHT: dict[str, int] = {}
+    # Max seconds a request waits for a free slot
+    LLM_LIMITER_MAX_WAIT: float = 10.0
+    # First-turn hedging: if a model (not selected by the user) sends no token within N seconds,
+    # a replacement model is requested too and the first one to answer is kept (0 to disable),
+    # overridable per model id with HEDGE_TTFT_BUDGETS (JSON, ex: {"kimi-k2": 12})
+    HEDGE_TTFT_BUDGET: float = 8.0
+    HEDGE_TTFT_BUDGETS: dict[str, float] = {}
+    # Circuit breaker per model: a model isn't picked for N seconds once at least M of its requests
+    # ended over the last W seconds and a rate R of them failed (errors and timeouts), then it is
+    # only picked for a share S of the picks until a request succeeds.
+    # Set BREAKER_SHARED to share breakers between processes thru Redis
+    BREAKER_WINDOW_SECONDS: int = 60
+    BREAKER_MIN_REQUESTS: int = 5
+    BREAKER_ERROR_RATE: float = 0.5
+    BREAKER_OPEN_SECONDS: int = 30
+    BREAKER_HALF_OPEN_SHARE: float = 0.1
+    BREAKER_SHARED: bool = False
+    # Mid-stream stall watchdog: a started response is interrupted if no text arrives for X x the p99
+    # of the gaps between chunks of the model's last N completed responses, within [MIN, MAX] seconds
+    # (MAX until M gaps were observed, MAX = 0 to disable). Only applies to async streaming
+    STALL_MIN_SECONDS: float = 5.0
+    STALL_MAX_SECONDS: float = 30.0
+    STALL_P99_MULTIPLIER: float = 3.0
+    STALL_GAP_SAMPLES: int = 1000
+    STALL_MIN_SAMPLES: int = 50
+    # Automatic retries of provider errors (429, 502, 503) before the first token: up to N retries
+    # after the provider's Retry-After or an exponential backoff with jitter (BASE x 2^retry capped
+    # to MAX seconds), as long as the retry is sent within BUDGET seconds of the first request
+    LLM_RETRY_MAX_ATTEMPTS: int = 2
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    LLM_RETRY_MAX_DELAY: float = 4.0
+    LLM_RETRY_BUDGET: float = 10.0
+    # Connection pool of the HTTP client shared by the models of each endpoint
+    LLM_HTTP_MAX_CONNECTIONS: int = 200
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 50
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    # Pricey models rate limit per IP: token bucket of BUDGET characters refilled over WINDOW seconds.
+    # Each accepted prompt reserves the model's weight x input chars, each response then charges
+    # its weight x OUTPUT_WEIGHT x output chars,
+    # weight 1 unless overridden per model id in RATELIMIT_PRICEY_MODELS_WEIGHTS (JSON, ex: {"gpt-5": 2})
+    RATELIMIT_PRICEY_BUDGET: int = 100_000
+    RATELIMIT_PRICEY_WINDOW_SECONDS: int = 3600 * 2
+    RATELIMIT_PRICEY_OUTPUT_WEIGHT: float = 0.0
+    RATELIMIT_PRICEY_MODELS_WEIGHTS: dict[str, float] = {}
+    # Threads counting output tokens of models whose provider doesn't report usage
+    TOKEN_COUNT_WORKERS: int = 2
+    # Load tokenizers of enabled models on startup for up to N seconds (0 to load them on first
+    # use), HuggingFace ones are downloaded unless LiteLLM's disable_hf_tokenizer_download is set
+    TOKEN_WARMUP_SECONDS: float = 0
     LOGDIR: Path = ROOT_DIR / "data"
     LOG_FORMAT: Literal["JSON", "RAW"] = "JSON"
     COMPARIA_DB_URI: str | None = None
@@ -61,8 +158,5 @@ CustomModelsSelection = tuple[str, ...] | None
 SMALL_MODELS_BUCKET_UPPER_LIMIT = 60  # Models with <= 60B params
 BIG_MODELS_BUCKET_LOWER_LIMIT = 100  # Models with >= 100B params
 
-# Rate limiting specifically for expensive models (openai models, etc.)
-RATELIMIT_PRICEY_MODELS_INPUT = 50_000
-
 # Character limit for blind mode (comparison without model names)
 BLIND_MODE_INPUT_CHAR_LEN_LIMIT = 60_000
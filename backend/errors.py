@@ -31,6 +31,8 @@ class ChatError(RuntimeError):
     message: str
     pos: BotPos
     is_timeout: bool
+    # Error kind sent to the frontend, None for generic errors
+    code: str | None = None
 
     def __init__(self, message: str, pos: BotPos, is_timeout: bool = False) -> None:
         super().__init__(message)
@@ -40,3 +42,33 @@ class ChatError(RuntimeError):
 
     def __str__(self):
         return self.message
+
+
+class ChatStalledError(ChatError):
+    """Raised when a model stopped streaming mid-response, it can be retried right away."""
+
+    code = "stalled"
+
+
+class StreamStalledError(RuntimeError):
+    """Raised when no text was streamed by a model for its stall threshold."""
+
+    def __init__(self, model_id: str, threshold: float) -> None:
+        super().__init__(model_id, threshold)
+        self.model_id = model_id
+        self.threshold = threshold
+
+    def __str__(self):
+        return f"No response from model '{self.model_id}' for {self.threshold:.1f}s"
+
+
+class ProviderBusyError(RuntimeError):
+    """Raised when no request slot to a provider or model was freed in time."""
+
+    def __init__(self, limiter: str, timeout: float) -> None:
+        super().__init__(limiter, timeout)
+        self.limiter = limiter
+        self.timeout = timeout
+
+    def __str__(self):
+        return f"Too many requests in progress for '{self.limiter}', no slot freed in {self.timeout:.1f}s"
@@ -0,0 +1,240 @@
+"""
+Circuit breakers of models, excluding failing models from selection.
+
+Each model has a breaker which is:
+- closed: the model is picked normally and outcomes of its requests over the
+  last `BREAKER_WINDOW_SECONDS` are counted,
+- open: once at least `BREAKER_MIN_REQUESTS` requests ended and their error
+  rate (errors and timeouts) reached `BREAKER_ERROR_RATE`, the model isn't
+  picked for `BREAKER_OPEN_SECONDS`,
+- half-open: after that, the model is only picked for a share
+  (`BREAKER_HALF_OPEN_SHARE`) of the picks. The first probe success closes the
+  breaker, a failure opens it again.
+
+Breakers are local to the process unless `BREAKER_SHARED` is set: outcomes
+are then counted in Redis and opened breakers are shared by every process.
+Processes read the shared state when they record an outcome, so that picking
+models never waits for Redis.
+"""
+
+import logging
+import random
+import time
+from collections import deque
+from typing import Literal, TypedDict
+
+from backend.config import settings
+from backend.session import get_async_redis_client
+
+logger = logging.getLogger("languia")
+
+CircuitState = Literal["closed", "open", "half-open"]
+
+# Shared outcomes are counted in buckets of N seconds
+BREAKER_BUCKET_SECONDS = 5
+# Hash of opened breakers shared thru Redis: model id -> open until (timestamp)
+BREAKER_OPEN_KEY = "breaker:open"
+
+
+class BreakerStats(TypedDict):
+    state: CircuitState
+    open_until: float | None
+    requests: int
+    errors: int
+
+
+class CircuitBreaker:
+    """
+    Track the outcomes of a model's requests and whether it can be picked.
+    """
+
+    def __init__(self, model_id: str) -> None:
+        self.model_id = model_id
+        # Timestamp until which the breaker is open, None when closed
+        self.open_until: float | None = None
+        # Local outcomes (timestamp, success) over the window
+        self.outcomes: deque[tuple[float, bool]] = deque()
+
+    @property
+    def state(self) -> CircuitState:
+        if self.open_until is None:
+            return "closed"
+        if time.time() < self.open_until:
+            return "open"
+        return "half-open"
+
+    def allows(self) -> bool:
+        """
+        Check if the model can be picked, probing a share of the picks when half-open.
+        """
+        state = self.state
+        if state == "half-open":
+            return random.random() < settings.BREAKER_HALF_OPEN_SHARE
+        return state == "closed"
+
+    def counts(self) -> tuple[int, int]:
+        """
+        Count local requests and errors over the window.
+
+        Returns:
+            tuple: (requests, errors)
+        """
+        start = time.time() - settings.BREAKER_WINDOW_SECONDS
+        while self.outcomes and self.outcomes[0][0] < start:
+            self.outcomes.popleft()
+        errors = sum(1 for _, ok in self.outcomes if not ok)
+        return len(self.outcomes), errors
+
+    def record(self, ok: bool) -> None:
+        self.outcomes.append((time.time(), ok))
+
+    def update(self, ok: bool, requests: int, errors: int) -> CircuitState | None:
+        """
+        Open or close the breaker after a request ended.
+
+        Args:
+            ok: If the request succeeded
+            requests: Number of requests which ended over the window
+            errors: Number of failed requests over the window
+
+        Returns:
+            CircuitState | None: New state if it changed
+        """
+        state = self.state
+        if state == "half-open":
+            if ok:
+                self.close()
+                return "closed"
+            self.open()
+            return "open"
+
+        if (
+            state == "closed"
+            and requests >= settings.BREAKER_MIN_REQUESTS
+            and errors >= settings.BREAKER_ERROR_RATE * requests
+        ):
+            self.open()
+            return "open"
+
+        return None
+
+    def open(self) -> None:
+        self.open_until = time.time() + settings.BREAKER_OPEN_SECONDS
+        self.outcomes.clear()
+
+    def close(self) -> None:
+        self.open_until = None
+        self.outcomes.clear()
+
+    def stats(self) -> BreakerStats:
+        requests, errors = self.counts()
+        return {
+            "state": self.state,
+            "open_until": self.open_until,
+            "requests": requests,
+            "errors": errors,
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(model_id: str) -> CircuitBreaker:
+    if model_id not in _breakers:
+        _breakers[model_id] = CircuitBreaker(model_id)
+    return _breakers[model_id]
+
+
+def is_model_allowed(model_id: str) -> bool:
+    """Check if a model can be picked according to its circuit breaker."""
+    if model_id not in _breakers:
+        return True
+    return _breakers[model_id].allows()
+
+
+def _breaker_bucket_keys(model_id: str) -> list[str]:
+    """Redis keys of the buckets counting a model's outcomes over the window."""
+    current = int(time.time() // BREAKER_BUCKET_SECONDS)
+    count = -(-settings.BREAKER_WINDOW_SECONDS // BREAKER_BUCKET_SECONDS)
+    return [
+        f"breaker:{model_id}:{bucket}"
+        for bucket in range(current - count + 1, current + 1)
+    ]
+
+
+async def _record_shared_outcome(breaker: CircuitBreaker, ok: bool) -> None:
+    """
+    Count an outcome in Redis, sync opened breakers and share the new state.
+    """
+    client = get_async_redis_client()
+    keys = _breaker_bucket_keys(breaker.model_id)
+
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.hincrby(keys[-1], "requests", 1)
+        if not ok:
+            pipe.hincrby(keys[-1], "errors", 1)
+        pipe.expire(keys[-1], settings.BREAKER_WINDOW_SECONDS + BREAKER_BUCKET_SECONDS)
+        for key in keys:
+            pipe.hgetall(key)
+        pipe.hgetall(BREAKER_OPEN_KEY)
+        results = await pipe.execute()
+
+    opened: dict[str, str] = results[-1]
+    for model_id, other in _breakers.items():
+        other.open_until = float(opened[model_id]) if model_id in opened else None
+    for model_id, open_until in opened.items():
+        get_breaker(model_id).open_until = float(open_until)
+
+    buckets: list[dict[str, str]] = results[-len(keys) - 1 : -1]
+    requests = sum(int(bucket.get("requests", 0)) for bucket in buckets)
+    errors = sum(int(bucket.get("errors", 0)) for bucket in buckets)
+
+    if new_state := breaker.update(ok, requests, errors):
+        async with client.pipeline(transaction=False) as pipe:
+            # Count outcomes from scratch after each transition
+            pipe.delete(*keys)
+            if new_state == "open":
+                pipe.hset(BREAKER_OPEN_KEY, breaker.model_id, str(breaker.open_until))
+            else:
+                pipe.hdel(BREAKER_OPEN_KEY, breaker.model_id)
+            await pipe.execute()
+        _log_transition(breaker, new_state, requests, errors)
+
+
+def _log_transition(
+    breaker: CircuitBreaker, state: CircuitState, requests: int, errors: int
+) -> None:
+    if state == "open":
+        logger.warning(
+            f"[BREAKER] Excluding model '{breaker.model_id}' for {settings.BREAKER_OPEN_SECONDS}s "
+            f"({errors}/{requests} failed requests)"
+        )
+    else:
+        logger.info(f"[BREAKER] Model '{breaker.model_id}' is available again")
+
+
+async def record_model_outcome(model_id: str, ok: bool) -> None:
+    """
+    Record the outcome of a model request and update its circuit breaker.
+
+    Args:
+        model_id: Id of the requested model
+        ok: If the request succeeded (False for errors and timeouts)
+    """
+    breaker = get_breaker(model_id)
+
+    if settings.BREAKER_SHARED:
+        try:
+            await _record_shared_outcome(breaker, ok)
+            return
+        except Exception as e:
+            logger.error(f"[BREAKER] Couldn't share outcome of '{model_id}': {e}")
+
+    breaker.record(ok)
+    requests, errors = breaker.counts()
+    if new_state := breaker.update(ok, requests, errors):
+        _log_transition(breaker, new_state, requests, errors)
+
+
+def get_breakers_stats() -> dict[str, BreakerStats]:
+    return {model_id: breaker.stats() for model_id, breaker in _breakers.items()}
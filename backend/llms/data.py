@@ -1,7 +1,7 @@
 import json
 import logging
 from functools import lru_cache
-from typing import Annotated, Any
+from typing import Annotated, Any, Iterable
 
 import numpy as np
 from pydantic import BaseModel, Field, ValidationInfo, computed_field, field_validator
@@ -13,12 +13,20 @@ from backend.config import (
     CustomModelsSelection,
     SelectionMode,
 )
+from backend.llms.breaker import is_model_allowed
 from backend.llms.models import LLMDataArchived, LLMDataEnabled
 from utils.utils import LLMS_GENERATED_DATA_FILE
 
 logger = logging.getLogger("languia")
 
 
+class NoModelAvailableError(Exception):
+    """Raised when every model of a selection pool is excluded."""
+
+    def __str__(self):
+        return "Le comparateur a un problème et aucun des modèles parmi les sélectionnés n'est disponible, veuillez réessayer un autre mode ou revenir plus tard."
+
+
 class LLMsData(BaseModel):
     data_timestamp: float
     all: dict[
@@ -100,45 +108,47 @@ class LLMsData(BaseModel):
         """
         return [model.id for model in self.enabled.values() if model.pricey]
 
-    def pick_one(self, models: list[str], excluded: list[str] = []) -> str:
+    def pick_one(
+        self,
+        models: list[str],
+        excluded: list[str] = [],
+        saturated: Iterable[str] = (),
+    ) -> str:
         """
         Randomly select a model from a list, excluding specified models.
 
+        Saturated models and models whose circuit breaker is open are avoided
+        too, unless no other model is available (see `backend.llms.limiter` and
+        `backend.llms.breaker`). Excluded models are never selected.
+
         Args:
             models: List of available model names to choose from
             excluded: List of model names to exclude from selection
+            saturated: Model names to avoid, unlikely to get a request slot soon
 
         Returns:
             str: Selected model name
 
         Raises:
-            Error: If no models are available after filtering
+            NoModelAvailableError: If no models are available after filtering
         """
-        # Filter out excluded models
+        # Filter out excluded models, then saturated and failing ones if possible
         models_pool = [_id for _id in models if _id not in excluded]
+        avoided = set(saturated)
+        models_pool = [_id for _id in models_pool if _id not in avoided] or models_pool
+        allowed_pool = [_id for _id in models_pool if is_model_allowed(_id)]
+        models_pool = allowed_pool or models_pool
 
         logger.debug("chosing from:" + str(models_pool))
         logger.debug("excluded:" + str(excluded))
 
         # Handle empty pool
         if len(models_pool) == 0:
-            # TODO: tell user in a toast notif that we couldn't respect prefs
-            logger.warning("Couldn't respect exclusion prefs")
             if len(models) == 0:
                 logger.critical("No model to choose from")
-                # No models available at all
-                # FIXME use Error that can be toasted
-                # raise Exception(
-                #     duration=0,
-                #     message="Le comparateur a un problème et aucun des modèles parmi les sélectionnés n'est disponible, veuillez réessayer un autre mode ou revenir plus tard.",
-                # )
-                raise Exception(
-                    "Le comparateur a un problème et aucun des modèles parmi les sélectionnés n'est disponible, veuillez réessayer un autre mode ou revenir plus tard.",
-                )
             else:
-                # Fall back to all models if couldn't respect exclusions
-                # FIXME hmm readding excluded models ?
-                models_pool = models
+                logger.warning("Couldn't respect exclusion prefs")
+            raise NoModelAvailableError()
 
         # Random selection from available models
         picked_index = np.random.choice(len(models_pool), p=None)
@@ -149,6 +159,7 @@ class LLMsData(BaseModel):
         mode: SelectionMode | None = "random",
         custom_selection: CustomModelsSelection = None,
         unavailable_models: list[str] = [],
+        saturated_models: Iterable[str] = (),
     ) -> tuple[str, str]:
         """
         Select two models based on the comparison mode.
@@ -163,9 +174,13 @@ class LLMsData(BaseModel):
             mode: Selection mode string
             custom_models_selection: User's custom model choices (if custom mode)
             unavailable_models: Models that are currently unavailable/offline
+            saturated_models: Models to avoid if possible (see `pick_one`)
 
         Returns:
             tuple: (model_a_id, model_b_id) - pair of model ids, randomly swapped
+
+        Raises:
+            NoModelAvailableError: If a pool has no model left after exclusions
         """
         import random
 
@@ -173,14 +188,26 @@ class LLMsData(BaseModel):
 
         if mode == "big-vs-small":
             # Compare large models against small models
-            model_a_id = self.pick_one(self.big_models, excluded=unavailable_models)
-            model_b_id = self.pick_one(self.small_models, excluded=unavailable_models)
+            model_a_id = self.pick_one(
+                self.big_models, excluded=unavailable_models, saturated=saturated_models
+            )
+            model_b_id = self.pick_one(
+                self.small_models,
+                excluded=unavailable_models,
+                saturated=saturated_models,
+            )
 
         elif mode == "small-models":
             # Compare two small models
-            model_a_id = self.pick_one(self.small_models, excluded=unavailable_models)
+            model_a_id = self.pick_one(
+                self.small_models,
+                excluded=unavailable_models,
+                saturated=saturated_models,
+            )
             model_b_id = self.pick_one(
-                self.small_models, excluded=[*unavailable_models, model_a_id]
+                self.small_models,
+                excluded=[*unavailable_models, model_a_id],
+                saturated=saturated_models,
             )
 
         elif mode == "custom" and custom_selection and len(custom_selection) > 0:
@@ -193,7 +220,9 @@ class LLMsData(BaseModel):
                 # One model chosen by user, pair with random model
                 model_a_id = custom_selection[0]
                 model_b_id = self.pick_one(
-                    self.random_models, excluded=[*unavailable_models, model_a_id]
+                    self.random_models,
+                    excluded=[*unavailable_models, model_a_id],
+                    saturated=saturated_models,
                 )
             elif len(custom_selection) == 2:
                 # Two models chosen by user
@@ -202,9 +231,15 @@ class LLMsData(BaseModel):
 
         else:
             # Default to random mode
-            model_a_id = self.pick_one(self.random_models, excluded=unavailable_models)
+            model_a_id = self.pick_one(
+                self.random_models,
+                excluded=unavailable_models,
+                saturated=saturated_models,
+            )
             model_b_id = self.pick_one(
-                self.random_models, excluded=[*unavailable_models, model_a_id]
+                self.random_models,
+                excluded=[*unavailable_models, model_a_id],
+                saturated=saturated_models,
             )
 
         # Randomly swap models to avoid position bias
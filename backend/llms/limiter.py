@@ -0,0 +1,221 @@
+"""
+Concurrency limits of requests to LLM providers.
+
+Each provider (keyed by `Endpoint.api_base`, or `api_type` when it has no base
+url) and each model has a max number of in-flight requests. Excess requests
+wait in FIFO order up to a max wait time and fail with `ProviderBusyError`
+after it.
+
+Limits are local to the process (API worker or generation worker), configure
+them according to the number of processes.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, TypedDict
+
+from backend.config import settings
+from backend.errors import ProviderBusyError
+from backend.llms.models import Endpoint, LLMDataEnabled
+
+logger = logging.getLogger("languia")
+
+# Smoothing factor of the hold/wait time moving averages
+EWMA_ALPHA = 0.2
+
+
+class LimiterStats(TypedDict):
+    limit: int
+    in_flight: int
+    queued: int
+    acquired: int
+    timeouts: int
+    avg_wait: float
+    max_wait: float
+    avg_hold: float
+
+
+class ConcurrencyLimiter:
+    """
+    Bound the number of concurrent holders, waiters are served in FIFO order.
+
+    A released slot is handed over directly to the first waiter so that new
+    requests can't overtake queued ones. A limit of 0 disables the bound.
+    """
+
+    def __init__(self, name: str, limit: int) -> None:
+        self.name = name
+        self.limit = limit
+        self.in_flight = 0
+        self.waiters: deque[asyncio.Future[None]] = deque()
+        self.acquired = 0
+        self.timeouts = 0
+        self.avg_wait = 0.0
+        self.max_wait = 0.0
+        self.avg_hold = 0.0
+
+    async def acquire(self, timeout: float) -> None:
+        """
+        Wait for a free slot.
+
+        Args:
+            timeout: Max seconds to wait
+
+        Raises:
+            ProviderBusyError: If no slot was freed in time
+        """
+        start = time.monotonic()
+        if self.has_free_slot():
+            self.in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            except (TimeoutError, asyncio.CancelledError) as e:
+                if waiter.done() and not waiter.cancelled():
+                    # Slot handed over while timing out, give it back
+                    self.release()
+                else:
+                    waiter.cancel()
+                    self.waiters.remove(waiter)
+                if isinstance(e, TimeoutError):
+                    self.timeouts += 1
+                    raise ProviderBusyError(self.name, timeout) from e
+                raise
+
+        wait = time.monotonic() - start
+        self.acquired += 1
+        self.avg_wait += EWMA_ALPHA * (wait - self.avg_wait)
+        self.max_wait = max(self.max_wait, wait)
+
+    def release(self, hold: float | None = None) -> None:
+        """
+        Free a slot, handing it over to the first waiter if any.
+
+        Args:
+            hold: Seconds the slot was held for, to estimate wait times
+        """
+        if hold is not None:
+            self.avg_hold += EWMA_ALPHA * (hold - self.avg_hold)
+
+        if self.waiters:
+            self.waiters.popleft().set_result(None)
+        else:
+            self.in_flight -= 1
+
+    def has_free_slot(self) -> bool:
+        """Check if a new request would get a slot without waiting."""
+        return (not self.limit or self.in_flight < self.limit) and not self.waiters
+
+    def estimated_wait(self) -> float:
+        """Seconds a new request would likely wait for a slot."""
+        if self.has_free_slot():
+            return 0.0
+        return (len(self.waiters) + 1) * self.avg_hold / self.limit
+
+    def stats(self) -> LimiterStats:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": len(self.waiters),
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "avg_wait": round(self.avg_wait, 3),
+            "max_wait": round(self.max_wait, 3),
+            "avg_hold": round(self.avg_hold, 3),
+        }
+
+
+_providers: dict[str, ConcurrencyLimiter] = {}
+_models: dict[str, ConcurrencyLimiter] = {}
+
+
+def provider_key(endpoint: Endpoint) -> str:
+    return endpoint.api_base or endpoint.api_type or "default"
+
+
+def _get_limiter(
+    limiters: dict[str, ConcurrencyLimiter], key: str, default_limit: int
+) -> ConcurrencyLimiter:
+    if key not in limiters:
+        limit = settings.LLM_MAX_IN_FLIGHT.get(key, default_limit)
+        limiters[key] = ConcurrencyLimiter(key, limit)
+    return limiters[key]
+
+
+def get_provider_limiter(endpoint: Endpoint) -> ConcurrencyLimiter:
+    return _get_limiter(
+        _providers, provider_key(endpoint), settings.LLM_PROVIDER_MAX_IN_FLIGHT
+    )
+
+
+def get_model_limiter(model_id: str) -> ConcurrencyLimiter:
+    return _get_limiter(_models, model_id, settings.LLM_MODEL_MAX_IN_FLIGHT)
+
+
+@asynccontextmanager
+async def limit_concurrency(model_id: str, endpoint: Endpoint) -> AsyncIterator[None]:
+    """
+    Hold a model slot and a provider slot while requesting a model.
+
+    Both slots are waited for in `LLM_LIMITER_MAX_WAIT` seconds total.
+
+    Raises:
+        ProviderBusyError: If slots weren't freed in time
+    """
+    deadline = time.monotonic() + settings.LLM_LIMITER_MAX_WAIT
+    model_limiter = get_model_limiter(model_id)
+    provider_limiter = get_provider_limiter(endpoint)
+
+    await model_limiter.acquire(settings.LLM_LIMITER_MAX_WAIT)
+    try:
+        await provider_limiter.acquire(max(0.0, deadline - time.monotonic()))
+    except BaseException:
+        model_limiter.release()
+        raise
+
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        hold = time.monotonic() - start
+        provider_limiter.release(hold)
+        model_limiter.release(hold)
+
+
+def get_saturated_models(models: Iterable[LLMDataEnabled]) -> list[str]:
+    """
+    List models unlikely to get a slot within the max wait time.
+
+    Args:
+        models: Models to check
+
+    Returns:
+        list: ids of saturated models
+    """
+    saturated = []
+    for model in models:
+        model_limiter = _models.get(model.id)
+        provider_limiter = _providers.get(provider_key(model.endpoint))
+        wait = max(
+            model_limiter.estimated_wait() if model_limiter else 0.0,
+            provider_limiter.estimated_wait() if provider_limiter else 0.0,
+        )
+        if wait > settings.LLM_LIMITER_MAX_WAIT:
+            saturated.append(model.id)
+
+    if saturated:
+        logger.warning(f"[LIMITER] Saturated models: {saturated}")
+
+    return saturated
+
+
+def get_limiters_stats() -> dict[str, dict[str, LimiterStats]]:
+    return {
+        "providers": {key: limiter.stats() for key, limiter in _providers.items()},
+        "models": {key: limiter.stats() for key, limiter in _models.items()},
+    }
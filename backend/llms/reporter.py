@@ -0,0 +1,94 @@
+"""
+Reporting of model errors to the controller (see `controller.py`).
+
+Errors are buffered in memory and sent in batches by a background task, so
+that error bursts during a provider outage don't slow down streaming. Reports
+are best effort: they are dropped if the buffer is full or the controller
+can't be reached.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import TypedDict
+
+import httpx
+
+from backend.config import settings
+
+logger = logging.getLogger("languia")
+
+# Seconds between two batches
+ERROR_REPORT_INTERVAL = 2.0
+# Max reports buffered, the oldest ones are dropped first
+ERROR_REPORT_BUFFER_SIZE = 1000
+ERROR_REPORT_TIMEOUT = 5.0
+
+
+class ModelErrorReport(TypedDict):
+    model_id: str
+    error: str
+    timestamp: float
+
+
+_reports: deque[ModelErrorReport] = deque(maxlen=ERROR_REPORT_BUFFER_SIZE)
+_dropped = 0
+_sender: asyncio.Task | None = None
+
+
+def report_model_error(model_id: str, error: str) -> None:
+    """
+    Buffer a model error to be sent to the controller, without waiting.
+
+    Args:
+        model_id: Id of the failing model
+        error: Error details
+    """
+    global _dropped, _sender
+
+    if not settings.LANGUIA_CONTROLLER_URL:
+        return
+
+    if len(_reports) == _reports.maxlen:
+        _dropped += 1
+    _reports.append({"model_id": model_id, "error": error, "timestamp": time.time()})
+
+    if _sender is None or _sender.done():
+        _sender = asyncio.create_task(_send_reports_periodically())
+
+
+async def _send_reports_periodically() -> None:
+    while _reports:
+        await asyncio.sleep(ERROR_REPORT_INTERVAL)
+        await send_error_reports()
+
+
+async def send_error_reports() -> None:
+    """Send buffered reports to the controller in a single batch."""
+    global _dropped
+
+    if not _reports:
+        return
+
+    batch = list(_reports)
+    _reports.clear()
+    if _dropped:
+        logger.warning(f"[REPORTER] {_dropped} error reports dropped (buffer full)")
+        _dropped = 0
+
+    try:
+        async with httpx.AsyncClient(timeout=ERROR_REPORT_TIMEOUT) as client:
+            response = await client.post(
+                f"{settings.LANGUIA_CONTROLLER_URL}/errors", json=batch
+            )
+            response.raise_for_status()
+    except Exception as e:
+        logger.debug(f"[REPORTER] Couldn't send {len(batch)} error reports: {e}")
+
+
+async def close_error_reporter() -> None:
+    """Stop the background task and send the remaining reports."""
+    if _sender is not None and not _sender.done():
+        _sender.cancel()
+    await send_error_reports()
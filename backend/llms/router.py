@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Request
 
+from backend.llms.breaker import get_breakers_stats
 from backend.llms.data import get_llms_data
+from backend.llms.limiter import get_limiters_stats
+from backend.llms.stalls import get_stalls_stats
 from backend.utils.countries import CountryPortalAnno
 
 router = APIRouter(
@@ -17,3 +20,28 @@ async def get_available_models(country_portal: CountryPortalAnno):
         "data_timestamp": models.data_timestamp,
         "models": list(models.all.values()),
     }
+
+
+@router.get("/limits")
+async def get_limits():
+    """
+    Concurrency limiters state of this process: in-flight requests, queue depth
+    and wait times per provider and per model.
+    """
+    return get_limiters_stats()
+
+
+@router.get("/breakers")
+async def get_breakers():
+    """
+    Circuit breakers state of this process: state and recent outcomes per model.
+    """
+    return get_breakers_stats()
+
+
+@router.get("/stalls")
+async def get_stalls():
+    """
+    Stall thresholds of this process: recent chunk gaps and threshold per model.
+    """
+    return get_stalls_stats()
@@ -0,0 +1,114 @@
+"""
+Stall thresholds of models, to interrupt responses which stopped streaming.
+
+Once a response started, `bot_response_async` ends it with a `StreamStalledError`
+if no text arrives for the model's stall threshold. Models don't stream at the
+same pace (reasoning models can pause for a while between two chunks), so the
+threshold adapts to each model: `STALL_P99_MULTIPLIER` times the 99th
+percentile of the gaps between chunks of its last completed responses, within
+[`STALL_MIN_SECONDS`, `STALL_MAX_SECONDS`]. Until `STALL_MIN_SAMPLES` gaps were
+observed, `STALL_MAX_SECONDS` is used.
+
+Gaps are only recorded from completed responses (a stall doesn't raise the
+threshold) and are local to the process.
+"""
+
+import logging
+from collections import deque
+from typing import TypedDict
+
+import numpy as np
+
+from backend.config import settings
+
+logger = logging.getLogger("languia")
+
+
+class StallStats(TypedDict):
+    samples: int
+    gap_p99: float | None
+    threshold: float
+
+
+class GapTracker:
+    """
+    Recent gaps between chunks of a model's responses and its stall threshold.
+    """
+
+    def __init__(self, model_id: str) -> None:
+        self.model_id = model_id
+        self.gaps: deque[float] = deque(maxlen=settings.STALL_GAP_SAMPLES)
+        # Cached percentile, invalidated when gaps are recorded
+        self._gap_p99: float | None = None
+
+    def record(self, gaps: list[float]) -> None:
+        self.gaps.extend(gaps)
+        self._gap_p99 = None
+
+    @property
+    def gap_p99(self) -> float | None:
+        if len(self.gaps) < settings.STALL_MIN_SAMPLES:
+            return None
+        if self._gap_p99 is None:
+            self._gap_p99 = float(np.percentile(self.gaps, 99))
+        return self._gap_p99
+
+    @property
+    def threshold(self) -> float:
+        """Seconds without text after which a response is considered stalled."""
+        if (gap_p99 := self.gap_p99) is None:
+            return settings.STALL_MAX_SECONDS
+        return min(
+            settings.STALL_MAX_SECONDS,
+            max(settings.STALL_MIN_SECONDS, gap_p99 * settings.STALL_P99_MULTIPLIER),
+        )
+
+
+_trackers: dict[str, GapTracker] = {}
+
+
+def get_gap_tracker(model_id: str) -> GapTracker:
+    if model_id not in _trackers:
+        _trackers[model_id] = GapTracker(model_id)
+    return _trackers[model_id]
+
+
+def get_stall_threshold(model_id: str) -> float:
+    """
+    Seconds without text after which a model's response is interrupted (0 to disable).
+
+    Args:
+        model_id: Model id
+
+    Returns:
+        float: stall threshold in seconds
+    """
+    if settings.STALL_MAX_SECONDS <= 0:
+        return 0.0
+    return get_gap_tracker(model_id).threshold
+
+
+def record_chunk_gaps(model_id: str, gaps: list[float]) -> None:
+    """
+    Record the gaps between chunks of a completed response of a model.
+
+    Args:
+        model_id: Model id
+        gaps: Seconds between two consecutive text chunks
+    """
+    if gaps:
+        get_gap_tracker(model_id).record(gaps)
+
+
+def get_stalls_stats() -> dict[str, StallStats]:
+    """
+    Stall thresholds of the models which completed responses in this process.
+    """
+    return {
+        model_id: {
+            "samples": len(tracker.gaps),
+            "gap_p99": tracker.gap_p99,
+            "threshold": tracker.threshold,
+        }
+        for model_id, tracker in _trackers.items()
+    }
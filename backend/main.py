@@ -1,14 +1,34 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from backend.arena.litellm import close_endpoint_clients, init_endpoint_clients
+from backend.arena.resume import close_sse_hub
 from backend.arena.router import router as arena_router
+from backend.arena.tokens import warm_tokenizers
 from backend.config import OBJECTIVES
+from backend.llms.reporter import close_error_reporter
 from backend.llms.router import router as models_router
 from backend.logger import configure_logger, configure_uvicorn_logging
 from backend.sentry import init_sentry
+from backend.session import close_async_redis_client
 from backend.utils.countries import CountryPortalAnno, get_country_portal_count
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create LLM endpoints clients once per process
+    init_endpoint_clients()
+    warm_tokenizers()
+    yield
+    await close_endpoint_clients()
+    await close_error_reporter()
+    await close_sse_hub()
+    await close_async_redis_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 logger = configure_logger()
 configure_uvicorn_logging()
@@ -32,6 +52,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pricey models rate limit, see `backend.arena.ratelimit`
+    expose_headers=[
+        "X-RateLimit-Limit",
+        "X-RateLimit-Remaining",
+        "X-RateLimit-Reset",
+        "Retry-After",
+    ],
 )
 
 app.include_router(models_router)
@@ -41,6 +68,6 @@ app.include_router(arena_router)
 @app.get("/counter")
 async def get_counter(country_portal: CountryPortalAnno):
     return {
-        "count": get_country_portal_count(country_portal),
+        "count": await get_country_portal_count(country_portal),
         "objective": OBJECTIVES[country_portal],
     }
@@ -7,28 +7,55 @@ and provides session state management.
 
 from functools import lru_cache
 
-import redis
+import redis.asyncio
 
 from backend.config import settings
 
 
+def _create_connection_pool(
+    decode_responses: bool,
+) -> redis.asyncio.BlockingConnectionPool:
+    return redis.asyncio.BlockingConnectionPool(
+        host=settings.COMPARIA_REDIS_HOST,
+        port=6379,
+        decode_responses=decode_responses,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+    )
+
+
 @lru_cache
-def get_redis_client() -> redis.Redis:
-    try:
-        # Initialize Redis client
-        client = redis.Redis(
-            host=settings.COMPARIA_REDIS_HOST,
-            port=6379,
-            decode_responses=True,  # returns strings instead of bytes
-        )
-
-        # Fail if we don't have a working redis
-        if not (response := client.ping()):
-            raise Exception(f"{response}")
-
-        return client
-    except Exception as e:
-        raise Exception(f"Redis Connection Error: {e}")
+def get_async_redis_client() -> redis.asyncio.Redis:
+    """
+    Redis client of async handlers, sharing a bounded pool of connections.
+
+    Connections are lazily opened, the first command fails if Redis is down.
+    Commands wait up to `REDIS_POOL_TIMEOUT` seconds for a free connection and
+    fail after `REDIS_SOCKET_TIMEOUT` seconds, so that a slow Redis fails
+    requests instead of piling them up.
+    """
+    # returns strings instead of bytes
+    return redis.asyncio.Redis(connection_pool=_create_connection_pool(True))
+
+
+@lru_cache
+def get_async_redis_bytes_client() -> redis.asyncio.Redis:
+    """
+    Redis client returning bytes, for binary values (see `backend.arena.codec`).
+
+    Same settings as `get_async_redis_client`, with its own pool.
+    """
+    return redis.asyncio.Redis(connection_pool=_create_connection_pool(False))
+
+
+async def close_async_redis_client() -> None:
+    for get_client in (get_async_redis_client, get_async_redis_bytes_client):
+        if get_client.cache_info().currsize:
+            await get_client().aclose(close_connection_pool=True)
+            get_client.cache_clear()
 
 
 # Draft session class and methods
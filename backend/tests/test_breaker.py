@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+
+from backend.config import settings
+from backend.llms import breaker
+from backend.llms.breaker import (
+    BREAKER_OPEN_KEY,
+    CircuitBreaker,
+    get_breaker,
+    is_model_allowed,
+    record_model_outcome,
+)
+
+
+@pytest.fixture(autouse=True)
+def breakers(monkeypatch):
+    monkeypatch.setattr(breaker, "_breakers", {})
+    monkeypatch.setattr(settings, "BREAKER_MIN_REQUESTS", 4)
+    monkeypatch.setattr(settings, "BREAKER_ERROR_RATE", 0.5)
+    monkeypatch.setattr(settings, "BREAKER_SHARED", False)
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(breaker, "get_async_redis_client", lambda: client)
+    monkeypatch.setattr(settings, "BREAKER_SHARED", True)
+    return client
+
+
+def record(model_id: str, *outcomes: bool) -> None:
+    async def run():
+        for ok in outcomes:
+            await record_model_outcome(model_id, ok)
+
+    asyncio.run(run())
+
+
+def test_unknown_models_are_allowed():
+    assert is_model_allowed("model")
+    assert get_breaker("model").state == "closed"
+
+
+def test_opens_once_the_error_rate_is_reached():
+    record("model", False, False, False)
+    # Not enough requests yet
+    assert get_breaker("model").state == "closed"
+
+    record("model", True)
+    assert get_breaker("model").state == "open"
+    assert not is_model_allowed("model")
+
+
+def test_stays_closed_below_the_error_rate():
+    record("model", False, True, True, True, False, True, True)
+
+    assert get_breaker("model").state == "closed"
+    assert is_model_allowed("model")
+
+
+def test_old_outcomes_are_forgotten():
+    model_breaker = CircuitBreaker("model")
+    old = time.time() - settings.BREAKER_WINDOW_SECONDS - 1
+    model_breaker.outcomes.extend([(old, False), (old, False), (time.time(), True)])
+
+    assert model_breaker.counts() == (1, 0)
+
+
+def test_half_open_breaker_probes_a_share_of_picks(monkeypatch):
+    model_breaker = get_breaker("model")
+    model_breaker.open()
+    model_breaker.open_until = time.time() - 1
+    assert model_breaker.state == "half-open"
+
+    monkeypatch.setattr(settings, "BREAKER_HALF_OPEN_SHARE", 1.0)
+    assert is_model_allowed("model")
+    monkeypatch.setattr(settings, "BREAKER_HALF_OPEN_SHARE", 0.0)
+    assert not is_model_allowed("model")
+
+
+@pytest.mark.parametrize("ok, state", [(True, "closed"), (False, "open")])
+def test_half_open_breaker_closes_or_opens_on_first_probe(ok, state):
+    model_breaker = get_breaker("model")
+    model_breaker.open()
+    model_breaker.open_until = time.time() - 1
+
+    record("model", ok)
+
+    assert model_breaker.state == state
+    assert not model_breaker.outcomes
+
+
+def test_shared_breakers_are_opened_for_every_process(redis_client):
+    record("model", False, False, False, False)
+    assert get_breaker("model").state == "open"
+
+    async def opened():
+        return await redis_client.hgetall(BREAKER_OPEN_KEY)
+
+    assert set(asyncio.run(opened())) == {"model"}
+
+    # Another process syncs opened breakers when recording any outcome
+    breaker._breakers.clear()
+    record("other", True)
+    assert get_breaker("model").state == "open"
+
+
+def test_shared_breakers_count_outcomes_of_every_process(redis_client):
+    record("model", False, False)
+    breaker._breakers.clear()
+    record("model", False, True)
+
+    assert get_breaker("model").state == "open"
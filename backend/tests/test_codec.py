@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from backend.arena import codec
+from backend.arena.codec import (
+    JSON_VERSION,
+    ZLIB_VERSION,
+    ZSTD_VERSION,
+    decode_session_value,
+    encode_session_value,
+)
+from backend.config import settings
+
+VALUE = json.dumps(
+    [{"role": "assistant", "content": "Bonjour, comment puis-je vous aider ?"}] * 20
+).encode()
+VERSIONS = {"none": JSON_VERSION, "zlib": ZLIB_VERSION, "zstd": ZSTD_VERSION}
+
+
+@pytest.fixture(params=["none", "zlib", "zstd"])
+def compression(request, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_COMPRESSION", request.param)
+    monkeypatch.setattr(settings, "SESSION_COMPRESSION_MIN_SIZE", 256)
+    monkeypatch.setattr(codec, "COMPRESSOR", codec._get_compressor())
+    return request.param
+
+
+def test_round_trip(compression):
+    encoded = encode_session_value(VALUE)
+
+    assert encoded[:1] == VERSIONS[compression]
+    assert decode_session_value(encoded) == VALUE
+
+
+def test_compressed_values_are_smaller(compression):
+    if compression != "none":
+        assert len(encode_session_value(VALUE)) < len(VALUE) / 5
+
+
+def test_small_values_are_not_compressed(compression):
+    value = b'{"a": 1}'
+
+    assert encode_session_value(value) == JSON_VERSION + value
+    assert decode_session_value(JSON_VERSION + value) == value
+
+
+def test_incompressible_values_are_stored_as_is(compression):
+    value = os.urandom(1024)
+
+    assert encode_session_value(value) == JSON_VERSION + value
+
+
+@pytest.mark.parametrize("value", [VALUE, b"[]", b'"text"', b""])
+def test_values_stored_before_versioning_are_read_as_is(value):
+    assert decode_session_value(value) == value
+
+
+@pytest.mark.parametrize("version", [ZLIB_VERSION, ZSTD_VERSION])
+def test_corrupted_values_raise_value_error(version):
+    with pytest.raises(ValueError):
+        decode_session_value(version + b"not compressed")
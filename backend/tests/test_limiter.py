@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from backend.errors import ProviderBusyError
+from backend.llms.limiter import ConcurrencyLimiter
+
+
+def test_free_slots_are_acquired_right_away():
+    async def run():
+        limiter = ConcurrencyLimiter("provider", 2)
+        await limiter.acquire(timeout=0)
+        await limiter.acquire(timeout=0)
+        assert limiter.in_flight == 2
+        assert not limiter.has_free_slot()
+
+        limiter.release()
+        assert limiter.in_flight == 1
+        assert limiter.has_free_slot()
+
+    asyncio.run(run())
+
+
+def test_no_limit():
+    async def run():
+        limiter = ConcurrencyLimiter("provider", 0)
+        for _ in range(100):
+            await limiter.acquire(timeout=0)
+        assert limiter.in_flight == 100
+        assert limiter.has_free_slot()
+        assert limiter.estimated_wait() == 0
+
+    asyncio.run(run())
+
+
+def test_released_slots_are_handed_over_in_fifo_order():
+    async def run():
+        limiter = ConcurrencyLimiter("provider", 1)
+        await limiter.acquire(timeout=0)
+        acquired: list[str] = []
+
+        async def wait(name: str) -> None:
+            await limiter.acquire(timeout=5)
+            acquired.append(name)
+
+        first = asyncio.create_task(wait("first"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(wait("second"))
+        await asyncio.sleep(0)
+        assert len(limiter.waiters) == 2
+
+        limiter.release()
+        # A new request can't overtake the queued ones
+        assert not limiter.has_free_slot()
+        await first
+        assert acquired == ["first"]
+        assert limiter.in_flight == 1
+
+        limiter.release()
+        await second
+        assert acquired == ["first", "second"]
+        assert limiter.in_flight == 1
+
+    asyncio.run(run())
+
+
+def test_wait_times_out():
+    async def run():
+        limiter = ConcurrencyLimiter("provider", 1)
+        await limiter.acquire(timeout=0)
+
+        with pytest.raises(ProviderBusyError):
+            await limiter.acquire(timeout=0.01)
+
+        assert not limiter.waiters
+        assert limiter.timeouts == 1
+        assert limiter.in_flight == 1
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        limiter = ConcurrencyLimiter("provider", 1)
+        await limiter.acquire(timeout=0)
+        waiter = asyncio.create_task(limiter.acquire(timeout=5))
+        await asyncio.sleep(0)
+        assert len(limiter.waiters) == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert not limiter.waiters
+
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_estimated_wait_grows_with_the_queue():
+    async def run():
+        limiter = ConcurrencyLimiter("provider", 2)
+        limiter.avg_hold = 10.0
+        await limiter.acquire(timeout=0)
+        assert limiter.estimated_wait() == 0
+
+        await limiter.acquire(timeout=0)
+        assert limiter.estimated_wait() == 5.0
+
+        waiter = asyncio.create_task(limiter.acquire(timeout=5))
+        await asyncio.sleep(0)
+        assert limiter.estimated_wait() == 10.0
+
+        limiter.release(hold=10.0)
+        await waiter
+
+    asyncio.run(run())
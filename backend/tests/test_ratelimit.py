@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+
+from backend.arena import ratelimit
+from backend.arena.ratelimit import (
+    RateLimit,
+    charge_rate_limit,
+    ratelimit_key,
+    reserve_rate_limit,
+)
+from backend.config import settings
+
+IP = "192.0.2.1"
+
+
+@pytest.fixture(autouse=True)
+def redis_client(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(ratelimit, "get_async_redis_client", lambda: client)
+    monkeypatch.setattr(settings, "RATELIMIT_PRICEY_BUDGET", 1000)
+    monkeypatch.setattr(settings, "RATELIMIT_PRICEY_WINDOW_SECONDS", 3600)
+    ratelimit._get_token_bucket_script.cache_clear()
+    yield client
+    ratelimit._get_token_bucket_script.cache_clear()
+
+
+def test_reserve_charges_a_full_bucket():
+    rate_limit = asyncio.run(reserve_rate_limit(IP, 300))
+
+    assert not rate_limit.exceeded
+    assert rate_limit.tokens == pytest.approx(700, abs=1)
+    assert rate_limit.remaining in (700, 699)
+
+
+def test_check_only_doesnt_create_the_bucket(redis_client):
+    async def run():
+        rate_limit = await reserve_rate_limit(IP, 0)
+        return rate_limit, await redis_client.exists(ratelimit_key(IP))
+
+    rate_limit, exists = asyncio.run(run())
+
+    assert not rate_limit.exceeded
+    assert rate_limit.tokens == 1000
+    assert not exists
+
+
+def test_prompts_are_refused_once_the_bucket_is_empty():
+    async def run():
+        # A prompt is accepted as long as the bucket isn't empty, even if it costs more
+        first = await reserve_rate_limit(IP, 800)
+        second = await reserve_rate_limit(IP, 800)
+        third = await reserve_rate_limit(IP, 800)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+
+    assert not first.exceeded and not second.exceeded
+    assert second.tokens == pytest.approx(-600, abs=1)
+    assert third.exceeded
+    # Nothing reserved by the refused prompt
+    assert third.tokens == pytest.approx(-600, abs=1)
+    assert third.remaining == 0
+
+
+def test_charges_apply_to_an_empty_bucket():
+    async def run():
+        await reserve_rate_limit(IP, 1000)
+        return await charge_rate_limit(IP, 500)
+
+    rate_limit = asyncio.run(run())
+
+    assert not rate_limit.exceeded
+    assert rate_limit.tokens == pytest.approx(-500, abs=1)
+
+
+def test_bucket_refills_over_the_window(redis_client):
+    async def run():
+        await redis_client.hset(
+            ratelimit_key(IP),
+            mapping={"tokens": "-500", "updated": str(time.time() - 1800)},
+        )
+        return await reserve_rate_limit(IP, 0)
+
+    rate_limit = asyncio.run(run())
+
+    assert not rate_limit.exceeded
+    assert rate_limit.tokens == pytest.approx(0, abs=1)
+
+
+def test_bucket_doesnt_refill_over_its_capacity(redis_client):
+    async def run():
+        await redis_client.hset(
+            ratelimit_key(IP),
+            mapping={"tokens": "900", "updated": str(time.time() - 3600)},
+        )
+        return await reserve_rate_limit(IP, 100)
+
+    assert asyncio.run(run()).tokens == pytest.approx(900, abs=1)
+
+
+def test_ips_have_separate_buckets():
+    async def run():
+        await reserve_rate_limit(IP, 2000)
+        return await reserve_rate_limit("192.0.2.2", 0)
+
+    assert asyncio.run(run()).tokens == 1000
+
+
+def test_headers():
+    assert RateLimit(limit=1000, tokens=250.5).headers == {
+        "X-RateLimit-Limit": "1000",
+        "X-RateLimit-Remaining": "250",
+        "X-RateLimit-Reset": "2699",
+    }
+
+    exceeded = RateLimit(limit=1000, tokens=-100, exceeded=True)
+    assert exceeded.headers["X-RateLimit-Remaining"] == "0"
+    # 100 characters refilled in 360s
+    assert exceeded.headers["Retry-After"] == "361"
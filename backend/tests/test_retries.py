@@ -0,0 +1,85 @@
+import time
+from email.utils import formatdate
+
+import httpx
+import pytest
+
+from backend.arena.retries import get_retry_after, get_retry_delay
+from backend.config import settings
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code: int = 503, **attributes) -> None:
+        super().__init__(status_code)
+        self.status_code = status_code
+        self.__dict__.update(attributes)
+
+
+@pytest.fixture(autouse=True)
+def retry_settings(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.5)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_DELAY", 4.0)
+    monkeypatch.setattr(settings, "LLM_RETRY_BUDGET", 10.0)
+
+
+@pytest.mark.parametrize(
+    "value, expected", [("3", 3.0), ("1.5", 1.5), ("-2", 0.0), ("soon", None)]
+)
+def test_retry_after_seconds(value, expected):
+    error = ProviderError(litellm_response_headers={"Retry-After": value})
+
+    assert get_retry_after(error) == expected
+
+
+def test_retry_after_date():
+    error = ProviderError(
+        litellm_response_headers={"retry-after": formatdate(time.time() + 30)}
+    )
+
+    assert 28 <= get_retry_after(error) <= 30
+
+
+def test_retry_after_from_http_response():
+    request = httpx.Request("POST", "https://provider.test/v1/chat/completions")
+    response = httpx.Response(429, headers={"Retry-After": "2"}, request=request)
+
+    assert get_retry_after(ProviderError(429, response=response)) == 2.0
+
+
+def test_retry_after_missing():
+    assert get_retry_after(ProviderError()) is None
+    assert get_retry_after(ProviderError(litellm_response_headers={})) is None
+
+
+@pytest.mark.parametrize("status_code", [400, 401, 404, 500])
+def test_other_errors_are_not_retried(status_code):
+    assert get_retry_delay(ProviderError(status_code), 0, time.monotonic()) is None
+    assert get_retry_delay(ValueError("boom"), 0, time.monotonic()) is None
+
+
+def test_retries_are_bounded():
+    assert get_retry_delay(ProviderError(), 1, time.monotonic()) is not None
+    assert get_retry_delay(ProviderError(), 2, time.monotonic()) is None
+
+
+@pytest.mark.parametrize("attempt, max_delay", [(0, 0.5), (1, 1.0), (3, 4.0)])
+def test_exponential_backoff_with_full_jitter(monkeypatch, attempt, max_delay):
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_ATTEMPTS", 5)
+
+    for _ in range(50):
+        delay = get_retry_delay(ProviderError(502), attempt, time.monotonic())
+        assert delay is not None and 0 <= delay <= max_delay
+
+
+def test_retry_after_overrides_backoff():
+    error = ProviderError(429, litellm_response_headers={"Retry-After": "7"})
+
+    assert get_retry_delay(error, 0, time.monotonic()) == 7.0
+
+
+def test_retries_stay_within_budget():
+    error = ProviderError(429, litellm_response_headers={"Retry-After": "3"})
+
+    assert get_retry_delay(error, 0, time.monotonic() - 5) == 3.0
+    assert get_retry_delay(error, 0, time.monotonic() - 8) is None
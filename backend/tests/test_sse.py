@@ -0,0 +1,178 @@
+import pytest
+
+from backend.arena.models import (
+    AssistantMessage,
+    AssistantMessageMetadata,
+    UserMessage,
+)
+from backend.arena.sse import (
+    SSEChunkCoalescer,
+    SSEDeltaEncoder,
+    sse_protocol_from_headers,
+)
+
+
+def assistant(content: str = "", reasoning: str = "") -> AssistantMessage:
+    metadata = AssistantMessageMetadata(generation_id="gen", bot="a")
+    return AssistantMessage(content=content, reasoning=reasoning, metadata=metadata)
+
+
+def chunk(messages: list, pos: str = "a") -> dict:
+    return {"type": "chunk", "pos": pos, "messages": messages}
+
+
+@pytest.mark.parametrize(
+    "header, protocol", [("2", 2), ("1", 1), (None, 1), ("9", 1), ("v2", 1)]
+)
+def test_protocol_from_headers(header, protocol):
+    assert sse_protocol_from_headers(header) == protocol
+
+
+def test_legacy_protocol_sends_events_as_is():
+    encoder = SSEDeltaEncoder(1)
+    event = chunk([UserMessage(content="hi"), assistant("Hello")])
+
+    assert encoder.encode(event) == [event]
+    assert encoder.encode(event) == [event]
+
+
+def test_first_update_is_a_snapshot_then_deltas():
+    encoder = SSEDeltaEncoder(2)
+    message = assistant("Hel")
+    messages = [UserMessage(content="hi"), message]
+
+    assert encoder.encode(chunk(messages)) == [chunk(messages)]
+
+    message.content = "Hello"
+    message.reasoning = "think"
+    assert encoder.encode(chunk(messages)) == [
+        {
+            "type": "delta",
+            "pos": "a",
+            "index": 1,
+            "content": "lo",
+            "content_offset": 3,
+            "reasoning": "think",
+            "reasoning_offset": 0,
+        }
+    ]
+
+    message.content = "Hello!"
+    [delta] = encoder.encode(chunk(messages))
+    assert (delta["content"], delta["content_offset"]) == ("!", 5)
+    assert (delta["reasoning"], delta["reasoning_offset"]) == ("", 5)
+
+
+def test_unchanged_message_sends_nothing():
+    encoder = SSEDeltaEncoder(2)
+    messages = [UserMessage(content="hi"), assistant("Hello")]
+    encoder.encode(chunk(messages))
+
+    assert encoder.encode(chunk(messages)) == []
+
+
+def test_update_which_isnt_an_append_is_a_snapshot():
+    encoder = SSEDeltaEncoder(2)
+    message = assistant("Hello ")
+    messages = [UserMessage(content="hi"), message]
+    encoder.encode(chunk(messages))
+
+    # Streamed text is stripped when synced
+    message.content = "Hello"
+    assert encoder.encode(chunk(messages)) == [chunk(messages)]
+
+    message.content = "Hello you"
+    [delta] = encoder.encode(chunk(messages))
+    assert (delta["content"], delta["content_offset"]) == (" you", 5)
+
+
+def test_new_message_is_a_snapshot():
+    encoder = SSEDeltaEncoder(2)
+    messages = [UserMessage(content="hi"), assistant("Hello")]
+    encoder.encode(chunk(messages))
+
+    messages += [UserMessage(content="more"), assistant("Sure")]
+    assert encoder.encode(chunk(messages)) == [chunk(messages)]
+
+
+def test_positions_are_encoded_separately():
+    encoder = SSEDeltaEncoder(2)
+    message_a, message_b = assistant("A"), assistant("B")
+    messages_a = [UserMessage(content="hi"), message_a]
+    messages_b = [UserMessage(content="hi"), message_b]
+    encoder.encode(chunk(messages_a, "a"))
+    encoder.encode(chunk(messages_b, "b"))
+
+    message_b.content = "Bb"
+    [delta] = encoder.encode(chunk(messages_b, "b"))
+    assert (delta["pos"], delta["content"], delta["content_offset"]) == ("b", "b", 1)
+
+
+def test_position_completes_with_a_snapshot():
+    encoder = SSEDeltaEncoder(2)
+    message = assistant("Hel")
+    messages = [UserMessage(content="hi"), message]
+    encoder.encode(chunk(messages))
+
+    message.content = "Hello"
+    complete = {"type": "complete", "pos": "a"}
+    assert encoder.encode(complete) == [chunk(messages), complete]
+    # The snapshot resets the sent lengths
+    assert encoder.encode(chunk(messages)) == []
+
+
+def test_other_events_are_sent_as_is():
+    encoder = SSEDeltaEncoder(2)
+    for event in (
+        {"type": "init", "session_hash": "abc"},
+        {"type": "error", "error": "boom", "pos": "a"},
+        {"type": "complete"},
+        # Nothing to snapshot for a position never seen
+        {"type": "complete", "pos": "b"},
+    ):
+        assert encoder.encode(event) == [event]
+
+
+def test_coalescer_keeps_the_last_chunk_of_each_position():
+    coalescer = SSEChunkCoalescer(interval=10, max_bytes=1000)
+    messages_a = [UserMessage(content="hi"), assistant("A")]
+    messages_b = [UserMessage(content="hi"), assistant("B")]
+    first, last = chunk(messages_a, "a"), chunk(messages_a, "a")
+
+    assert coalescer.timeout() is None
+    for event in (first, chunk(messages_b, "b"), last):
+        coalescer.add(event)
+
+    events = coalescer.drain()
+    assert [event["pos"] for event in events] == ["a", "b"]
+    assert events[0] is last
+    assert coalescer.pending == {}
+
+
+def test_coalescer_flushes_the_first_chunk_right_away():
+    coalescer = SSEChunkCoalescer(interval=10, max_bytes=1000)
+    coalescer.add(chunk([UserMessage(content="hi"), assistant("A")]))
+
+    assert coalescer.is_due()
+    coalescer.drain()
+
+    coalescer.add(chunk([UserMessage(content="hi"), assistant("AB")]))
+    assert not coalescer.is_due()
+    assert 0 < coalescer.timeout() <= 10
+
+
+def test_coalescer_flushes_after_max_bytes():
+    coalescer = SSEChunkCoalescer(interval=10, max_bytes=10)
+    message = assistant("A")
+    messages = [UserMessage(content="hi"), message]
+    coalescer.add(chunk(messages))
+    coalescer.drain()
+
+    message.content = "A" * 5
+    coalescer.add(chunk(messages))
+    assert coalescer.pending_bytes == 4
+    assert not coalescer.is_due()
+
+    message.content = "A" * 11
+    assert coalescer.pending_bytes == 10
+    assert coalescer.is_due()
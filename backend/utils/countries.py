@@ -1,5 +1,6 @@
+import asyncio
 import logging
-from typing import Annotated, Awaitable, cast
+from typing import Annotated, cast
 
 from fastapi import Depends, Header, HTTPException, status
 
@@ -41,7 +42,38 @@ def country_portal_from_locale(locale: str = Header(..., alias="X-Locale")) -> s
 CountryPortalAnno = Annotated[CountryPortal, Depends(country_portal_from_locale)]
 
 
-def get_country_portal_count(country_code: CountryPortal, ttl: int = 120) -> int:
+def _count_votes_and_reactions(country_code: CountryPortal) -> int:
+    """Count votes and reactions of a country portal in Postgres (blocking)."""
+    import psycopg2
+    from psycopg2 import sql
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(settings.COMPARIA_DB_URI)
+        cursor = conn.cursor()
+        # Count votes and reactions linked to conversations with country_portal
+        query = sql.SQL("""
+            SELECT
+                (SELECT COUNT(*) FROM votes v
+                 JOIN conversations c ON v.conversation_pair_id = c.conversation_pair_id
+                 WHERE c.country_portal = %s) +
+                (SELECT COUNT(*) FROM reactions r
+                 JOIN conversations c ON r.conversation_pair_id = c.conversation_pair_id
+                 WHERE c.country_portal = %s)
+            as total;
+        """)
+        cursor.execute(query, (country_code, country_code))
+        res = cursor.fetchone()
+        return res[0] if res and res[0] is not None else 0
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+async def get_country_portal_count(country_code: CountryPortal, ttl: int = 120) -> int:
     """
     Get the count of votes and reactions for conversations with a specific country portal.
 
@@ -52,17 +84,13 @@ def get_country_portal_count(country_code: CountryPortal, ttl: int = 120) -> int
     Returns:
         The count of votes and reactions for the specified country portal
     """
-    import psycopg2
-    from psycopg2 import sql
-
-    from backend.session import get_redis_client
+    from backend.session import get_async_redis_client
 
     cache_key = f"{country_code}_count"
     # Try Redis first
-    client = get_redis_client()
+    client = get_async_redis_client()
     try:
-        count = client.get(cache_key)
-        assert not isinstance(count, Awaitable)
+        count = await client.get(cache_key)
         if count is not None:
             return int(count)
     except Exception as e:
@@ -73,38 +101,16 @@ def get_country_portal_count(country_code: CountryPortal, ttl: int = 120) -> int
         logger.warning("Cannot log to db: no db configured")
         return 0
 
-    conn = None
-    cursor = None
-    result = 0
     try:
-        conn = psycopg2.connect(settings.COMPARIA_DB_URI)
-        cursor = conn.cursor()
-        # Count votes and reactions linked to conversations with country_portal
-        query = sql.SQL("""
-            SELECT
-                (SELECT COUNT(*) FROM votes v
-                 JOIN conversations c ON v.conversation_pair_id = c.conversation_pair_id
-                 WHERE c.country_portal = %s) +
-                (SELECT COUNT(*) FROM reactions r
-                 JOIN conversations c ON r.conversation_pair_id = c.conversation_pair_id
-                 WHERE c.country_portal = %s)
-            as total;
-        """)
-        cursor.execute(query, (country_code, country_code))
-        res = cursor.fetchone()
-        result = res[0] if res and res[0] is not None else 0
-
-        try:
-            client.setex(cache_key, ttl, result)
-        except Exception as e:
-            logger.error(f"Error setting {country_code} count in Redis: {e}")
-
-        return result
+        # Off the event loop
+        result = await asyncio.to_thread(_count_votes_and_reactions, country_code)
     except Exception as e:
         logger.error(f"Error getting {country_code} count from db: {e}")
         return 0
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+
+    try:
+        await client.setex(cache_key, ttl, result)
+    except Exception as e:
+        logger.error(f"Error setting {country_code} count in Redis: {e}")
+
+    return result
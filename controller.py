@@ -46,6 +46,23 @@ def report_model(model_id: str, error: ErrorData | None = None) -> bool:
     return True
 
 
+class ModelErrorData(BaseModel):
+    model_id: str
+    error: str | None = None
+    timestamp: float
+
+
+@app.post("/errors", status_code=201)
+def report_models_errors(errors: list[ModelErrorData]) -> bool:
+    """Record a batch of errors sent by `backend.llms.reporter`."""
+    global models_errors
+    models_errors.extend(
+        [error.model_id, datetime.fromtimestamp(error.timestamp), error.error or None]
+        for error in errors
+    )
+    return True
+
+
 @app.get("/errors")
 def get_models_errors() -> list[str]:  # Return type hint
     return models_errors
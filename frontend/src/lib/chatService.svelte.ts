@@ -167,6 +167,8 @@ export const arena = $state<{
     a: Chat
     b: Chat
     error: string | null
+    // Kind of error handled specifically, 'stalled' if a model stopped answering mid-way
+    errorCode: 'stalled' | null
   }
 }>({
   currentScreen: 'prompt',
@@ -175,7 +177,8 @@ export const arena = $state<{
     status: 'pending',
     a: { status: 'pending', messages: [] },
     b: { status: 'pending', messages: [] },
-    error: null
+    error: null,
+    errorCode: null
   }
 })
 
@@ -186,6 +189,7 @@ function onSSEEvent(event: AnySSEEvent) {
     arena.chat.status = 'pending'
   } else if (event.type === 'error') {
     arena.chat.error = event.error
+    arena.chat.errorCode = event.code ?? null
     arena.chat.status = 'error'
     if (event.pos) {
       arena.chat[event.pos].status = 'error'
@@ -194,6 +198,15 @@ function onSSEEvent(event: AnySSEEvent) {
     arena.chat[event.pos].messages = event.messages
     arena.chat[event.pos].status = 'generating'
     arena.chat.status = 'generating'
+  } else if (event.type === 'delta') {
+    const message = arena.chat[event.pos].messages[event.index]
+    if (message?.role === 'assistant') {
+      // Offsets make applying a delta idempotent
+      message.content = message.content.slice(0, event.content_offset) + event.content
+      message.reasoning = message.reasoning.slice(0, event.reasoning_offset) + event.reasoning
+    }
+    arena.chat[event.pos].status = 'generating'
+    arena.chat.status = 'generating'
   } else if (event.type === 'complete') {
     if (event.pos) {
       arena.chat[event.pos].status = 'complete'
@@ -206,6 +219,7 @@ function onSSEEvent(event: AnySSEEvent) {
 export async function runChatBots(args: APIModeAndPromptData): Promise<string | undefined> {
   arena.chat.status = 'pending'
   arena.chat.error = null
+  arena.chat.errorCode = null
 
   try {
     const cohorts = sessionStorage.getItem(COHORT_STORAGE_KEY)
@@ -257,6 +271,7 @@ export async function runChatBots(args: APIModeAndPromptData): Promise<string |
 export async function askChatBots(text: string): Promise<string | undefined> {
   arena.chat.status = 'pending'
   arena.chat.error = null
+  arena.chat.errorCode = null
   try {
     // Stream from FastAPI endpoint
     for await (const event of api.stream('/arena/add_text', {
@@ -285,6 +300,7 @@ export async function askChatBots(text: string): Promise<string | undefined> {
 export async function retryAskChatBots(): Promise<string | undefined> {
   arena.chat.status = 'pending'
   arena.chat.error = null
+  arena.chat.errorCode = null
   try {
     // Stream from FastAPI endpoint
     for await (const event of api.stream('/arena/retry', {})) {
@@ -28,9 +28,45 @@ function getBackendUrl(): string {
  */
 type SSEEventInit = { type: 'init'; session_hash: string }
 type SSEEventChunk = { type: 'chunk'; pos: LLMPos; messages: Array<UserMessage | AssistantMessage> }
-type SSEEventError = { type: 'error'; error: string; pos?: LLMPos } //; chat: APIChat }
+type SSEEventDelta = {
+  type: 'delta'
+  pos: LLMPos
+  index: number
+  content: string
+  content_offset: number
+  reasoning: string
+  reasoning_offset: number
+}
+type SSEEventError = { type: 'error'; error: string; pos?: LLMPos; code?: 'stalled' } //; chat: APIChat }
 type SSEEventComplete = { type: 'complete'; pos?: LLMPos }
-export type AnySSEEvent = SSEEventInit | SSEEventError | SSEEventChunk | SSEEventComplete
+export type AnySSEEvent =
+  | SSEEventInit
+  | SSEEventError
+  | SSEEventChunk
+  | SSEEventDelta
+  | SSEEventComplete
+
+/**
+ * SSE protocol version supported by this client (chunk snapshots + deltas)
+ */
+const SSE_PROTOCOL = '2'
+
+/**
+ * Resuming an interrupted SSE stream: delay (increasing with each attempt) and max attempts
+ */
+const RESUME_DELAY_MS = 500
+const RESUME_MAX_ATTEMPTS = 5
+
+/**
+ * State of a resumable SSE stream: last received event id, whether it ended, and the
+ * lengths of each position's last message (protocol 2 deltas must start within them)
+ */
+type StreamState = {
+  lastEventId: string | null
+  done: boolean
+  resync: boolean
+  sent: Map<LLMPos, { index: number; content: number; reasoning: number }>
+}
 
 interface SSEInitEvent {
   type: 'init'
@@ -118,7 +154,7 @@ export class FastAPIClient {
 
       if (response.status === 422) {
         return new ValidationError(detail[0].msg)
-      } else if (response.status === 429) {
+      } else if (response.status === 429 || response.status === 503) {
         return new ValidationError(detail)
       } else {
         return new InternalError(message + detail)
@@ -170,82 +206,192 @@ export class FastAPIClient {
 
   /**
    * Stream responses using Server-Sent Events (SSE)
+   *
+   * If the connection drops, the stream is resumed from `/arena/stream` after the
+   * last received event id instead of generating the responses again. If a delta
+   * doesn't apply to the messages received so far, the stream is replayed from its
+   * start (each position starts with a full snapshot) to resync them.
    */
   async *stream(path: string, body: any): AsyncGenerator<AnySSEEvent> {
-    const url = this.getUrl(path)
-
     console.debug(`Streaming from ${path}`)
 
-    try {
-      // Add session hash header if available
-      const headers: HeadersInit = {
-        'Content-Type': 'application/json'
-      }
-      if (this.sessionHash) {
-        headers['X-Session-Hash'] = this.sessionHash
-      }
-      headers['X-Locale'] = getLocale()
+    const stream: StreamState = { lastEventId: null, done: false, resync: false, sent: new Map() }
 
-      const response = await fetch(url, {
+    try {
+      const response = await this.openStream(path, {
         method: 'POST',
-        headers,
         body: JSON.stringify(body)
       })
+      yield* this.readStream(response, stream)
+    } catch (error) {
+      if (stream.done || (stream.lastEventId === null && !stream.resync)) {
+        console.error(`Stream from ${path} failed: ${(error as Error).message}`)
+        throw error
+      }
+      console.warn(`Stream from ${path} interrupted: ${(error as Error).message}`)
+    }
 
-      if (!response.ok) {
-        throw await this.parseErrorResponse(response, path, 'POST')
+    for (let attempt = 1; !stream.done; attempt++) {
+      await new Promise((resolve) => setTimeout(resolve, RESUME_DELAY_MS * attempt))
+      console.debug(
+        stream.resync
+          ? `Replaying stream to resync it (attempt ${attempt})`
+          : `Resuming stream after event ${stream.lastEventId} (attempt ${attempt})`
+      )
+
+      try {
+        // Without Last-Event-ID the whole stream is replayed
+        const response = await this.openStream('/arena/stream', {
+          method: 'GET',
+          headers: stream.resync ? {} : { 'Last-Event-ID': stream.lastEventId! }
+        })
+        if (stream.resync) {
+          stream.resync = false
+          stream.sent.clear()
+        }
+        yield* this.readStream(response, stream)
+      } catch (error) {
+        if (
+          stream.done ||
+          attempt >= RESUME_MAX_ATTEMPTS ||
+          error instanceof InternalError ||
+          error instanceof ValidationError
+        ) {
+          console.error(`Stream from ${path} failed: ${(error as Error).message}`)
+          throw error
+        }
+        console.warn(`Stream resume failed: ${(error as Error).message}`)
       }
+    }
+  }
+
+  /**
+   * Open an SSE response
+   */
+  private async openStream(path: string, options: RequestInit): Promise<Response> {
+    // Add session hash header if available
+    const headers = new Headers(options.headers || {})
+    headers.set('Content-Type', 'application/json')
+    headers.set('X-SSE-Protocol', SSE_PROTOCOL)
+    if (this.sessionHash) {
+      headers.set('X-Session-Hash', this.sessionHash)
+    }
+    headers.set('X-Locale', getLocale())
 
-      // Read SSE stream
-      const reader = response.body!.getReader()
-      const decoder = new TextDecoder()
-      let buffer = ''
-
-      while (true) {
-        const { done, value } = await reader.read()
-
-        if (done) break
-
-        buffer += decoder.decode(value, { stream: true })
-        const lines = buffer.split('\n\n')
-        buffer = lines.pop() || ''
-
-        for (const line of lines) {
-          if (line.startsWith('data: ')) {
-            const dataStr = line.slice(6).trim()
-            if (!dataStr) continue
-
-            try {
-              const data = JSON.parse(dataStr) as SSEEvent
-
-              // Handle special event types
-              if (data.type === 'init' && 'session_hash' in data) {
-                // Store session hash from first event
-                this.setSessionHash(data.session_hash)
-              } else if (data.type === 'error') {
-                // FIXME throw? probably not, errors are handle in chat
-                // const errorMsg = 'error' in data ? data.error : 'Unknown error'
-                // console.error(`SSE error: ${errorMsg}`)
-                // useToast(errorMsg, 10000, 'error')
-                // throw new Error(errorMsg)
-              } else if (data.type === 'done') {
-                // Stream complete
-                console.debug('SSE stream completed')
-                return
-              }
-
-              // Yield the parsed event
-              yield data as AnySSEEvent
-            } catch (_parseError) {
-              console.error(`Failed to parse SSE data: ${dataStr}`)
-            }
-          }
+    const response = await fetch(this.getUrl(path), { ...options, headers })
+
+    if (!response.ok) {
+      throw await this.parseErrorResponse(response, path, options.method)
+    }
+
+    return response
+  }
+
+  /**
+   * Read events of an SSE response, keeping track of the last event id
+   */
+  private async *readStream(response: Response, stream: StreamState): AsyncGenerator<AnySSEEvent> {
+    // Read SSE stream
+    const reader = response.body!.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+
+    while (true) {
+      const { done, value } = await reader.read()
+
+      if (done) break
+
+      buffer += decoder.decode(value, { stream: true })
+      const blocks = buffer.split('\n\n')
+      buffer = blocks.pop() || ''
+
+      for (const block of blocks) {
+        if (block.startsWith('id: ')) {
+          stream.lastEventId = block.slice(4).trim()
+          continue
+        }
+        if (!block.startsWith('data: ')) continue
+
+        const dataStr = block.slice(6).trim()
+        if (!dataStr) continue
+
+        let data: SSEEvent
+        try {
+          data = JSON.parse(dataStr) as SSEEvent
+        } catch (_parseError) {
+          console.error(`Failed to parse SSE data: ${dataStr}`)
+          continue
+        }
+
+        // Handle special event types
+        if (data.type === 'init' && 'session_hash' in data) {
+          // Store session hash from first event
+          this.setSessionHash(data.session_hash)
+        } else if (data.type === 'error') {
+          // FIXME throw? probably not, errors are handle in chat
+          // const errorMsg = 'error' in data ? data.error : 'Unknown error'
+          // console.error(`SSE error: ${errorMsg}`)
+          // useToast(errorMsg, 10000, 'error')
+          // throw new Error(errorMsg)
+        } else if (data.type === 'done') {
+          // Stream complete
+          console.debug('SSE stream completed')
+          stream.done = true
+          return
+        }
+        // The final `complete` event (without pos) or any error ends the stream
+        const event = data as AnySSEEvent
+        if ((event.type === 'complete' && !event.pos) || event.type === 'error') {
+          stream.done = true
         }
+        if (!this.trackSentLengths(stream, event)) {
+          // An event was lost or reordered, replay the stream
+          stream.resync = true
+          void reader.cancel()
+          throw new Error('SSE delta out of sync')
+        }
+
+        // Yield the parsed event
+        yield event
       }
-    } catch (error) {
-      console.error(`Stream from ${path} failed: ${(error as Error).message}`)
-      throw error
     }
+
+    if (!stream.done) {
+      // Connection closed cleanly before the end of the stream (proxy timeout, server
+      // restart...), resume it
+      throw new Error('SSE stream closed before its end')
+    }
+  }
+
+  /**
+   * Update the lengths of the last message of a position
+   *
+   * @returns false if a delta starts after the text received so far
+   */
+  private trackSentLengths(stream: StreamState, event: AnySSEEvent): boolean {
+    if (event.type === 'chunk') {
+      const index = event.messages.length - 1
+      const message = event.messages[index]
+      stream.sent.set(event.pos, {
+        index,
+        content: message?.content.length ?? 0,
+        reasoning: (message?.role === 'assistant' && message.reasoning?.length) || 0
+      })
+    } else if (event.type === 'delta') {
+      const sent = stream.sent.get(event.pos)
+      if (
+        !sent ||
+        sent.index !== event.index ||
+        event.content_offset > sent.content ||
+        event.reasoning_offset > sent.reasoning
+      ) {
+        return false
+      }
+      // Offsets make replayed deltas idempotent
+      sent.content = event.content_offset + event.content.length
+      sent.reasoning = event.reasoning_offset + event.reasoning.length
+    }
+    return true
   }
 }
 
@@ -0,0 +1,139 @@
+"""
+Backend app instrumented for benchmarks (see `utils.benchmark.run`).
+
+Same app as `backend.main` with:
+- database writes replaced by in-memory counters (Postgres stand-in),
+- an event loop lag monitor,
+- `GET /benchmark/stats`, `POST /benchmark/reset` and
+  `POST /benchmark/redis_memory` to collect measures.
+
+Run with `uvicorn utils.benchmark.app:app`.
+"""
+
+import asyncio
+import resource
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+
+import numpy as np
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+
+import backend.arena.persistence as persistence
+from backend.arena.models import BOT_POS
+from backend.arena.resume import sse_stream_key
+from backend.arena.session import (
+    session_messages_key,
+    session_meta_key,
+    session_version_key,
+)
+from backend.main import app
+from backend.main import lifespan as backend_lifespan
+from backend.session import get_async_redis_client
+
+# Seconds between two event loop lag samples
+LOOP_LAG_INTERVAL = 0.05
+LOOP_LAG_MAX_SAMPLES = 100_000
+
+db_writes: Counter[str] = Counter()
+loop_lags: deque[float] = deque(maxlen=LOOP_LAG_MAX_SAMPLES)
+
+
+def _stub_db_write(name: str):
+    def write(data: dict) -> dict:
+        db_writes[name] += 1
+        return data
+
+    return write
+
+
+# Postgres stand-in
+persistence.upsert_conv_to_db = _stub_db_write("conversations")
+persistence.save_vote_to_db = _stub_db_write("votes")
+persistence.upsert_reaction_to_db = _stub_db_write("reactions")
+
+
+async def monitor_loop_lag() -> None:
+    """Sample how late the event loop wakes up a sleeping task."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        loop_lags.append(time.perf_counter() - start - LOOP_LAG_INTERVAL)
+
+
+def get_rss_bytes() -> int:
+    """Current resident memory of the process (peak memory if not on Linux)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@asynccontextmanager
+async def lifespan(app):
+    async with backend_lifespan(app):
+        monitor = asyncio.create_task(monitor_loop_lag())
+        yield
+        monitor.cancel()
+
+
+app.router.lifespan_context = lifespan
+
+
+@app.get("/benchmark/stats")
+async def get_benchmark_stats():
+    lags = np.array(loop_lags) if loop_lags else np.zeros(1)
+    return {
+        "rss_bytes": get_rss_bytes(),
+        "db_writes": dict(db_writes),
+        "loop_lag": {
+            "samples": len(loop_lags),
+            "p50": float(np.percentile(lags, 50)),
+            "p95": float(np.percentile(lags, 95)),
+            "p99": float(np.percentile(lags, 99)),
+            "max": float(lags.max()),
+        },
+    }
+
+
+class RedisMemoryBody(BaseModel):
+    session_hashes: list[str]
+
+
+@app.post("/benchmark/redis_memory")
+async def get_redis_memory(body: RedisMemoryBody):
+    """
+    Redis memory (`MEMORY USAGE`) of the sessions' keys, and of their SSE streams
+    which only last `SSE_RESUME_TTL_SECONDS`.
+
+    Returns None if the Redis server doesn't support `MEMORY USAGE` (fakeredis).
+    """
+    client = get_async_redis_client()
+    async with client.pipeline(transaction=False) as pipe:
+        for session_hash in body.session_hashes:
+            pipe.memory_usage(sse_stream_key(session_hash))
+            pipe.memory_usage(session_meta_key(session_hash))
+            pipe.memory_usage(session_version_key(session_hash))
+            for pos in BOT_POS:
+                pipe.memory_usage(session_messages_key(session_hash, pos))
+        try:
+            usages = await pipe.execute()
+        except RedisError:
+            return None
+
+    keys_per_session = 3 + len(BOT_POS)
+    sse_bytes = sum(filter(None, usages[::keys_per_session]))
+    return {
+        "sessions": len(body.session_hashes),
+        "session_bytes": sum(filter(None, usages)) - sse_bytes,
+        "sse_bytes": sse_bytes,
+    }
+
+
+@app.post("/benchmark/reset")
+async def reset_benchmark_stats():
+    db_writes.clear()
+    loop_lags.clear()
+    return {"rss_bytes": get_rss_bytes()}
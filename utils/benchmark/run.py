@@ -0,0 +1,637 @@
+"""
+End-to-end load test of the arena API.
+
+Simulates concurrent users going through full sessions over SSE (first
+message, follow-up messages, then a reaction or a vote) against the backend, with
+local stand-ins for its dependencies:
+- LLMs: the mock provider (`utils.mock_llm`), configured by a profiles file,
+- Postgres: database writes are counted in memory (`utils.benchmark.app`),
+- Redis: a local Redis (`make redis`) or an in-process fake one (`--fake-redis`,
+  needs the `fakeredis` package).
+
+Reports throughput, time to first text and time to complete percentiles per
+endpoint, event loop lag and memory per session of the backend (process RSS
+growth and Redis `MEMORY USAGE` of the session keys), and saves them as JSON
+to compare runs:
+
+    make benchmark
+    uv run python -m utils.benchmark.run --users 50 --duration 120
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator
+
+import httpx
+import numpy as np
+
+from utils.logger import configure_logger
+from utils.mock_llm.server import DEFAULT_PROFILES_FILE
+
+logger = configure_logger(logging.getLogger("utils:benchmark"))
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+DEFAULT_OUTPUT_DIR = ROOT_DIR / "data" / "benchmarks"
+REDIS_PORT = 6379
+
+PROMPTS = [
+    "Quelle est la capitale de la France ?",
+    "Explique-moi la photosynthèse simplement.",
+    "Écris un poème sur la mer.",
+    "Comment fonctionne un moteur électrique ?",
+    "Donne-moi une recette de ratatouille.",
+]
+
+
+@dataclass
+class RequestResult:
+    """
+    Measures of a request to the API.
+
+    Attributes:
+        endpoint: Arena endpoint name (add_first_text, add_text, react, vote)
+        ok: Whether the request succeeded (stream completed without error)
+        duration: Seconds until the response (or the stream) completed
+        ttft: Seconds until the first text event, for streamed endpoints
+        error: Error message if the request failed
+    """
+
+    endpoint: str
+    ok: bool
+    duration: float
+    ttft: float | None = None
+    error: str | None = None
+
+
+@dataclass
+class SSEResult:
+    events: list[dict[str, Any]] = field(default_factory=list)
+    first_text_at: float | None = None
+    error: str | None = None
+
+
+async def read_sse(response: httpx.Response, start: float) -> SSEResult:
+    """
+    Parse an arena SSE stream incrementally.
+
+    Args:
+        response: Streamed response of an arena endpoint
+        start: `time.perf_counter()` when the request was sent
+
+    Returns:
+        SSEResult: events and time of the first text event
+    """
+    result = SSEResult()
+    buffer = ""
+    async for text in response.aiter_text():
+        buffer += text
+        *blocks, buffer = buffer.split("\n\n")
+        for block in blocks:
+            data = [
+                line.removeprefix("data:").strip()
+                for line in block.split("\n")
+                if line.startswith("data:")
+            ]
+            if not data:
+                continue
+            event = json.loads("\n".join(data))
+            result.events.append(event)
+
+            if result.first_text_at is None and event["type"] in ("chunk", "delta"):
+                result.first_text_at = time.perf_counter() - start
+            elif event["type"] == "error":
+                result.error = event.get("error") or "error"
+
+    return result
+
+
+def last_assistant_index(events: list[dict[str, Any]]) -> int:
+    """Index of the last message of position "a" seen in a stream."""
+    for event in reversed(events):
+        if event.get("pos") != "a":
+            continue
+        if event["type"] == "delta":
+            return event["index"]
+        if event["type"] == "chunk":
+            return len(event["messages"]) - 1
+    return 1
+
+
+class SimulatedUser:
+    """
+    A user going through arena sessions, each request measured.
+
+    Each user has its own IP (X-Forwarded-For) so the rate limiting of pricey
+    models applies per user as in production.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        user_id: int,
+        turns: int,
+        react_share: float,
+        sse_protocol: int,
+    ) -> None:
+        self.client = client
+        self.turns = turns
+        self.react_share = react_share
+        self.headers = {
+            "X-Locale": "fr",
+            "X-SSE-Protocol": str(sse_protocol),
+            "X-Forwarded-For": f"10.{user_id // 65536 % 256}.{user_id // 256 % 256}.{user_id % 256}",
+        }
+        self.results: list[RequestResult] = []
+        # Hashes of the sessions completed by the user
+        self.session_hashes: list[str] = []
+
+    async def stream(self, endpoint: str, body: dict[str, Any]) -> SSEResult | None:
+        start = time.perf_counter()
+        try:
+            async with self.client.stream(
+                "POST", f"/arena/{endpoint}", json=body, headers=self.headers
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    error = f"HTTP {response.status_code}: {response.text[:200]}"
+                    sse = SSEResult(error=error)
+                else:
+                    sse = await read_sse(response, start)
+        except httpx.HTTPError as e:
+            sse = SSEResult(error=f"{type(e).__name__}: {e}")
+
+        if sse.error is None and not any(
+            event["type"] == "complete" and "pos" not in event for event in sse.events
+        ):
+            sse.error = "stream ended before completion"
+
+        self.results.append(
+            RequestResult(
+                endpoint=endpoint,
+                ok=sse.error is None,
+                duration=time.perf_counter() - start,
+                ttft=sse.first_text_at,
+                error=sse.error,
+            )
+        )
+        return sse if sse.error is None else None
+
+    async def post(self, endpoint: str, body: dict[str, Any]) -> bool:
+        start = time.perf_counter()
+        error = None
+        try:
+            response = await self.client.post(
+                f"/arena/{endpoint}", json=body, headers=self.headers
+            )
+            if response.status_code != 200:
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}"
+
+        self.results.append(
+            RequestResult(
+                endpoint=endpoint,
+                ok=error is None,
+                duration=time.perf_counter() - start,
+                error=error,
+            )
+        )
+        return error is None
+
+    async def run_session(self) -> bool:
+        """
+        Go through a full session: first message, follow-ups then a reaction
+        or a vote (conversations with reactions can't be voted on).
+
+        Returns:
+            bool: whether every request of the session succeeded
+        """
+        if await self._run_session():
+            self.session_hashes.append(self.headers["X-Session-Hash"])
+            return True
+        return False
+
+    async def _run_session(self) -> bool:
+        self.headers.pop("X-Session-Hash", None)
+        body = {"prompt_value": random.choice(PROMPTS), "cohorts": ""}
+        if not (sse := await self.stream("add_first_text", body)):
+            return False
+        init = next((e for e in sse.events if e["type"] == "init"), None)
+        if not init:
+            return False
+        self.headers["X-Session-Hash"] = init["session_hash"]
+
+        for _ in range(self.turns - 1):
+            if not (sse := await self.stream("add_text", {"message": "Et ensuite ?"})):
+                return False
+
+        if random.random() < self.react_share:
+            reaction = {
+                "bot": "a",
+                "index": last_assistant_index(sse.events),
+                "value": "",
+                "liked": True,
+                "prefs": ["useful"],
+                "comment": "",
+            }
+            return await self.post("react", reaction)
+
+        vote = {
+            "chosen_llm": "a",
+            "prefs_a": ["useful"],
+            "prefs_b": [],
+            "comment_a": "",
+            "comment_b": "",
+        }
+        return await self.post("vote", vote)
+
+
+def percentiles(values: list[float]) -> dict[str, float] | None:
+    if not values:
+        return None
+    array = np.array(values)
+    return {
+        "mean": round(float(array.mean()), 4),
+        **{f"p{p}": round(float(np.percentile(array, p)), 4) for p in (50, 90, 95, 99)},
+        "max": round(float(array.max()), 4),
+    }
+
+
+def summarize(results: list[RequestResult], elapsed: float) -> dict[str, Any]:
+    endpoints: dict[str, Any] = {}
+    for endpoint in dict.fromkeys(r.endpoint for r in results):
+        endpoint_results = [r for r in results if r.endpoint == endpoint]
+        ok = [r for r in endpoint_results if r.ok]
+        errors: dict[str, int] = {}
+        for r in endpoint_results:
+            if r.error:
+                errors[r.error[:120]] = errors.get(r.error[:120], 0) + 1
+        endpoints[endpoint] = {
+            "requests": len(endpoint_results),
+            "errors": len(endpoint_results) - len(ok),
+            "error_messages": errors,
+            "throughput": round(len(ok) / elapsed, 3),
+            "ttft": percentiles([r.ttft for r in ok if r.ttft is not None]),
+            "duration": percentiles([r.duration for r in ok]),
+        }
+    return endpoints
+
+
+async def run_load(
+    api_url: str,
+    users: int,
+    sessions: int | None,
+    duration: float,
+    turns: int,
+    react_share: float,
+    sse_protocol: int,
+) -> tuple[list[RequestResult], list[str], float]:
+    """
+    Run simulated users concurrently until `sessions` sessions are done or
+    `duration` seconds elapsed.
+
+    Returns:
+        tuple: results of every request, hashes of completed sessions, elapsed seconds
+    """
+    limits = httpx.Limits(max_connections=users * 2, max_keepalive_connections=users)
+    timeout = httpx.Timeout(300, connect=10)
+    started_sessions = 0
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(
+        base_url=api_url, limits=limits, timeout=timeout
+    ) as client:
+        simulated = [
+            SimulatedUser(client, i, turns, react_share, sse_protocol)
+            for i in range(users)
+        ]
+
+        async def run_user(user: SimulatedUser) -> None:
+            nonlocal started_sessions
+            while time.perf_counter() < deadline and (
+                sessions is None or started_sessions < sessions
+            ):
+                started_sessions += 1
+                await user.run_session()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(run_user(user) for user in simulated))
+        elapsed = time.perf_counter() - start
+
+    results = [result for user in simulated for result in user.results]
+    session_hashes = [
+        session_hash for user in simulated for session_hash in user.session_hashes
+    ]
+    return results, session_hashes, elapsed
+
+
+def wait_until_ready(
+    url: str, process: subprocess.Popen | None, timeout: float
+) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Process serving {url} exited ({process.returncode})")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} wasn't ready after {timeout}s")
+
+
+@contextmanager
+def spawn(
+    args: list[str], env: dict[str, str], log_file: Path
+) -> Iterator[subprocess.Popen]:
+    with open(log_file, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, *args],
+            cwd=ROOT_DIR,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            yield process
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+@contextmanager
+def fake_redis(port: int) -> Iterator[None]:
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError:
+        raise SystemExit(
+            "--fake-redis needs the fakeredis package (uv run --with fakeredis ...)"
+        )
+
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        server.shutdown()
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print(
+        f"\n{report['sessions']['completed']}/{report['sessions']['started']} sessions "
+        f"in {report['elapsed']}s with {report['config']['users']} users "
+        f"({report['sessions']['throughput']} sessions/s)"
+    )
+    print(
+        f"{'endpoint':<16}{'req':>6}{'err':>6}{'req/s':>8}  ttft p50/p95  duration p50/p95"
+    )
+    for endpoint, stats in report["endpoints"].items():
+        ttft = (
+            stats["ttft"] and f"{stats['ttft']['p50']:.2f}/{stats['ttft']['p95']:.2f}"
+        )
+        duration = (
+            stats["duration"]
+            and f"{stats['duration']['p50']:.2f}/{stats['duration']['p95']:.2f}"
+        )
+        print(
+            f"{endpoint:<16}{stats['requests']:>6}{stats['errors']:>6}"
+            f"{stats['throughput']:>8}  {ttft or '-':>12}  {duration or '-':>16}"
+        )
+        for message, count in stats["error_messages"].items():
+            print(f"    {count} x {message}")
+    if backend := report.get("backend"):
+        lag = backend["loop_lag"]
+        print(
+            f"event loop lag p50/p95/max: {lag['p50'] * 1000:.1f}/"
+            f"{lag['p95'] * 1000:.1f}/{lag['max'] * 1000:.1f} ms, "
+            f"memory per session: {backend['memory_per_session_kb']} KiB (RSS)"
+        )
+        if redis_memory := backend["redis_memory"]:
+            print(
+                f"redis memory per session: {redis_memory['session_kb_per_session']} KiB "
+                f"(+{redis_memory['sse_kb_per_session']} KiB of SSE stream until it expires)"
+            )
+        else:
+            print("redis memory per session: n/a (MEMORY USAGE not supported)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the arena API over SSE")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent users")
+    parser.add_argument(
+        "--duration", type=float, default=60, help="Max seconds to run sessions for"
+    )
+    parser.add_argument("--sessions", type=int, help="Stop after this many sessions")
+    parser.add_argument(
+        "--turns", type=int, default=2, help="User messages per session"
+    )
+    parser.add_argument(
+        "--react-share",
+        type=float,
+        default=0.3,
+        help="Share of sessions ending with a reaction instead of a vote",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=1,
+        help="Sessions per user run before measuring (loads caches, pools...)",
+    )
+    parser.add_argument("--sse-protocol", type=int, default=2, choices=(1, 2))
+    parser.add_argument(
+        "--api-url",
+        help="Benchmark an already running backend (else `utils.benchmark.app` is spawned)",
+    )
+    parser.add_argument("--api-port", type=int, default=8012)
+    parser.add_argument("--mock-llm-port", type=int, default=8091)
+    parser.add_argument(
+        "--profiles",
+        type=Path,
+        default=DEFAULT_PROFILES_FILE,
+        help="Mock LLM profiles JSON file",
+    )
+    parser.add_argument(
+        "--fake-redis",
+        action="store_true",
+        help="Serve an in-process fake Redis on the Redis port (needs fakeredis)",
+    )
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help=f"JSON report path (default: {DEFAULT_OUTPUT_DIR.relative_to(ROOT_DIR)}/benchmark-<date>.json)",
+    )
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    with ExitStack() as stack:
+        api_url = args.api_url
+        if not api_url:
+            log_dir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+            if args.fake_redis:
+                stack.enter_context(fake_redis(REDIS_PORT))
+
+            mock_args = [
+                "--port",
+                str(args.mock_llm_port),
+                "--profiles",
+                str(args.profiles),
+            ]
+            if args.seed is not None:
+                mock_args += ["--seed", str(args.seed)]
+            mock_llm = stack.enter_context(
+                spawn(
+                    ["-m", "utils.mock_llm.server", *mock_args],
+                    dict(os.environ),
+                    log_dir / "mock_llm.log",
+                )
+            )
+            wait_until_ready(
+                f"http://127.0.0.1:{args.mock_llm_port}/v1/models", mock_llm, 30
+            )
+
+            env = {
+                **os.environ,
+                "MOCK_LLM_API_BASE": f"http://127.0.0.1:{args.mock_llm_port}/v1",
+                "LOGDIR": str(log_dir),
+            }
+            env.pop("COMPARIA_DB_URI", None)
+            api_url = f"http://127.0.0.1:{args.api_port}"
+            api = stack.enter_context(
+                spawn(
+                    [
+                        "-m",
+                        "uvicorn",
+                        "utils.benchmark.app:app",
+                        "--port",
+                        str(args.api_port),
+                        "--log-level",
+                        "warning",
+                    ],
+                    env,
+                    log_dir / "api.log",
+                )
+            )
+            wait_until_ready(f"{api_url}/models/limits", api, 60)
+
+        load_args = (args.turns, args.react_share, args.sse_protocol)
+        if args.warmup:
+            logger.info(f"Warming up with {args.warmup} session(s) per user")
+            warmup_sessions = args.users * args.warmup
+            asyncio.run(
+                run_load(
+                    api_url, args.users, warmup_sessions, args.duration, *load_args
+                )
+            )
+
+        # Stats are only available on the instrumented app
+        reset = httpx.post(f"{api_url}/benchmark/reset", timeout=10)
+        rss_before = reset.json()["rss_bytes"] if reset.status_code == 200 else None
+
+        logger.info(
+            f"Running {args.users} users for {args.duration}s "
+            f"({args.sessions or 'unlimited'} sessions) against {api_url}"
+        )
+        results, session_hashes, elapsed = asyncio.run(
+            run_load(api_url, args.users, args.sessions, args.duration, *load_args)
+        )
+        completed = len(session_hashes)
+
+        backend = None
+        if rss_before is not None:
+            stats = httpx.get(f"{api_url}/benchmark/stats", timeout=10).json()
+            rss_delta = stats["rss_bytes"] - rss_before
+            redis_memory = httpx.post(
+                f"{api_url}/benchmark/redis_memory",
+                json={"session_hashes": session_hashes},
+                timeout=60,
+            ).json()
+            if redis_memory:
+                for name in ("session", "sse"):
+                    redis_memory[f"{name}_kb_per_session"] = round(
+                        redis_memory[f"{name}_bytes"] / max(completed, 1) / 1024, 1
+                    )
+            backend = {
+                **stats,
+                "rss_delta_bytes": rss_delta,
+                "memory_per_session_kb": round(rss_delta / max(completed, 1) / 1024, 1),
+                "redis_memory": redis_memory,
+            }
+
+    started = sum(1 for r in results if r.endpoint == "add_first_text")
+    report = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "users": args.users,
+            "duration": args.duration,
+            "sessions": args.sessions,
+            "turns": args.turns,
+            "react_share": args.react_share,
+            "warmup": args.warmup,
+            "sse_protocol": args.sse_protocol,
+            "api_url": args.api_url,
+            "profiles": json.loads(args.profiles.read_text()),
+            "seed": args.seed,
+        },
+        "elapsed": round(elapsed, 3),
+        "sessions": {
+            "started": started,
+            "completed": completed,
+            "throughput": round(completed / elapsed, 3),
+        },
+        "endpoints": summarize(results, elapsed),
+        "backend": backend,
+    }
+
+    print_report(report)
+
+    output = args.output or (
+        DEFAULT_OUTPUT_DIR / f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    logger.info(f"Report saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
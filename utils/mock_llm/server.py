@@ -0,0 +1,266 @@
+"""
+OpenAI-compatible mock LLM provider for load and latency testing.
+
+Streams fake chat completions with realistic timings (time to first token,
+tokens per second), reasoning deltas (OpenRouter `reasoning` field) and usage chunks, and fails with errors,
+rate limits (429) or stalls at configurable rates. Behaviors are configured
+per model in a profiles file (see `profiles.json`), no network is needed.
+
+Run it and point the backend at it (every model is then served by the mock):
+
+    make dev-mock-llm
+    MOCK_LLM_API_BASE=http://localhost:8090/v1 make dev-backend
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Any, AsyncGenerator
+from uuid import uuid4
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from utils.logger import configure_logger
+
+logger = configure_logger(logging.getLogger("utils:mock_llm"))
+
+MOCK_LLM_DIR = Path(__file__).parent
+DEFAULT_PROFILES_FILE = MOCK_LLM_DIR / "profiles.json"
+
+WORDS = (
+    "le modèle répond à la question avec des phrases plausibles mais générées "
+    "aléatoirement pour mesurer la latence et le débit de la plateforme"
+).split()
+
+
+class MockProfile(BaseModel):
+    """
+    Simulated behavior of a model.
+
+    Attributes:
+        ttft: Mean seconds before the first token
+        ttft_jitter: Max seconds added or removed to `ttft` (uniform)
+        tokens_per_second: Streaming throughput
+        output_tokens: Mean response length in tokens (uniform from half to 1.5x)
+        reasoning_share: Share of the tokens streamed as reasoning before content
+        error_rate: Share of requests failing with a 500 error
+        rate_limit_rate: Share of requests failing with a 429 error
+        retry_after: Retry-After header (seconds) of 429 errors
+        stall_probability: Share of responses stalling once while streaming
+        stall_seconds: Duration of stalls
+        report_usage: Whether to send a usage chunk when requested
+    """
+
+    ttft: float = 0.5
+    ttft_jitter: float = 0.2
+    tokens_per_second: float = 50.0
+    output_tokens: int = 300
+    reasoning_share: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: int = 1
+    stall_probability: float = 0.0
+    stall_seconds: float = 60.0
+    report_usage: bool = True
+
+
+class MockProfiles(BaseModel):
+    """
+    Default profile and overrides per model id pattern (fnmatch, first match wins).
+
+    Model ids are matched without the "mock/" prefix added by the backend.
+    """
+
+    default: MockProfile = MockProfile()
+    models: dict[str, dict[str, Any]] = {}
+
+    def get(self, model: str) -> MockProfile:
+        model = model.removeprefix("mock/")
+        for pattern, overrides in self.models.items():
+            if fnmatch(model, pattern):
+                # model_copy(update=...) would skip validation of the overrides
+                return MockProfile.model_validate(
+                    {**self.default.model_dump(), **overrides}
+                )
+        return self.default
+
+
+def _error(status_code: int, message: str, **headers: str) -> JSONResponse:
+    return JSONResponse(
+        {"error": {"message": message, "type": "mock_error", "code": status_code}},
+        status_code=status_code,
+        headers=headers,
+    )
+
+
+def _chunk(
+    completion_id: str, model: str, delta: dict[str, str], finish_reason: str | None
+) -> dict[str, Any]:
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict[str, int]:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+async def stream_completion(
+    profile: MockProfile,
+    model: str,
+    output_tokens: int,
+    finish_reason: str,
+    prompt_tokens: int,
+    include_usage: bool,
+) -> AsyncGenerator[str]:
+    completion_id = f"mock-{uuid4().hex}"
+    reasoning_tokens = int(output_tokens * profile.reasoning_share)
+    stall_at = (
+        random.randrange(output_tokens)
+        if random.random() < profile.stall_probability
+        else None
+    )
+
+    await asyncio.sleep(
+        max(0.0, profile.ttft + random.uniform(-1, 1) * profile.ttft_jitter)
+    )
+    start = time.monotonic()
+    for i in range(output_tokens):
+        if i == stall_at:
+            await asyncio.sleep(profile.stall_seconds)
+            start += profile.stall_seconds
+        # Keep the throughput steady regardless of the sleep precision
+        if (delay := start + i / profile.tokens_per_second - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+        field = "reasoning" if i < reasoning_tokens else "content"
+        delta = {field: random.choice(WORDS) + " "}
+        if i == 0:
+            delta["role"] = "assistant"
+        yield f"data: {json.dumps(_chunk(completion_id, model, delta, None))}\n\n"
+
+    yield f"data: {json.dumps(_chunk(completion_id, model, {}, finish_reason))}\n\n"
+    if include_usage and profile.report_usage:
+        usage_chunk = {
+            **_chunk(completion_id, model, {}, None),
+            "choices": [],
+            "usage": _usage(prompt_tokens, output_tokens),
+        }
+        yield f"data: {json.dumps(usage_chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def create_app(profiles: MockProfiles) -> FastAPI:
+    app = FastAPI(title="compar:IA mock LLM provider")
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {
+            "object": "list",
+            "data": [{"id": pattern, "object": "model"} for pattern in profiles.models],
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model: str = body.get("model", "")
+        profile = profiles.get(model)
+
+        draw = random.random()
+        if draw < profile.rate_limit_rate:
+            return _error(
+                429, "Rate limit exceeded", **{"Retry-After": str(profile.retry_after)}
+            )
+        if draw < profile.rate_limit_rate + profile.error_rate:
+            return _error(500, "Internal server error")
+
+        output_tokens = max(1, int(profile.output_tokens * random.uniform(0.5, 1.5)))
+        finish_reason = "stop"
+        if (max_tokens := body.get("max_tokens")) and output_tokens > max_tokens:
+            output_tokens, finish_reason = max_tokens, "length"
+        prompt_tokens = sum(
+            len(str(message.get("content", "")).split())
+            for message in body.get("messages", [])
+        )
+
+        if body.get("stream"):
+            include_usage = bool(
+                (body.get("stream_options") or {}).get("include_usage")
+            )
+            return StreamingResponse(
+                stream_completion(
+                    profile,
+                    model,
+                    output_tokens,
+                    finish_reason,
+                    prompt_tokens,
+                    include_usage,
+                ),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(profile.ttft + output_tokens / profile.tokens_per_second)
+        return {
+            "id": f"mock-{uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {
+                        "role": "assistant",
+                        "content": " ".join(
+                            random.choice(WORDS) for _ in range(output_tokens)
+                        ),
+                    },
+                    "finish_reason": finish_reason,
+                }
+            ],
+            "usage": _usage(prompt_tokens, output_tokens),
+        }
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="compar:IA mock LLM provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument(
+        "--profiles",
+        type=Path,
+        default=DEFAULT_PROFILES_FILE,
+        help="Models profiles JSON file",
+    )
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    profiles = MockProfiles.model_validate_json(args.profiles.read_text())
+    logger.info(f"Serving mock models from {args.profiles} on {args.host}:{args.port}")
+    uvicorn.run(
+        create_app(profiles), host=args.host, port=args.port, log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -33,7 +33,6 @@ CREATE TABLE IF NOT EXISTS conversations (
     selected_category VARCHAR(255),
     is_unedited_prompt BOOLEAN,
     archived BOOLEAN DEFAULT FALSE,
-    -- TODO: add 'interrupted' bool field?
     mode VARCHAR(255),
     custom_models_selection JSONB,
     short_summary TEXT,
@@ -78,4 +77,8 @@ ALTER TABLE conversations DROP COLUMN country;
 ALTER TABLE conversations DROP COLUMN city;
 -- comma separated
 ALTER TABLE conversations ADD COLUMN cohorts TEXT;
-ALTER TABLE conversations ADD COLUMN country_portal VARCHAR(255);
\ No newline at end of file
+ALTER TABLE conversations ADD COLUMN country_portal VARCHAR(255);
+
+-- 17/10/2026
+-- client disconnected before the end of the last responses
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS interrupted BOOLEAN DEFAULT FALSE;
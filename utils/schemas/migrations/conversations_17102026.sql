@@ -0,0 +1,3 @@
+-- 17/10/2026
+-- client disconnected before the end of the last responses
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS interrupted BOOLEAN DEFAULT FALSE;